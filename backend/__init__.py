@@ -1,19 +1,46 @@
 import os
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_cors import CORS
-# from flask_jwt_extended import JWTManager # JWT Removed
+from backend.json_provider import FastJSONProvider
+from backend.content_cache import content_cache
+from backend.login_throttle import login_throttle
+from backend.request_metrics import request_metrics
+from backend.query_inspector import query_detector
+from backend.profiling import profiler
+from backend.fork_server import fork_servers
+from backend.code_batcher import code_batcher
+from backend import auth_tokens
+from backend import schema
+from flask_jwt_extended import JWTManager
+from backend.config.config import config
+from backend import db_engine
 
 # Initialize extensions
 db = SQLAlchemy()
-migrate = Migrate()
-# jwt = JWTManager() # JWT Removed
+jwt = JWTManager()
 
-def create_app(test_config=None):
+def init_migrate(app):
+    """Register Flask-Migrate (the `flask db` commands).
+
+    Alembic is the heaviest import of the whole app, and only the CLI uses
+    it, so it is loaded only when the app is created by a click command.
+    """
+    if click.get_current_context(silent=True) is None:
+        return None
+    from flask_migrate import Migrate
+    return Migrate(app, db)
+
+def create_app(test_config=None, config_name=None):
     # Create and configure the app
     app = Flask(__name__, instance_relative_config=True)
-    
+
+    # 基本設定來自 backend/config/config.py，FLASK_CONFIG 選擇環境（預設 production）
+    app.config.from_object(config[config_name or os.environ.get('FLASK_CONFIG', 'default')])
+    if os.environ.get('DATABASE_URL'):
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+
     if test_config is None:
         # Load the instance config, if it exists, when not testing
         app.config.from_pyfile('config.py', silent=True)
@@ -27,20 +54,44 @@ def create_app(test_config=None):
     except OSError:
         pass
 
-    # Configure database
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///python_learning.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    # app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key') # JWT Removed
+    # JSON 編碼：有安裝 orjson 時使用，日期時間直接輸出 ISO 8601
+    # JSON_COMPACT: True 永不縮排, None 僅在 debug 模式縮排, False 一律縮排
+    app.json = FastJSONProvider(app)
+    app.json.compact = app.config.get('JSON_COMPACT')
     
+    # 依資料庫種類調整連線池 / SQLite pragmas（見 backend/db_engine.py）
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_engine.engine_options(app.config)
+
+    # 在 Render / Railway 等反向代理後面，request.remote_addr 改用 X-Forwarded-For 的客戶端位址
+    if app.config.get('PROXY_FIX_X_FOR'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     # Initialize extensions with app
     db.init_app(app)
-    migrate.init_app(app, db)
+    db_engine.init_app(app, db)
+    # 舊資料庫缺少的欄位與索引在啟動時補上（見 backend/schema.py）
+    schema.init_app(app, db)
+    init_migrate(app)
     # 配置 CORS 以接受特定源的請求
     CORS(app, resources={r"/*": {"origins": ["https://ailiteracy4alltest.netlify.app", "http://localhost:3000"]}}, supports_credentials=True)
-    # jwt.init_app(app) # JWT Removed
+    jwt.init_app(app)
+    # 未設定 JWT_SECRET_KEY 的正式環境不簽發也不接受 token（見 backend/auth_tokens.py）
+    auth_tokens.init_app(app)
+    content_cache.init_app(app)
+    login_throttle.init_app(app)
+    # 每個請求的耗時 / SQL 次數，Server-Timing 標頭與 /metrics（見 backend/request_metrics.py）
+    request_metrics.init_app(app, db)
+    # 開發 / 測試模式下偵測 N+1 查詢（見 backend/query_inspector.py）
+    query_detector.init_app(app, db)
+    # 管理員用的線上 profiling，預設關閉（見 backend/profiling.py）
+    profiler.init_app(app)
+    # 程式碼沙箱的執行模式：每次一個容器或 fork server（見 backend/fork_server.py）
+    fork_servers.init_app(app)
+    code_batcher.init_app(app)
 
     # Register blueprints
-    from routes import auth, courses, lessons, progress, users, code_execution, lesson_content, lesson_content_fillblank, student
+    from routes import auth, courses, lessons, progress, users, code_execution, lesson_content, lesson_content_fillblank, student, diagnostics
     # 注册新的code_runner蓝图
     from backend.routes import code_runner
     
@@ -54,5 +105,6 @@ def create_app(test_config=None):
     app.register_blueprint(lesson_content.bp)
     app.register_blueprint(lesson_content_fillblank.bp)
     app.register_blueprint(student.bp)
+    app.register_blueprint(diagnostics.bp)
 
     return app
@@ -6,12 +6,12 @@ from flask import Flask
 # Add parent directory to Python path so that 'backend' can be imported
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  
 
+# Load environment variables before importing backend: the config classes read them at import time
+load_dotenv()
+
 # Now we can import from backend
 from backend import create_app
 
-# Load environment variables
-load_dotenv()
-
 # Create the Flask application
 app = create_app()
 
@@ -0,0 +1,96 @@
+"""Signed, expiring session tokens.
+
+``/api/auth/login`` issues an HS256 access token (flask_jwt_extended, signed
+with JWT_SECRET_KEY) whose subject is the user id and which carries the
+user's role and username as claims. Routes that used to look the caller up
+with ``User.query.get`` only to check the role can read it from the token:
+the signature and expiry are checked once per request and the claims are
+kept on ``g``, so no database round trip is needed.
+
+Requests without a token keep working the old way, with the user id taken
+from the query string or body and checked against the database.
+
+JWT_SECRET_KEY must be set outside DEBUG/TESTING. While it is still the
+default from config.py, anyone could sign a teacher or admin token, so no
+tokens are issued and none are accepted: the app keeps working with the
+old user id parameters only.
+"""
+import secrets
+from flask import g, current_app
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from sqlalchemy import select
+
+
+def init_app(app):
+    from backend.config.config import DEFAULT_JWT_SECRET_KEY
+    enabled = app.config.get('JWT_SECRET_KEY') != DEFAULT_JWT_SECRET_KEY or app.debug or app.testing
+    if not enabled:
+        # @jwt_required verifies tokens itself: a random key makes every token signed with the default fail
+        app.config['JWT_SECRET_KEY'] = secrets.token_urlsafe(32)
+        app.logger.warning('JWT_SECRET_KEY is not set: session tokens are disabled')
+    app.extensions['auth_tokens'] = {'enabled': enabled}
+
+
+def tokens_enabled():
+    return current_app.extensions.get('auth_tokens', {}).get('enabled', False)
+
+
+def issue_token(user):
+    """Signed token for user, or None when tokens are disabled"""
+    if not tokens_enabled():
+        return None
+    # PyJWT requires the subject to be a string
+    return create_access_token(identity=str(user.id),
+                               additional_claims={'role': user.role, 'username': user.username})
+
+
+def token_user():
+    """{'id', 'role', 'username'} from the request's bearer token, or None.
+
+    Missing, expired and tampered tokens all give None. The result is
+    cached for the rest of the request; a token already verified by
+    ``@jwt_required`` is not decoded again.
+    """
+    if '_token_user' in g:
+        return g._token_user
+    user = None
+    if not tokens_enabled():
+        g._token_user = user
+        return user
+    try:
+        if g.get('_jwt_extended_jwt') is None:
+            verify_jwt_in_request(optional=True)
+        claims = get_jwt()
+        if claims:
+            user = {'id': int(claims['sub']), 'role': claims.get('role'), 'username': claims.get('username')}
+    except (JWTExtendedException, PyJWTError, KeyError, ValueError):
+        user = None
+    g._token_user = user
+    return user
+
+
+def request_user(claimed_id=None):
+    """(user id, role) of the caller, or None if unknown.
+
+    A valid token decides without a query; otherwise the claimed id (from
+    the query string or body) is looked up as before.
+    """
+    from backend import db
+    from backend.models.user import User
+    user = token_user()
+    if user:
+        return user['id'], user['role']
+    try:
+        claimed_id = int(claimed_id)
+    except (TypeError, ValueError):
+        return None
+    role = db.session.execute(select(User.role).where(User.id == claimed_id)).scalar()
+    return (claimed_id, role) if role else None
+
+
+def is_admin(user=None):
+    """Whether the token user (default: the caller) is listed in ADMINS"""
+    user = user if user is not None else token_user()
+    return bool(user and user.get('username') in (current_app.config.get('ADMINS') or ()))
@@ -0,0 +1,2 @@
+# Benchmark scripts. Run from the repository root, e.g.
+#   python -m backend.benchmarks.bench_read_models
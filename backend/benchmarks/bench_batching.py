@@ -0,0 +1,115 @@
+"""Throughput versus latency of /api/code/run with micro-batching.
+
+--clients concurrent students each press Run --runs times in a row. Every
+variant uses a different SANDBOX_BATCH_WINDOW_MS (0 = one container per
+run). Docker is replaced by a stand-in whose ``containers.run`` sleeps
+--container-ms (the container start, at most --start-slots at a time, as
+the daemon serialises much of that work) and then runs the command as a
+local process, so batches really execute BATCH_RUNNER and its subprocesses.
+Reports requests per second, p50/p95 latency, the number of container
+starts and the mean batch size. Batching saves container starts, not
+interpreter starts: on a host with few CPUs the subprocesses themselves
+soon become the bottleneck.
+
+    python -m backend.benchmarks.bench_batching
+    python -m backend.benchmarks.bench_batching --clients 40 --container-ms 500 --windows 0,20,50
+"""
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from backend.benchmarks.common import make_app
+
+CODE = "total = sum(i * i for i in range(1000))\nprint('Hello, World!', total)"
+
+
+class _Images:
+    def get(self, name):
+        import docker
+        raise docker.errors.ImageNotFound(name)
+
+
+class _Containers:
+    def __init__(self, container_ms, start_slots):
+        self.container_ms = container_ms
+        self.starting = threading.Semaphore(start_slots)
+        self.started = 0
+
+    def run(self, image, command, volumes=None, stdout=True, stderr=True, **kwargs):
+        self.started += 1
+        with self.starting:
+            time.sleep(self.container_ms / 1000)
+        args = command.split() if isinstance(command, str) else list(command)
+        # 容器內路徑換回主機路徑
+        for host_path, mount in (volumes or {}).items():
+            args = [arg.replace(mount['bind'], host_path) for arg in args]
+        args[0] = sys.executable
+        done = subprocess.run(args, capture_output=True, check=True)
+        return done.stdout + (done.stderr if stderr else b'')
+
+
+class FakeDocker:
+    def __init__(self, container_ms, start_slots):
+        self.images = _Images()
+        self.containers = _Containers(container_ms, start_slots)
+
+
+def run_variant(window_ms, args):
+    from backend.routes import code_runner
+    from backend.code_batcher import code_batcher
+    app = make_app({'QUERY_DETECTOR_ENABLED': False, 'SANDBOX_BATCH_WINDOW_MS': window_ms,
+                    'SANDBOX_BATCH_MAX_SIZE': args.max_batch})
+    docker = FakeDocker(args.container_ms, args.start_slots)
+    code_runner.get_docker_client = lambda: docker
+    code_batcher.batches = code_batcher.runs = 0
+
+    def student(_):
+        client = app.test_client()
+        timings, errors = [], 0
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            response = client.post('/api/code/run', json={'code': CODE})
+            timings.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code != 200
+        return timings, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        results = list(pool.map(student, range(args.clients)))
+    elapsed = time.perf_counter() - start
+    timings = sorted(ms for student_timings, _ in results for ms in student_timings)
+    stats = code_batcher.stats()
+    return {
+        'rps': len(timings) / elapsed,
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'containers': docker.containers.started,
+        'batch': stats['mean_batch_size'] if window_ms else 1.0,
+        'errors': sum(errors for _, errors in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare /api/code/run throughput and latency per batch window')
+    parser.add_argument('--windows', default='0,10,25,50', help='comma separated SANDBOX_BATCH_WINDOW_MS values')
+    parser.add_argument('--clients', type=int, default=30, help='students pressing Run at the same time')
+    parser.add_argument('--runs', type=int, default=3, help='runs per student')
+    parser.add_argument('--container-ms', type=float, default=300, help='simulated container start')
+    parser.add_argument('--start-slots', type=int, default=4,
+                        help='container starts the Docker daemon works on at once')
+    parser.add_argument('--max-batch', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    print(f'{args.clients} clients x {args.runs} runs, container start {args.container_ms:g} ms '
+          f'({args.start_slots} at a time), max batch {args.max_batch}')
+    print(f"  {'window ms':<11}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'containers':>12}{'batch':>7}{'errors':>8}")
+    for window in (int(value) for value in args.windows.split(',')):
+        r = run_variant(window, args)
+        print(f"  {window:<11}{r['rps']:>8.1f}{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}"
+              f"{r['containers']:>12}{r['batch']:>7.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Per-run cost of the fork server versus a fresh interpreter.
+
+Starts backend/sandbox/zygote.py locally (no Docker: this isolates what
+the fork server saves inside a sandbox container, on top of the container
+start that SANDBOX_EXECUTOR = 'forkserver' also removes) and times the same
+snippets run as ``python -c`` subprocesses and as fork server runs.
+
+    python -m backend.benchmarks.bench_forkserver [runs]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+from backend.benchmarks.common import BACKEND_DIR
+from backend.fork_server import ForkServerClient
+
+SANDBOX_DIR = os.path.join(BACKEND_DIR, 'sandbox')
+SNIPPETS = {
+    'print': "print('Hello, World!')",
+    'stdlib imports': 'import json, random, statistics, collections, datetime, decimal\nprint(random.random())',
+}
+
+
+def _summary(timings):
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def time_subprocess(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], capture_output=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return _summary(timings)
+
+
+def time_fork_server(client, code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = client.run(code)
+        assert result['exit_code'] == 0, result['stderr']
+        timings.append((time.perf_counter() - start) * 1000)
+    return _summary(timings)
+
+
+def main(runs=50):
+    socket_dir = tempfile.mkdtemp(prefix='zygote-bench-')
+    socket_path = os.path.join(socket_dir, 'zygote.sock')
+    server = subprocess.Popen([sys.executable, os.path.join(SANDBOX_DIR, 'zygote.py'), socket_path,
+                               os.path.join(SANDBOX_DIR, 'preload-python.txt')], stderr=subprocess.DEVNULL)
+    try:
+        client = ForkServerClient(socket_path)
+        deadline = time.monotonic() + 10
+        while not client.ready():
+            if time.monotonic() > deadline:
+                raise RuntimeError('zygote did not start')
+            time.sleep(0.05)
+
+        print(f'{runs} runs per snippet')
+        print(f"  {'snippet':<18}{'executor':<14}{'p50 ms':>9}{'p95 ms':>9}")
+        for name, code in SNIPPETS.items():
+            for executor, (p50, p95) in (('python -c', time_subprocess(code, runs)),
+                                         ('fork server', time_fork_server(client, code, runs))):
+                print(f'  {name:<18}{executor:<14}{p50:>9.2f}{p95:>9.2f}')
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,44 @@
+"""Serialization time of a teacher gradebook payload with each JSON provider.
+
+    python -m backend.benchmarks.bench_json [students]
+"""
+import sys
+from backend.benchmarks.common import make_app, seed_catalog, measure, report
+
+
+def main(students=500):
+    app = make_app()
+    from flask.json.provider import DefaultJSONProvider
+    from backend import db, json_provider
+    from backend.models.course import Course
+    from routes.progress import get_all_students_progress
+
+    with app.app_context():
+        seed_catalog(courses=1, students=students)
+        course_id = db.session.query(Course.id).scalar()
+        payload = {'students_progress': get_all_students_progress(course_id)}
+
+        stdlib = DefaultJSONProvider(app)
+        fast = json_provider.FastJSONProvider(app)
+        size = len(fast._dumps_bytes(payload))
+        print(f'Gradebook payload for {students} students: {size / 1024:.0f} KiB compact')
+
+        results = {
+            'flask default (compact)': measure(lambda: stdlib.dumps(payload, separators=(',', ':'))),
+            'flask default (indent=2)': measure(lambda: stdlib.dumps(payload, indent=2)),
+        }
+        if json_provider.orjson is not None:
+            results['orjson (compact)'] = measure(lambda: fast._dumps_bytes(payload))
+            results['orjson (indent=2)'] = measure(lambda: fast._dumps_bytes(payload, pretty=True))
+        else:
+            print('orjson is not installed; only the stdlib fallback is measured')
+        orjson, json_provider.orjson = json_provider.orjson, None
+        try:
+            results['stdlib fallback (compact)'] = measure(lambda: fast._dumps_bytes(payload))
+        finally:
+            json_provider.orjson = orjson
+        report('Gradebook serialization', results)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,74 @@
+"""Login throughput under each password hashing setting.
+
+Every login verifies a password hash, so the hash cost caps how many logins
+one core can serve. For each PASSWORD_HASH_METHOD this times POST
+/api/auth/login end to end in a single process and reports logins per
+second per core, plus the one-off cost of the first login of a user whose
+stored hash is upgraded to the new setting.
+
+    python -m backend.benchmarks.bench_login [logins] [method ...]
+"""
+import sys
+import time
+import statistics
+from werkzeug.security import generate_password_hash
+from backend.benchmarks.common import make_app
+
+DEFAULT_METHODS = (
+    'pbkdf2:sha256:50000',
+    'pbkdf2:sha256:150000',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+)
+# Hash stored before the upgrade in the rehash measurement
+LEGACY_METHOD = 'pbkdf2:sha256:1000'
+
+
+def _timed_login(client, username, password):
+    start = time.perf_counter()
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    elapsed = (time.perf_counter() - start) * 1000
+    assert response.status_code == 200, response.get_json()
+    return elapsed
+
+
+def bench_method(method, logins):
+    app = make_app({'PASSWORD_HASH_METHOD': method})
+    from backend import db
+    from backend.models.user import User
+
+    with app.app_context():
+        db.session.add(User(username='student', password='secret', role='student'))
+        legacy = User(username='legacy', role='student')
+        legacy.password_hash = generate_password_hash('secret', method=LEGACY_METHOD)
+        db.session.add(legacy)
+        db.session.commit()
+
+    client = app.test_client()
+    _timed_login(client, 'student', 'secret')  # warm up
+    timings = sorted(_timed_login(client, 'student', 'secret') for _ in range(logins))
+    rehash_ms = _timed_login(client, 'legacy', 'secret')
+    with app.app_context():
+        upgraded = not User.query.filter_by(username='legacy').one().needs_rehash()
+
+    mean = statistics.mean(timings)
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'logins_per_sec': 1000 / mean,
+        'rehash_ms': rehash_ms,
+        'upgraded': upgraded,
+    }
+
+
+def main(logins=20, methods=DEFAULT_METHODS):
+    print(f'{logins} logins per setting, single process (= one core)')
+    print(f"  {'method':<26}{'p50 ms':>10}{'p95 ms':>10}{'logins/s/core':>15}{'first login (rehash) ms':>26}")
+    for method in methods:
+        r = bench_method(method, logins)
+        rehash = f"{r['rehash_ms']:.1f}" + ('' if r['upgraded'] else ' (not upgraded!)')
+        print(f"  {method:<26}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['logins_per_sec']:>15.1f}{rehash:>26}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20, sys.argv[2:] or DEFAULT_METHODS)
@@ -0,0 +1,49 @@
+"""Compare the ORM + to_dict() path with the NamedTuple read models.
+
+    python -m backend.benchmarks.bench_read_models [students]
+"""
+import sys
+from backend.benchmarks.common import make_app, seed_catalog, measure, report
+
+
+def main(students=500):
+    app = make_app()
+    from backend import db
+    from backend.models import read_models
+    from backend.models.user import User
+    from backend.models.course import Course, Unit
+    from backend.models.lesson import Lesson
+    from backend.models.progress import Progress
+
+    with app.app_context():
+        rows = seed_catalog(students=students)
+        print(f'Seeded {students} students and {rows} progress rows')
+        course_id = db.session.query(Course.id).first()[0]
+
+        def fresh(fn):
+            # Each run starts with an empty identity map, like a new request
+            def run():
+                db.session.remove()
+                return fn()
+            return run
+
+        report('GET /api/courses', {
+            'orm to_dict': measure(fresh(lambda: [c.to_dict() for c in Course.query.all()])),
+            'read model': measure(fresh(lambda: [c.to_dict() for c in read_models.course_summaries()])),
+        })
+        report('GET /api/users/students', {
+            'orm to_dict': measure(fresh(lambda: [u.to_dict() for u in User.query.filter_by(role='student').all()])),
+            'read model': measure(fresh(lambda: [u.to_dict() for u in read_models.student_summaries()])),
+        })
+        report('course progress rows (gradebook)', {
+            'orm query': measure(fresh(lambda: [
+                (p.lesson_id, p.get_total_score(), p.completed)
+                for p in Progress.query.join(Lesson).join(Unit).filter(Unit.course_id == course_id).all()])),
+            'read model': measure(fresh(lambda: [
+                (p.lesson_id, p.get_total_score(), p.completed)
+                for p in read_models.progress_summaries(course_id)])),
+        })
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
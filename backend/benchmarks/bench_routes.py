@@ -0,0 +1,209 @@
+"""Latency and SQL query count of the main routes on a synthetic dataset.
+
+Builds a dataset with synthetic_data.generate() (in-memory SQLite unless
+BENCH_DATABASE_URL is set), then sends each route a stream of requests for
+random enrolled students through the test client and reports p50/p95/p99
+latency, the mean and max number of SQL statements per request and any
+non-200 responses or submissions that scored 0. The code sandbox is replaced by a stub that answers with
+the expected output after --sandbox-ms, so the suite runs without Docker.
+
+    python -m backend.benchmarks.bench_routes
+    python -m backend.benchmarks.bench_routes --students 3000 --requests 300 --sandbox-ms 50
+"""
+import time
+import random
+import argparse
+from collections import defaultdict
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from backend.benchmarks.common import make_app
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def stub_sandbox(delay_ms):
+    """Replace the Docker sandbox with a fixed delay and the expected output"""
+    from backend.routes import code_runner
+
+    def execute_python_code(code, *args, **kwargs):
+        time.sleep(delay_ms / 1000)
+        return True, 'Hello, World!', '', '执行成功'
+
+    def execute_python_code_cases(code, inputs, *args, **kwargs):
+        # 以 stdin 評分的練習（synthetic_data 的練習都是）一次沙箱執行所有輸入
+        time.sleep(delay_ms / 1000)
+        return [(True, 'Hello, World!', '', '执行成功')] * len(inputs)
+
+    code_runner.execute_python_code = execute_python_code
+    code_runner.execute_python_code_cases = execute_python_code_cases
+
+
+def _failed(response):
+    """Non-200, or a submission that scored 0: every scenario submits correct answers"""
+    if response.status_code != 200:
+        return True
+    body = response.get_json(silent=True)
+    return isinstance(body, dict) and body.get('score') == 0
+
+
+def _targets():
+    """Enrolled (student, course) pairs and, per course, the lessons of each exercise kind"""
+    from backend import db
+    from backend.models.course import Unit, Enrollment
+    from backend.models.lesson import Lesson, MultipleChoiceQuestion, FillBlankExercise, CodingExercise
+
+    enrollments = db.session.execute(select(Enrollment.student_id, Enrollment.course_id).limit(2000)).all()
+    lessons = {}
+    for kind, model in (('lesson', Lesson), ('multiple_choice', MultipleChoiceQuestion),
+                        ('fill_blank', FillBlankExercise), ('coding', CodingExercise)):
+        lesson_id = Lesson.id if model is Lesson else model.lesson_id
+        statement = select(Unit.course_id, lesson_id).distinct().join(Lesson, Lesson.unit_id == Unit.id)
+        if model is not Lesson:
+            statement = statement.join(model, model.lesson_id == Lesson.id)
+        by_course = defaultdict(list)
+        for course_id, lesson in db.session.execute(statement):
+            by_course[course_id].append(lesson)
+        lessons[kind] = by_course
+    questions = defaultdict(dict)
+    for question_id, lesson_id, correct in db.session.execute(select(
+            MultipleChoiceQuestion.id, MultipleChoiceQuestion.lesson_id, MultipleChoiceQuestion.correct_option_index)):
+        questions[lesson_id][str(question_id)] = correct
+    return enrollments, lessons, questions
+
+
+def scenarios(enrollments, lessons, questions):
+    """name -> function(rng) returning (method, url, json body)"""
+    from backend.synthetic_data import FILL_BLANK_ANSWERS, CODING_SOLUTION
+
+    def pick(rng, kind=None):
+        while True:
+            student_id, course_id = rng.choice(enrollments)
+            if kind is None or lessons[kind].get(course_id):
+                lesson_id = rng.choice(lessons[kind][course_id]) if kind else None
+                return student_id, course_id, lesson_id
+
+    def course_tree(rng):
+        _, course_id, _ = pick(rng)
+        return 'GET', f'/api/courses/{course_id}', None
+
+    def course_units(rng):
+        _, course_id, _ = pick(rng)
+        return 'GET', f'/api/courses/{course_id}/units', None
+
+    def lesson(rng):
+        _, _, lesson_id = pick(rng, 'lesson')
+        return 'GET', f'/api/lessons/{lesson_id}', None
+
+    def course_progress(rng):
+        student_id, course_id, _ = pick(rng)
+        return 'GET', f'/api/progress/course/{course_id}?student_id={student_id}', None
+
+    def dashboard(rng):
+        student_id, _, _ = pick(rng)
+        return 'GET', f'/api/student/dashboard?student_id={student_id}', None
+
+    def enrolled(rng):
+        student_id, _, _ = pick(rng)
+        return 'GET', f'/api/courses/enrolled?student_id={student_id}', None
+
+    def submit_multiple_choice(rng):
+        student_id, _, lesson_id = pick(rng, 'multiple_choice')
+        return 'POST', f'/api/progress/multiple-choice/{lesson_id}', {
+            'student_id': student_id, 'answers': dict(questions[lesson_id])}
+
+    def submit_fill_blank(rng):
+        student_id, _, lesson_id = pick(rng, 'fill_blank')
+        return 'POST', f'/api/progress/fill-blank/{lesson_id}', {
+            'student_id': student_id, 'answers': FILL_BLANK_ANSWERS}
+
+    def submit_code(rng):
+        student_id, _, lesson_id = pick(rng, 'coding')
+        return 'POST', f'/api/code/submit/{lesson_id}', {'student_id': student_id, 'code': CODING_SOLUTION}
+
+    return {
+        'GET course tree': course_tree,
+        'GET course units': course_units,
+        'GET lesson': lesson,
+        'GET course progress': course_progress,
+        'GET student dashboard': dashboard,
+        'GET enrolled courses': enrolled,
+        'POST submit MCQ': submit_multiple_choice,
+        'POST submit fill-blank': submit_fill_blank,
+        'POST submit code (stub)': submit_code,
+    }
+
+
+def run(client, make_request, requests, rng, warmup=5):
+    counter = _QueryCounter()
+    timings, queries, errors = [], [], 0
+    event.listen(Engine, 'before_cursor_execute', counter)
+    try:
+        for position in range(warmup + requests):
+            method, url, body = make_request(rng)
+            counter.count = 0
+            start = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            elapsed = (time.perf_counter() - start) * 1000
+            if position < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(counter.count)
+            errors += _failed(response)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', counter)
+    timings.sort()
+
+    def percentile(q):
+        return timings[min(len(timings) - 1, int(len(timings) * q))]
+
+    return {
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'queries': sum(queries) / len(queries),
+        'max_queries': max(queries),
+        'errors': errors,
+    }
+
+
+def main(argv=None):
+    from backend import synthetic_data
+    parser = argparse.ArgumentParser(description='Benchmark the main routes on synthetic data')
+    synthetic_data.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--sandbox-ms', type=float, default=0, help='delay of the stub code sandbox')
+    parser.add_argument('--only', help='run only the routes whose name contains this text')
+    args = parser.parse_args(argv)
+
+    # TESTING would turn on the N+1 detector, whose stack walks would skew the timings
+    app = make_app({'QUERY_DETECTOR_ENABLED': False})
+    from backend import db
+    with app.app_context():
+        counts = synthetic_data.generate(**synthetic_data.options(args))
+        print(f"Dataset: {args.students} students, "
+              f"{counts['courses']} courses, {counts['lessons']} lessons, {counts['progress']} progress rows, "
+              f"{counts['submissions']} submissions (built in {counts['seconds']:.2f}s)")
+        targets = _targets()
+        db.session.remove()
+    stub_sandbox(args.sandbox_ms)
+
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    print(f'{args.requests} requests per route, single thread')
+    print(f"  {'route':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'max q':>7}{'errors':>8}")
+    for name, make_request in scenarios(*targets).items():
+        if args.only and args.only.lower() not in name.lower():
+            continue
+        r = run(client, make_request, args.requests, rng)
+        print(f"  {name:<26}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['queries']:>9.1f}{r['max_queries']:>7}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
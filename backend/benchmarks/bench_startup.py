@@ -0,0 +1,91 @@
+"""Cold start time of the application factory.
+
+Every gunicorn worker (and every test run) imports ``backend`` and calls
+``create_app`` in a fresh interpreter, so this measures exactly that: each
+run is a new ``python`` process timing its own import + ``create_app``.
+The ``eager imports`` variant imports docker and Flask-Migrate (alembic)
+first, as create_app did before they were deferred, to show what the lazy
+imports save.
+
+Afterwards one run is repeated under ``python -X importtime`` and the
+heaviest top-level imports are listed, cumulative and self time.
+
+    python -m backend.benchmarks.bench_startup [runs] [top]
+"""
+import os
+import re
+import sys
+import statistics
+import subprocess
+from backend.benchmarks.common import BACKEND_DIR
+
+STARTUP = """
+import sys, time
+sys.path[:0] = [{root!r}, {backend!r}]
+start = time.perf_counter()
+{preload}
+from backend import create_app
+create_app()
+print((time.perf_counter() - start) * 1000)
+"""
+
+VARIANTS = {
+    'create_app': '',
+    'create_app, eager imports': 'import docker, flask_migrate',
+}
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def _script(preload=''):
+    return STARTUP.format(root=os.path.dirname(BACKEND_DIR), backend=BACKEND_DIR, preload=preload)
+
+
+def _env():
+    # In-memory database, so no run touches (or creates) a real one
+    return dict(os.environ, DATABASE_URL=os.environ.get('BENCH_DATABASE_URL', 'sqlite://'))
+
+
+def cold_start(preload, runs):
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', _script(preload)], env=_env(),
+                             capture_output=True, text=True, check=True).stdout
+        timings.append(float(out.strip().splitlines()[-1]))
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'min_ms': timings[0],
+        'max_ms': timings[-1],
+    }
+
+
+def import_profile(top):
+    """(cumulative ms, self ms, module) of the heaviest top-level imports of one cold start"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', _script()], env=_env(),
+                            capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Indentation 1 is imported by the script itself; packages imported by backend are at 3
+        if match and len(match.group(3)) <= 3:
+            modules.append((int(match.group(2)) / 1000, int(match.group(1)) / 1000, match.group(4)))
+    modules.sort(reverse=True)
+    return modules[:top]
+
+
+def main(runs=10, top=15):
+    print(f'{runs} cold starts per variant (new interpreter, import backend + create_app)')
+    print(f"  {'variant':<28}{'p50 ms':>10}{'min ms':>10}{'max ms':>10}")
+    for name, preload in VARIANTS.items():
+        r = cold_start(preload, runs)
+        print(f"  {name:<28}{r['p50_ms']:>10.1f}{r['min_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+    print(f'\nHeaviest imports (python -X importtime, top {top})')
+    print(f"  {'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, own, module in import_profile(top):
+        print(f'  {cumulative:>14.1f}{own:>10.1f}  {module}')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
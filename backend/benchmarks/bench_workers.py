@@ -0,0 +1,142 @@
+"""Concurrent /api/code/run throughput per gunicorn worker profile.
+
+Starts gunicorn with gunicorn_config.py once per GUNICORN_PROFILE on a
+local port and fires --concurrency simultaneous clients at it: mostly
+``POST /api/code/run`` plus a share of ``GET /api/courses`` (--reads), so
+database sessions are exercised next to the sandbox waits. The sandbox is
+replaced by a stub that sleeps --sandbox-ms (a ``time.sleep``, which the
+gevent worker patches to yield, the way the Docker client's socket I/O
+does), so no Docker is needed. Reports requests per second, p50/p95
+latency and failed requests.
+
+The database is a temporary SQLite file unless BENCH_DATABASE_URL is set.
+The gevent profile needs ``pip install gevent``.
+
+    python -m backend.benchmarks.bench_workers
+    python -m backend.benchmarks.bench_workers --concurrency 200 --sandbox-ms 500 --workers 2
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from backend.benchmarks.common import BACKEND_DIR, make_app
+
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+PROFILES = ('sync', 'gevent')
+
+
+def stub_app():
+    """gunicorn app factory: the real app with the sandbox replaced by BENCH_SANDBOX_MS of sleep"""
+    from backend import create_app
+    from backend.routes import code_runner
+
+    delay = float(os.environ.get('BENCH_SANDBOX_MS', 200)) / 1000
+
+    def execute_python_code(code, *args, **kwargs):
+        time.sleep(delay)
+        return True, 'Hello, World!\n', '', '执行成功'
+
+    code_runner.execute_python_code = execute_python_code
+    return create_app({'QUERY_DETECTOR_ENABLED': False})
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _call(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def _wait_ready(base, server, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {server.returncode}:\n{server.stderr.read()}')
+        if _call(f'{base}/api/courses')[1]:
+            return
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def run_profile(profile, args, env):
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '-b', f'127.0.0.1:{port}',
+         '--workers', str(args.workers), 'backend.benchmarks.bench_workers:stub_app()'],
+        cwd=ROOT_DIR, env=dict(env, GUNICORN_PROFILE=profile),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        _wait_ready(base, server)
+        rng = random.Random(1)
+        calls = [(f'{base}/api/courses', None) if rng.random() < args.reads else
+                 (f'{base}/api/code/run', {'code': "print('Hello, World!')"})
+                 for _ in range(args.requests)]
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            # warm up every worker before timing
+            list(pool.map(lambda call: _call(*call), calls[:args.concurrency]))
+            start = time.perf_counter()
+            results = list(pool.map(lambda call: _call(*call), calls))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    timings = sorted(ms for ms, _ in results)
+    return {
+        'rps': len(results) / elapsed,
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'errors': sum(not ok for _, ok in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare /api/code/run throughput across gunicorn worker profiles')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='comma separated GUNICORN_PROFILE values')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50, help='simultaneous clients')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--reads', type=float, default=0.2, help='share of GET /api/courses requests')
+    parser.add_argument('--sandbox-ms', type=float, default=200, help='delay of the stub code sandbox')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['BENCH_DATABASE_URL'] = database_url
+        make_app()  # create the tables once, before the workers start
+        env = dict(os.environ, DATABASE_URL=database_url, BENCH_SANDBOX_MS=str(args.sandbox_ms),
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, BACKEND_DIR, os.environ.get('PYTHONPATH')])))
+
+        print(f'{args.requests} requests, {args.concurrency} clients, {args.workers} workers, '
+              f'sandbox {args.sandbox_ms:g} ms, {args.reads:.0%} reads')
+        print(f"  {'profile':<10}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for profile in args.profiles.split(','):
+            try:
+                r = run_profile(profile, args, env)
+            except RuntimeError as e:
+                print(f'  {profile:<10}failed: {str(e).strip().splitlines()[-1]}')
+                continue
+            print(f"  {profile:<10}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
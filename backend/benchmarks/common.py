@@ -0,0 +1,119 @@
+"""Shared helpers for the benchmark scripts.
+
+Every benchmark runs against a throwaway in-memory SQLite database unless
+BENCH_DATABASE_URL is set, so no script ever touches the real database.
+"""
+import os
+import sys
+import time
+import statistics
+import tracemalloc
+from datetime import datetime
+
+# Same path setup as init_db.py: 'backend' and the top-level 'routes' package must both import
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_app(config=None):
+    """Create an app bound to a fresh benchmark database with all tables created"""
+    os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    from backend import create_app, db
+    app = create_app(dict({'TESTING': True}, **(config or {})))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def seed_catalog(courses=5, units_per_course=5, lessons_per_unit=6, students=200, teachers=2):
+    """Bulk insert a course catalog with enrollments and progress for every student.
+
+    Must be called inside an app context. Returns the number of progress rows.
+    """
+    from sqlalchemy import insert
+    from backend import db
+    from backend.models.user import User
+    from backend.models.course import Course, Unit, Enrollment
+    from backend.models.lesson import Lesson, MultipleChoiceQuestion
+    from backend.models.progress import Progress
+
+    now = datetime.utcnow()
+    # A fixed hash keeps seeding fast; benchmarks never log in as these users
+    users = [{'username': f'teacher{i}', 'email': '', 'password_hash': 'x', 'role': 'teacher', 'created_at': now}
+             for i in range(teachers)]
+    users += [{'username': f'student{i}', 'email': f'student{i}@example.com', 'password_hash': 'x',
+               'role': 'student', 'created_at': now} for i in range(students)]
+    db.session.execute(insert(User), users)
+    student_ids = [row[0] for row in db.session.query(User.id).filter_by(role='student')]
+
+    db.session.execute(insert(Course), [
+        {'title': f'Course {c}', 'description': 'Benchmark course', 'creator_id': 1,
+         'created_at': now, 'updated_at': now} for c in range(courses)])
+    course_ids = [row[0] for row in db.session.query(Course.id)]
+    db.session.execute(insert(Unit), [
+        {'title': f'Unit {u}', 'description': '', 'order': u + 1, 'course_id': course_id,
+         'created_at': now, 'updated_at': now}
+        for course_id in course_ids for u in range(units_per_course)])
+    unit_ids = [row[0] for row in db.session.query(Unit.id)]
+    db.session.execute(insert(Lesson), [
+        {'title': f'Lesson {l}', 'description': '', 'order': l + 1, 'unit_id': unit_id,
+         'created_at': now, 'updated_at': now}
+        for unit_id in unit_ids for l in range(lessons_per_unit)])
+    lesson_ids = [row[0] for row in db.session.query(Lesson.id)]
+    db.session.execute(insert(MultipleChoiceQuestion), [
+        {'lesson_id': lesson_id, 'question_text': 'Q?', 'options': '["a", "b"]',
+         'correct_option_index': 0, 'points': 10, 'created_at': now, 'updated_at': now}
+        for lesson_id in lesson_ids])
+    db.session.execute(insert(Enrollment), [
+        {'student_id': student_id, 'course_id': course_id, 'enrolled_at': now}
+        for student_id in student_ids for course_id in course_ids])
+    progress = [
+        {'student_id': student_id, 'lesson_id': lesson_id, 'multiple_choice_score': 10,
+         'completed': True, 'attempts': 1, 'last_attempt_at': now, 'created_at': now, 'updated_at': now,
+         'multiple_choice_results': '{"results": [], "score": 10}'}
+        for student_id in student_ids for lesson_id in lesson_ids[::2]]
+    db.session.execute(insert(Progress), progress)
+    db.session.commit()
+    return len(progress)
+
+
+def measure(fn, repeat=20):
+    """Time fn over several runs and count the memory blocks one run allocates.
+
+    Returns a dict with p50/p95 latency in milliseconds, the number of blocks
+    still allocated after one run (i.e. held by its result) and the peak
+    traced memory of that run in KiB.
+    """
+    fn()  # warm up caches and compiled statements
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    del result
+
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'blocks': blocks,
+        'peak_kib': peak / 1024,
+    }
+
+
+def report(title, results):
+    """Print one table row per benchmark variant"""
+    print(f'\n{title}')
+    print(f"  {'variant':<28}{'p50 ms':>10}{'p95 ms':>10}{'blocks':>10}{'peak KiB':>11}")
+    for name, r in results.items():
+        print(f"  {name:<28}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['blocks']:>10}{r['peak_kib']:>11.1f}")
@@ -0,0 +1,235 @@
+"""Micro-batching of sandbox runs.
+
+When a whole class presses Run at once, every request used to start its own
+container. With SANDBOX_BATCH_WINDOW_MS > 0, runs for the same image that
+arrive within that window share one container: the first run of a batch
+waits up to the window (or until SANDBOX_BATCH_MAX_SIZE runs have joined),
+then starts a single container in which BATCH_RUNNER executes every
+submission as its own ``python`` subprocess, SANDBOX_BATCH_PARALLEL at a
+time, each with the usual timeout. The results are fanned back to the
+waiting requests in order.
+
+The submissions of a batch do not share anything but the container: each
+run gets a private /tmp/run-N with only its own code copied in, its own
+uid, and per-process rlimits (address space, CPU time, file size, no
+forking), so a run that exhausts its memory fails alone and none of them
+can read the batch directory or another run's files. Batching trades up to one window of latency
+for fewer container starts, see backend/benchmarks/bench_batching.py.
+
+Batching only applies to per-run containers; the fork server
+(SANDBOX_EXECUTOR = 'forkserver') already avoids container starts.
+``execute_in_container`` is also how code_runner runs one program against
+several stdin inputs in a single container, batching or not.
+"""
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+# Runs inside the container, as root: python -c BATCH_RUNNER DIR TIMEOUT OUTPUT_LIMIT PARALLEL ADDRESS_SPACE
+# DIR/runs.json lists the runs as {"code": file, "stdin": file or null}. Each run gets /tmp/run-N as its
+# own directory and uid RUN_UID_BASE + N, never sees DIR or the other runs' files, and is limited with
+# rlimits. The runner has no threads, so preexec_fn is safe.
+BATCH_RUNNER = r'''
+import os, sys, json, time, shutil, signal, resource, tempfile, subprocess
+directory, timeout, limit, parallel, address_space = sys.argv[1], float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+RUN_UID_BASE, FILE_SIZE = 20000, 1024 * 1024
+with open(f'{directory}/runs.json') as f:
+    runs = json.load(f)
+as_root = os.geteuid() == 0
+private = tempfile.mkdtemp(prefix='batch-')  # 0700: inputs and outputs, read only by the runner
+
+def limits():
+    cpu = int(timeout) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (FILE_SIZE, FILE_SIZE))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+def start(index, item):
+    work = f'/tmp/run-{index}'
+    shutil.rmtree(work, ignore_errors=True)
+    os.mkdir(work, 0o700)
+    code_path = f'{work}/user_code.py'
+    shutil.copyfile(f"{directory}/{item['code']}", code_path)
+    user = {}
+    if as_root:
+        uid = RUN_UID_BASE + index
+        os.chown(work, uid, uid)
+        os.chown(code_path, uid, uid)
+        user = {'user': uid, 'group': uid, 'extra_groups': []}
+    stdin = open(f"{directory}/{item['stdin']}", 'rb') if item['stdin'] else subprocess.DEVNULL
+    out, err = open(f'{private}/{index}.out', 'w+b'), open(f'{private}/{index}.err', 'w+b')
+    env = dict(os.environ, HOME=work, TMPDIR=work, OPENBLAS_NUM_THREADS='1', OMP_NUM_THREADS='1', MKL_NUM_THREADS='1')
+    process = subprocess.Popen([sys.executable, code_path], cwd=work, stdin=stdin, stdout=out, stderr=err, env=env,
+                               umask=0o077, start_new_session=True, preexec_fn=limits, **user)
+    if item['stdin']:
+        stdin.close()
+    return {'process': process, 'work': work, 'path': code_path, 'out': out, 'err': err,
+            'deadline': time.monotonic() + timeout}
+
+def text(data, path):
+    return data[:limit].decode('utf-8', 'replace').replace(path, '/tmp/user_code.py')
+
+def finish(run, timed_out):
+    outputs = []
+    for f in (run['out'], run['err']):
+        f.seek(0)
+        outputs.append(f.read(limit + 1))
+        f.close()
+    shutil.rmtree(run['work'], ignore_errors=True)
+    code = run['process'].returncode
+    if timed_out:
+        return {'exit_code': -9, 'stdout': text(outputs[0], run['path']), 'stderr': '', 'timed_out': True, 'truncated': False}
+    # 超過 RLIMIT_FSIZE 的輸出會以 SIGXFSZ 結束
+    truncated = max(len(outputs[0]), len(outputs[1])) > limit or code == -signal.SIGXFSZ
+    return {'exit_code': code, 'stdout': text(outputs[0], run['path']), 'stderr': text(outputs[1], run['path']),
+            'timed_out': False, 'truncated': truncated}
+
+results, pending, running = [None] * len(runs), list(enumerate(runs)), {}
+while pending or running:
+    while pending and len(running) < parallel:
+        index, item = pending.pop(0)
+        running[index] = start(index, item)
+    time.sleep(0.005)
+    for index, run in list(running.items()):
+        timed_out = run['process'].poll() is None
+        if timed_out and time.monotonic() < run['deadline']:
+            continue
+        if timed_out:
+            os.killpg(run['process'].pid, signal.SIGKILL)
+            run['process'].wait()
+        results[index] = finish(run, timed_out)
+        del running[index]
+shutil.rmtree(private, ignore_errors=True)
+print(json.dumps(results))
+'''
+CONTAINER_BATCH_DIR = '/tmp/batch'
+# Address space a run may map on top of its memory limit: the interpreter and shared libraries
+# (numpy / OpenBLAS in the data image map well over 100 MB before allocating anything)
+ADDRESS_SPACE_HEADROOM = 256 * 1024 * 1024
+
+
+def _write(directory, name, text):
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+class _Batch:
+    def __init__(self):
+        self.runs = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class CodeBatcher:
+    def __init__(self):
+        self.window = 0.0
+        self.max_size = 16
+        self.parallel = 4
+        self.output_limit = 65536
+        self._open = {}  # key -> _Batch still accepting runs
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.runs = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def init_app(self, app):
+        self.window = app.config.get('SANDBOX_BATCH_WINDOW_MS', 0) / 1000
+        self.max_size = app.config.get('SANDBOX_BATCH_MAX_SIZE', self.max_size)
+        self.parallel = app.config.get('SANDBOX_BATCH_PARALLEL', self.parallel)
+        app.extensions['code_batcher'] = self
+
+    def run(self, key, run, execute_batch):
+        """Result dict of one run ({'code', 'stdin'}), executed with the other runs of its key in this window.
+
+        execute_batch(runs) -> list of result dicts is called by the run that opened the batch.
+        """
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            index = len(batch.runs)
+            batch.runs.append(run)
+            if len(batch.runs) >= self.max_size:
+                del self._open[key]
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+        else:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self.batches += 1
+                self.runs += len(batch.runs)
+            try:
+                batch.results = execute_batch(list(batch.runs))
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def stats(self):
+        with self._lock:
+            return {'batches': self.batches, 'runs': self.runs,
+                    'mean_batch_size': round(self.runs / self.batches, 2) if self.batches else 0.0}
+
+    def execute_in_container(self, client, image, runs, timeout, memory):
+        """Run every {'code', 'stdin'} as a subprocess of one container; one result dict per run
+
+        memory is the per-run limit in bytes, enforced with RLIMIT_AS inside the container so
+        a run that exceeds it fails alone instead of taking the whole batch down.
+        """
+        directory = tempfile.mkdtemp(prefix='code-batch-')
+        try:
+            files, manifest = {}, []
+            for index, run in enumerate(runs):
+                # 同一程式的多組輸入只寫一份程式碼
+                if run['code'] not in files:
+                    files[run['code']] = f'{len(files)}.py'
+                    _write(directory, files[run['code']], run['code'])
+                stdin = None
+                if run.get('stdin') is not None:
+                    stdin = f'{index}.in'
+                    _write(directory, stdin, run['stdin'])
+                manifest.append({'code': files[run['code']], 'stdin': stdin})
+            _write(directory, 'runs.json', json.dumps(manifest))
+            address_space = memory + ADDRESS_SPACE_HEADROOM
+            parallel = min(self.parallel, len(runs)) or 1
+            # 批次目錄維持 0700：只有容器內的 root runner 讀得到，各執行只拿到自己的檔案
+            output = client.containers.run(
+                image=image,
+                command=['python', '-c', BATCH_RUNNER, CONTAINER_BATCH_DIR, str(timeout),
+                         str(self.output_limit), str(parallel), str(address_space)],
+                volumes={directory: {'bind': CONTAINER_BATCH_DIR, 'mode': 'ro'}},
+                # runner 需要 root 才能替每個執行切換 uid，其餘能力一律移除
+                user='root',
+                cap_drop=['ALL'],
+                cap_add=['SETUID', 'SETGID', 'CHOWN', 'FOWNER', 'DAC_OVERRIDE', 'KILL'],
+                network_disabled=True,
+                mem_limit=parallel * address_space + 64 * 1024 * 1024,
+                pids_limit=parallel * 4 + 16,
+                remove=True,
+                stdout=True,
+                stderr=False,
+            )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return json.loads(output)
+
+
+code_batcher = CodeBatcher()
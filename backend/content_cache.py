@@ -0,0 +1,192 @@
+"""In-process cache for course content read models.
+
+Course trees, formatted lessons and answer keys are read on almost every
+student request but only change when a teacher edits content. They are kept
+here in a bounded LRU with a TTL. Any insert/update/delete of a Course, Unit,
+Lesson or exercise row (SQLAlchemy mapper events) clears the cache; edits are
+rare enough that dropping everything is cheaper than tracking dependencies.
+
+With several gunicorn workers, set CONTENT_CACHE_SYNC_PATH to a SQLite file
+shared by all of them. Every commit that changed content bumps a version
+number there, and each worker drops its cache when it sees a newer version
+(checked at most every CONTENT_CACHE_SYNC_INTERVAL seconds).
+
+Bulk statements (``query.delete()``, Core ``insert``) do not fire mapper
+events; code using them must call ``content_cache.invalidate()`` itself.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_MISSING = object()
+
+
+class ContentCache:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sync_path = None
+        self.sync_interval = 1.0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by every invalidate()
+        self._shared_version = None
+        self._next_sync = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('CONTENT_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('CONTENT_CACHE_TTL', self.ttl)
+        self.sync_path = app.config.get('CONTENT_CACHE_SYNC_PATH')
+        self.sync_interval = app.config.get('CONTENT_CACHE_SYNC_INTERVAL', self.sync_interval)
+        if self.sync_path:
+            self._ensure_sync_table()
+            self._shared_version = self._read_shared_version()
+        _register_listeners()
+        app.extensions['content_cache'] = self
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss.
+
+        A loader result of None is returned but not cached, so lookups of
+        missing rows never pin a stale "not found". Neither is a result whose
+        load overlapped an invalidation: it may have read the rows from
+        before the change.
+        """
+        if self.maxsize <= 0:
+            return loader()
+        self._sync()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if generation != self._generation:
+                    return value
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, broadcast=False):
+        """Drop every entry; with broadcast, tell the other workers too"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+        if broadcast and self.sync_path:
+            self._bump_shared_version()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'shared_version': self._shared_version,
+            }
+
+    # Cross-worker invalidation channel
+
+    def _connect(self):
+        return sqlite3.connect(self.sync_path, timeout=1.0, isolation_level=None)
+
+    def _ensure_sync_table(self):
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS content_cache_version '
+                         '(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO content_cache_version (id, version) VALUES (1, 0)')
+        finally:
+            conn.close()
+
+    def _read_shared_version(self):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT version FROM content_cache_version WHERE id = 1').fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def _bump_shared_version(self):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('UPDATE content_cache_version SET version = version + 1 WHERE id = 1')
+                self._shared_version = conn.execute(
+                    'SELECT version FROM content_cache_version WHERE id = 1').fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # Other workers fall back to the TTL; this worker is already clear
+            print(f"Content cache sync failed: {e}")
+
+    def _sync(self):
+        if not self.sync_path:
+            return
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        try:
+            version = self._read_shared_version()
+        except sqlite3.Error as e:
+            print(f"Content cache sync failed: {e}")
+            return
+        if version != self._shared_version:
+            self._shared_version = version
+            self.invalidate()
+
+
+content_cache = ContentCache()
+
+
+def _on_content_change(mapper, connection, target):
+    # Clear right away so this worker stops serving the old version, and
+    # again after commit in case another request re-cached it mid-transaction.
+    content_cache.invalidate()
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['content_changed'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('content_changed', False):
+        content_cache.invalidate(broadcast=True)
+
+
+def _after_rollback(session):
+    session.info.pop('content_changed', None)
+
+
+def _register_listeners():
+    from backend.models.course import Course, Unit
+    from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+
+    for model in (Course, Unit, Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, name, _on_content_change):
+                event.listen(model, name, _on_content_change)
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,350 @@
+"""Streaming exporter for a course and its content.
+
+Writes a course in the courses/*.json schema, so an export can be fed back
+to course_import.py (or POST /api/courses/import) unchanged. Units are
+flattened into one ordered ``lessons`` list because that schema has no
+units. Ids recorded in ``import_keys`` by an earlier import are reused, so
+exporting and re-importing a course updates it in place.
+
+With ``include_activity`` the document also carries ``enrollments``,
+``progress`` and ``submissions`` arrays. The importer ignores those keys.
+
+Nothing is loaded as a whole. Lessons and each exercise table are read
+through their own server-side cursor (``yield_per``), all sorted by the
+same (unit, lesson) key, and merged lesson by lesson while the output is
+produced in chunks. Memory use stays flat regardless of course size.
+
+Usage (from the backend directory):
+    python course_export.py 3 > course.json
+    python course_export.py 3 --format jsonl --activity -o course.jsonl
+"""
+import os
+import sys
+import json
+import argparse
+from sqlalchemy import select, inspect
+
+EXPORT_FORMATS = ('json', 'jsonl')
+YIELD_PER = 500
+# JSON Lines record kind for each activity section
+ACTIVITY_KINDS = {'enrollments': 'enrollment', 'progress': 'progress', 'submissions': 'submission'}
+
+
+def _stream(statement):
+    """Execute a select through a server-side cursor, YIELD_PER rows at a time"""
+    from backend import db
+    return db.session.execute(statement.execution_options(yield_per=YIELD_PER))
+
+
+def _grouped(rows):
+    """Group consecutive rows by their lesson_id"""
+    lesson_id, group = None, []
+    for row in rows:
+        if group and row.lesson_id != lesson_id:
+            yield lesson_id, group
+            group = []
+        lesson_id = row.lesson_id
+        group.append(row)
+    if group:
+        yield lesson_id, group
+
+
+class _ChildStream:
+    """Hands out the child rows of each lesson while walking the lessons in order"""
+
+    def __init__(self, rows):
+        self._groups = _grouped(rows)
+        self._current = next(self._groups, None)
+
+    def take(self, lesson_id):
+        if self._current is None or self._current[0] != lesson_id:
+            return []
+        rows = self._current[1]
+        self._current = next(self._groups, None)
+        return rows
+
+
+def _has_import_keys():
+    from backend import db
+    return inspect(db.engine).has_table('import_keys')
+
+
+def _course_key(course_id):
+    from backend import db
+    from backend.models.course import ImportKey
+    if _has_import_keys():
+        key = db.session.execute(
+            select(ImportKey.external_id)
+            .where(ImportKey.kind == 'course', ImportKey.local_id == course_id)).scalar()
+        if key:
+            return key
+    return f'course-{course_id}'
+
+
+def _lesson_order(statement):
+    from backend.models.course import Unit
+    from backend.models.lesson import Lesson
+    return statement.order_by(Unit.order, Unit.id, Lesson.order, Lesson.id)
+
+
+def _lesson_rows(course_id):
+    from backend.models.course import Unit, ImportKey
+    from backend.models.lesson import Lesson
+    columns = [Lesson.id.label('lesson_id'), Lesson.title, Lesson.description]
+    statement = select(*columns).join(Unit, Lesson.unit_id == Unit.id).where(Unit.course_id == course_id)
+    if _has_import_keys():
+        statement = select(*columns, ImportKey.external_id) \
+            .join(Unit, Lesson.unit_id == Unit.id) \
+            .outerjoin(ImportKey, (ImportKey.kind == 'lesson') & (ImportKey.local_id == Lesson.id)) \
+            .where(Unit.course_id == course_id)
+    return _stream(_lesson_order(statement))
+
+
+def _child_rows(course_id, *columns):
+    from backend.models.course import Unit
+    from backend.models.lesson import Lesson
+    model = columns[0].class_
+    statement = select(model.lesson_id, *columns) \
+        .join(Lesson, model.lesson_id == Lesson.id) \
+        .join(Unit, Lesson.unit_id == Unit.id) \
+        .where(Unit.course_id == course_id)
+    return _stream(_lesson_order(statement).order_by(model.id))
+
+
+def _lesson_key(row, course_key):
+    external_id = getattr(row, 'external_id', None)
+    prefix = f'{course_key}/'
+    if external_id and external_id.startswith(prefix):
+        return external_id[len(prefix):]
+    return f'lesson-{row.lesson_id}'
+
+
+def _load_json(text, default):
+    try:
+        return json.loads(text) if text else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _test_case_document(case):
+    # Same shape course_import reads back: {input, expectedOutput}
+    document = {'expectedOutput': case.get('expected_output', '')}
+    if 'input' in case:
+        document['input'] = case['input']
+    return document
+
+
+def _lesson_document(row, key, coding, questions, fill_blanks):
+    lesson = {
+        'id': key,
+        'title': row.title,
+        'description': row.description or '',
+        'type': 'python-exercise' if coding else 'tutorial',
+    }
+    if coding:
+        exercise = coding[0]
+        lesson['pythonExercise'] = {
+            'id': f'exercise-{exercise.id}',
+            'title': row.title,
+            'description': exercise.instructions or '',
+            'initialCode': exercise.starter_code or '',
+            'testCases': [_test_case_document(case) for case in _load_json(exercise.test_cases, [])
+                          if isinstance(case, dict)],
+            'runtime': exercise.runtime,
+        }
+        if exercise.solution_code:
+            lesson['pythonExercise']['solutionCode'] = exercise.solution_code
+    if questions:
+        lesson['quiz'] = {
+            'type': 'quiz',
+            'questions': [{
+                'id': f'question-{question.id}',
+                'question': question.question_text,
+                'options': _load_json(question.options, []),
+                'correctAnswer': question.correct_option_index,
+                'explanation': question.explanation or '',
+            } for question in questions],
+        }
+    elif fill_blanks:
+        # One fill-in-blank block per lesson in the file format; options are shared by all blanks
+        exercise = fill_blanks[0]
+        blanks = _load_json(exercise.blanks, [])
+        if isinstance(blanks, dict):  # older rows keyed by blank index
+            blanks = [blanks[index] for index in sorted(blanks, key=lambda k: int(k))]
+        options = []
+        for blank in blanks:
+            for option in blank.get('options', []):
+                if option not in options:
+                    options.append(option)
+        lesson['quiz'] = {
+            'type': 'fill-in-blank',
+            'fillInBlankQuestion': {
+                'id': f'fill-blank-{exercise.id}',
+                'text': exercise.text_template,
+                'blanks': [{'id': blank.get('id') or f'b{position}',
+                            'correctAnswer': blank.get('correct_answer', '')}
+                           for position, blank in enumerate(blanks, start=1)],
+                'options': options,
+                'explanation': '',
+            },
+        }
+    return lesson
+
+
+def iter_lessons(course_id, course_key):
+    """Yield (lesson id, export document) for every lesson of a course in order"""
+    from backend.models.lesson import CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+    coding = _ChildStream(_child_rows(
+        course_id, CodingExercise.id, CodingExercise.instructions,
+        CodingExercise.starter_code, CodingExercise.solution_code, CodingExercise.test_cases,
+        CodingExercise.runtime))
+    questions = _ChildStream(_child_rows(
+        course_id, MultipleChoiceQuestion.id, MultipleChoiceQuestion.question_text,
+        MultipleChoiceQuestion.options, MultipleChoiceQuestion.correct_option_index,
+        MultipleChoiceQuestion.explanation))
+    fill_blanks = _ChildStream(_child_rows(
+        course_id, FillBlankExercise.id, FillBlankExercise.text_template, FillBlankExercise.blanks))
+
+    for row in _lesson_rows(course_id):
+        yield row.lesson_id, _lesson_document(
+            row, _lesson_key(row, course_key), coding.take(row.lesson_id),
+            questions.take(row.lesson_id), fill_blanks.take(row.lesson_id))
+
+
+def iter_activity(course_id):
+    """Yield (section, record) for the enrollments, progress and submissions of a course"""
+    from backend.models.user import User
+    from backend.models.course import Unit, Enrollment
+    from backend.models.lesson import Lesson
+    from backend.models.progress import Progress, SubmissionHistory
+
+    enrollments = select(Enrollment.student_id, User.username, Enrollment.enrolled_at) \
+        .join(User, Enrollment.student_id == User.id) \
+        .where(Enrollment.course_id == course_id) \
+        .order_by(Enrollment.id)
+    for row in _stream(enrollments):
+        yield 'enrollments', {'student_id': row.student_id, 'username': row.username,
+                              'enrolled_at': row.enrolled_at}
+
+    progress = select(Progress.student_id, User.username, Progress.lesson_id,
+                      Progress.coding_score, Progress.multiple_choice_score, Progress.fill_blank_score,
+                      Progress.completed, Progress.attempts, Progress.last_attempt_at,
+                      Progress.updated_at, Progress.coding_results,
+                      Progress.multiple_choice_results, Progress.fill_blank_results) \
+        .join(User, Progress.student_id == User.id) \
+        .join(Lesson, Progress.lesson_id == Lesson.id) \
+        .join(Unit, Lesson.unit_id == Unit.id) \
+        .where(Unit.course_id == course_id) \
+        .order_by(Progress.id)
+    for row in _stream(progress):
+        yield 'progress', {
+            'student_id': row.student_id,
+            'username': row.username,
+            'lesson_id': row.lesson_id,
+            'coding_score': row.coding_score,
+            'multiple_choice_score': row.multiple_choice_score,
+            'fill_blank_score': row.fill_blank_score,
+            'completed': row.completed,
+            'attempts': row.attempts,
+            'last_attempt_at': row.last_attempt_at,
+            'updated_at': row.updated_at,
+            'coding_results': _load_json(row.coding_results, {}),
+            'multiple_choice_results': _load_json(row.multiple_choice_results, {}),
+            'fill_blank_results': _load_json(row.fill_blank_results, {}),
+        }
+
+    submissions = select(SubmissionHistory.student_id, User.username, SubmissionHistory.lesson_id,
+                         SubmissionHistory.submission_type, SubmissionHistory.content,
+                         SubmissionHistory.score, SubmissionHistory.feedback,
+                         SubmissionHistory.submitted_at) \
+        .join(User, SubmissionHistory.student_id == User.id) \
+        .join(Lesson, SubmissionHistory.lesson_id == Lesson.id) \
+        .join(Unit, Lesson.unit_id == Unit.id) \
+        .where(Unit.course_id == course_id) \
+        .order_by(SubmissionHistory.id)
+    for row in _stream(submissions):
+        yield 'submissions', dict(row._mapping)
+
+
+def _course_row(course_id):
+    from backend import db
+    from backend.models.course import Course
+    return db.session.execute(
+        select(Course.id, Course.title, Course.description).where(Course.id == course_id)).first()
+
+
+def export_course(course_id, format='json', include_activity=False):
+    """Return a generator of text chunks for one course, or None if it does not exist.
+
+    The course row is read up front so a missing course can be reported
+    before any output has been sent.
+    """
+    from flask import current_app
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format: {format}')
+    course = _course_row(course_id)
+    if course is None:
+        return None
+    course_key = _course_key(course_id)
+    dumps = current_app.json.dumps
+    header = {'id': course_key, 'title': course.title, 'description': course.description or ''}
+
+    def generate_json():
+        yield dumps(header)[:-1] + ',"lessons":['
+        for position, (_, lesson) in enumerate(iter_lessons(course_id, course_key)):
+            yield (',' if position else '') + dumps(lesson)
+        yield ']'
+        if include_activity:
+            section = None
+            for name, record in iter_activity(course_id):
+                if name != section:
+                    yield (',' if section is None else '],') + f'"{name}":['
+                    section, first = name, True
+                yield ('' if first else ',') + dumps(record)
+                first = False
+            if section is not None:
+                yield ']'
+        yield '}\n'
+
+    def generate_jsonl():
+        # One record per line: {"kind": ..., "data": ...}; lessons keep their course order
+        yield dumps({'kind': 'course', 'data': header}) + '\n'
+        for _, lesson in iter_lessons(course_id, course_key):
+            yield dumps({'kind': 'lesson', 'data': lesson}) + '\n'
+        if include_activity:
+            for name, record in iter_activity(course_id):
+                yield dumps({'kind': ACTIVITY_KINDS[name], 'data': record}) + '\n'
+
+    return generate_json() if format == 'json' else generate_jsonl()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export a course in the courses/*.json format')
+    parser.add_argument('course_id', type=int)
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='json')
+    parser.add_argument('--activity', action='store_true', help='include enrollments, progress and submissions')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    # 修復導入路徑問題 (same as init_db.py)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from backend import create_app
+
+    app = create_app()
+    with app.app_context():
+        chunks = export_course(args.course_id, args.format, args.activity)
+        if chunks is None:
+            print(f'Course {args.course_id} not found', file=sys.stderr)
+            return 1
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
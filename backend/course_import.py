@@ -0,0 +1,386 @@
+"""Bulk importer for the course definitions in courses/*.json.
+
+Each file becomes one Course with a single Unit holding its lessons. Quiz
+questions become MultipleChoiceQuestion rows, ``fill-in-blank`` quizzes become
+FillBlankExercise rows and ``pythonExercise`` blocks become CodingExercise
+rows. JSON Lines exports from course_export.py are read as well. Fields without a column in our schema (image,
+skills, experience, tutorial, tags, ...) are skipped.
+
+Imports are idempotent: the JSON ids of courses and lessons are recorded in
+``import_keys``, so importing a file again updates the rows it created
+(a course keeps the owner it was first imported for).
+Questions are matched to existing rows by position within their lesson, which
+keeps question ids (and therefore students' saved answers) stable. Every
+course is written with bulk statements in its own transaction.
+
+Usage (from the backend directory):
+    python course_import.py                # every file in ../courses
+    python course_import.py ../courses/ai_basics.json --creator-id 2
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+from datetime import datetime
+from sqlalchemy import select, insert, update, delete
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; files are then parsed in one go
+    ijson = None
+
+COURSES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'courses'))
+DEFAULT_QUESTION_POINTS = 10
+
+
+def _iter_lessons(path):
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'lessons.item', use_float=True)
+
+
+def _read_jsonl(path):
+    """Split a course_export.py JSON Lines file into (course fields, lessons)"""
+    with open(path, encoding='utf-8') as f:
+        first = json.loads(f.readline() or '{}')
+    if first.get('kind') != 'course':
+        raise ValueError(f'{os.path.basename(path)}: first record must be the course')
+
+    def lessons():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get('kind') == 'lesson':
+                        yield record['data']
+    return first.get('data', {}), lessons()
+
+
+def read_course_file(path):
+    """Parse a course file into (course fields, iterable of lessons).
+
+    With ijson installed the file is parsed incrementally and lessons are
+    yielded one at a time; the top-level fields are collected in a separate
+    pass because their position in the file varies.
+    """
+    if path.endswith('.jsonl'):
+        return _read_jsonl(path)
+    if ijson is None:
+        with open(path, encoding='utf-8') as f:
+            document = json.load(f)
+        return document, document.get('lessons', [])
+
+    meta = {}
+    with open(path, 'rb') as f:
+        for prefix, event, value in ijson.parse(f):
+            if prefix in ('id', 'title', 'description') and event in ('string', 'number'):
+                meta[prefix] = value
+    return meta, _iter_lessons(path)
+
+
+def _load_keys(kind, external_ids):
+    from backend import db
+    from backend.models.course import ImportKey
+    if not external_ids:
+        return {}
+    rows = db.session.execute(
+        select(ImportKey.external_id, ImportKey.local_id)
+        .where(ImportKey.kind == kind, ImportKey.external_id.in_(external_ids)))
+    return dict(rows.all())
+
+
+def _save_keys(kind, mapping):
+    from backend import db
+    from backend.models.course import ImportKey
+    if not mapping:
+        return
+    db.session.execute(delete(ImportKey).where(ImportKey.kind == kind,
+                                               ImportKey.external_id.in_(list(mapping))))
+    now = datetime.utcnow()
+    db.session.execute(insert(ImportKey), [
+        {'kind': kind, 'external_id': external_id, 'local_id': local_id, 'created_at': now}
+        for external_id, local_id in mapping.items()])
+
+
+def _existing_ids(model, ids):
+    from backend import db
+    if not ids:
+        return set()
+    return set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+
+
+def _upsert_one(model, kind, external_id, values, stats, insert_values=None):
+    """Update the row mapped to external_id, or insert it and record the mapping.
+
+    ``insert_values`` are only written when the row is new (e.g. a course's owner).
+    """
+    from backend import db
+    local_id = _load_keys(kind, [external_id]).get(external_id)
+    if local_id is not None and local_id in _existing_ids(model, [local_id]):
+        db.session.execute(update(model).where(model.id == local_id).values(**values))
+        stats['updated'] += 1
+        return local_id
+    local_id = db.session.execute(insert(model).values(**values, **(insert_values or {}))).inserted_primary_key[0]
+    _save_keys(kind, {external_id: local_id})
+    stats['inserted'] += 1
+    return local_id
+
+
+def _lesson_values(lesson, order, unit_id, now):
+    return {
+        'title': lesson.get('title') or f'Lesson {order}',
+        'description': lesson.get('description', ''),
+        'order': order,
+        'unit_id': unit_id,
+        'updated_at': now,
+    }
+
+
+def _test_cases(exercise):
+    # testCases [{input, expectedOutput}] -> stored [{input, expected_output}];
+    # a case without "input" stays output-only
+    cases = []
+    for case in exercise.get('testCases') or []:
+        stored = {'expected_output': case.get('expectedOutput', '')}
+        if 'input' in case:
+            stored['input'] = case['input']
+        cases.append(stored)
+    return cases
+
+
+def _coding_values(lesson, now):
+    from backend.sandbox_images import DEFAULT_RUNTIME
+    exercise = lesson.get('pythonExercise')
+    if not exercise:
+        return None
+    # The lesson's markdown content is the reading that goes with the exercise
+    instructions = '\n\n'.join(part for part in (lesson.get('content'), exercise.get('description')) if part)
+    return {
+        'instructions': instructions,
+        'starter_code': exercise.get('initialCode', ''),
+        # "explanation" is prose for the student, not a reference solution
+        'solution_code': exercise.get('solutionCode', ''),
+        'test_cases': json.dumps(_test_cases(exercise), ensure_ascii=False),
+        'max_score': 100,
+        'runtime': exercise.get('runtime') or DEFAULT_RUNTIME,
+        'updated_at': now,
+    }
+
+
+def _question_values(question, now):
+    return {
+        'question_text': question.get('question', ''),
+        'options': json.dumps(question.get('options', []), ensure_ascii=False),
+        'correct_option_index': question.get('correctAnswer', 0),
+        'explanation': question.get('explanation'),
+        'updated_at': now,
+    }
+
+
+def _fill_blank_values(lesson, now):
+    question = (lesson.get('quiz') or {}).get('fillInBlankQuestion')
+    if not question:
+        return None
+    # Blanks are stored in the format the fill-blank API validates; options are shared
+    options = question.get('options', [])
+    blanks = [{'id': blank.get('id'), 'correct_answer': blank.get('correctAnswer', ''), 'options': options}
+              for blank in question.get('blanks', [])]
+    return {
+        'text_template': question.get('text', ''),
+        'blanks': json.dumps(blanks, ensure_ascii=False),
+        'updated_at': now,
+    }
+
+
+def import_course(meta, lessons, creator_id=1):
+    """Import one course document in a single transaction.
+
+    ``meta`` holds the top-level fields (``id``, ``title``, ``description``)
+    and ``lessons`` is any iterable of lesson objects. Returns a stats dict.
+    """
+    from backend import db
+    from backend.content_cache import content_cache
+    from backend.models.course import Course, Unit
+    from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+
+    if not meta.get('id') or not meta.get('title'):
+        raise ValueError('Course documents need an "id" and a "title"')
+
+    started = time.perf_counter()
+    stats = {'course': meta['id'], 'inserted': 0, 'updated': 0, 'deleted': 0}
+    now = datetime.utcnow()
+    course_key = meta['id']
+
+    try:
+        course_id = _upsert_one(Course, 'course', course_key, {
+            'title': meta['title'], 'description': meta.get('description', ''),
+            'updated_at': now}, stats, insert_values={'creator_id': creator_id})
+        unit_id = _upsert_one(Unit, 'unit', course_key, {
+            'title': meta['title'], 'description': meta.get('description', ''),
+            'order': 1, 'course_id': course_id, 'updated_at': now}, stats)
+
+        # Lessons: bulk update the mapped ones, bulk insert the rest
+        lesson_rows = []  # (external key, lesson values, source lesson)
+        for order, lesson in enumerate(lessons, start=1):
+            lesson_key = f"{course_key}/{lesson.get('id') or order}"
+            lesson_rows.append((lesson_key, _lesson_values(lesson, order, unit_id, now), lesson))
+
+        mapped = _load_keys('lesson', [key for key, _, _ in lesson_rows])
+        alive = _existing_ids(Lesson, list(mapped.values()))
+        updates, inserts, lesson_ids = [], [], {}
+        for key, values, _ in lesson_rows:
+            if mapped.get(key) in alive:
+                lesson_ids[key] = mapped[key]
+                updates.append(dict(values, id=mapped[key]))
+            else:
+                inserts.append(dict(values, created_at=now))
+        if updates:
+            db.session.execute(update(Lesson), updates)
+        if inserts:
+            db.session.execute(insert(Lesson), inserts)
+            # New lessons are identified by their (unit, order) slot
+            new_keys = {values['order']: key for key, values, _ in lesson_rows if key not in lesson_ids}
+            rows = db.session.execute(
+                select(Lesson.id, Lesson.order)
+                .where(Lesson.unit_id == unit_id, Lesson.order.in_(list(new_keys)),
+                       Lesson.id.notin_(list(lesson_ids.values()) or [0]))
+                .order_by(Lesson.id))
+            new_ids = {new_keys[order]: lesson_id for lesson_id, order in rows}
+            _save_keys('lesson', new_ids)
+            lesson_ids.update(new_ids)
+        stats['updated'] += len(updates)
+        stats['inserted'] += len(inserts)
+
+        all_lesson_ids = list(lesson_ids.values())
+
+        # Coding exercises: one per lesson at most
+        existing_coding = dict(db.session.execute(
+            select(CodingExercise.lesson_id, CodingExercise.id)
+            .where(CodingExercise.lesson_id.in_(all_lesson_ids))).all())
+        coding_updates, coding_inserts, coding_deletes = [], [], []
+        # Multiple choice questions: matched to existing rows by position
+        existing_questions = {}
+        for lesson_id, question_id in db.session.execute(
+                select(MultipleChoiceQuestion.lesson_id, MultipleChoiceQuestion.id)
+                .where(MultipleChoiceQuestion.lesson_id.in_(all_lesson_ids))
+                .order_by(MultipleChoiceQuestion.id)):
+            existing_questions.setdefault(lesson_id, []).append(question_id)
+        question_updates, question_inserts, question_deletes = [], [], []
+        # Fill-in-blank exercises: one per lesson at most, the first row is reused
+        existing_fill_blanks = {}
+        for lesson_id, exercise_id in db.session.execute(
+                select(FillBlankExercise.lesson_id, FillBlankExercise.id)
+                .where(FillBlankExercise.lesson_id.in_(all_lesson_ids))
+                .order_by(FillBlankExercise.id)):
+            existing_fill_blanks.setdefault(lesson_id, []).append(exercise_id)
+        fill_updates, fill_inserts, fill_deletes = [], [], []
+
+        for key, _, lesson in lesson_rows:
+            lesson_id = lesson_ids[key]
+            coding = _coding_values(lesson, now)
+            if coding and lesson_id in existing_coding:
+                coding_updates.append(dict(coding, id=existing_coding[lesson_id]))
+            elif coding:
+                coding_inserts.append(dict(coding, lesson_id=lesson_id, created_at=now))
+            elif lesson_id in existing_coding:
+                coding_deletes.append(existing_coding[lesson_id])
+
+            questions = (lesson.get('quiz') or {}).get('questions') or []
+            current = existing_questions.get(lesson_id, [])
+            for position, question in enumerate(questions):
+                values = _question_values(question, now)
+                if position < len(current):
+                    question_updates.append(dict(values, id=current[position]))
+                else:
+                    question_inserts.append(dict(values, lesson_id=lesson_id,
+                                                 points=DEFAULT_QUESTION_POINTS, created_at=now))
+            question_deletes.extend(current[len(questions):])
+
+            fill_blank = _fill_blank_values(lesson, now)
+            current = existing_fill_blanks.get(lesson_id, [])
+            if fill_blank and current:
+                fill_updates.append(dict(fill_blank, id=current[0]))
+            elif fill_blank:
+                fill_inserts.append(dict(fill_blank, lesson_id=lesson_id,
+                                         points=DEFAULT_QUESTION_POINTS, created_at=now))
+            fill_deletes.extend(current[1:] if fill_blank else current)
+
+        for model, updates, inserts, deletes in (
+                (CodingExercise, coding_updates, coding_inserts, coding_deletes),
+                (MultipleChoiceQuestion, question_updates, question_inserts, question_deletes),
+                (FillBlankExercise, fill_updates, fill_inserts, fill_deletes)):
+            if updates:
+                db.session.execute(update(model), updates)
+            if inserts:
+                db.session.execute(insert(model), inserts)
+            if deletes:
+                db.session.execute(delete(model).where(model.id.in_(deletes)))
+            stats['updated'] += len(updates)
+            stats['inserted'] += len(inserts)
+            stats['deleted'] += len(deletes)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Bulk statements bypass the mapper events the content cache listens to
+    content_cache.invalidate(broadcast=True)
+
+    elapsed = time.perf_counter() - started
+    rows = stats['inserted'] + stats['updated'] + stats['deleted']
+    stats.update({
+        'course_id': course_id,
+        'lessons': len(lesson_rows),
+        'seconds': round(elapsed, 4),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else rows,
+    })
+    return stats
+
+
+def import_course_file(path, creator_id=1):
+    meta, lessons = read_course_file(path)
+    stats = import_course(meta, lessons, creator_id=creator_id)
+    stats['file'] = os.path.basename(path)
+    return stats
+
+
+def bundled_course_files(names=None):
+    """Paths of the files in courses/, optionally restricted to the given file names"""
+    paths = sorted(glob.glob(os.path.join(COURSES_DIR, '*.json')) +
+                   glob.glob(os.path.join(COURSES_DIR, '*.jsonl')))
+    if names is None:
+        return paths
+    wanted = {os.path.basename(name) for name in names}
+    return [path for path in paths if os.path.basename(path) in wanted]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import course JSON files into the database')
+    parser.add_argument('paths', nargs='*', help='course JSON or JSONL files (default: every file in courses/)')
+    parser.add_argument('--creator-id', type=int, default=1, help='teacher who owns the imported courses')
+    args = parser.parse_args(argv)
+
+    # 修復導入路徑問題 (same as init_db.py)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from backend import db, create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()  # creates import_keys on databases that predate it
+        total_rows, total_seconds = 0, 0.0
+        for path in args.paths or bundled_course_files():
+            stats = import_course_file(path, creator_id=args.creator_id)
+            rows = stats['inserted'] + stats['updated'] + stats['deleted']
+            total_rows += rows
+            total_seconds += stats['seconds']
+            print(f"{stats['file']}: course {stats['course_id']}, {stats['lessons']} lessons, "
+                  f"{stats['inserted']} inserted / {stats['updated']} updated / {stats['deleted']} deleted "
+                  f"in {stats['seconds']:.3f}s ({stats['rows_per_second']} rows/s)")
+        if total_seconds:
+            print(f"Total: {total_rows} rows in {total_seconds:.3f}s ({total_rows / total_seconds:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Per-backend engine tuning.
+
+``create_app`` used to set nothing but the database URI. This picks engine
+options for the backend the URI points at, from settings in the config
+classes:
+
+* SQLite: every new connection runs the SQLITE_PRAGMAS, by default WAL
+  journaling (readers no longer wait for the writer, which matters with
+  several gunicorn workers on one file), ``synchronous=NORMAL`` (safe with
+  WAL, one fsync per checkpoint instead of per commit), a busy timeout
+  instead of an immediate "database is locked", and a larger page cache and
+  memory map.
+* PostgreSQL / MySQL: a sized connection pool (DB_POOL_SIZE +
+  DB_MAX_OVERFLOW per worker), connections recycled after DB_POOL_RECYCLE
+  seconds and pinged before use, so a restarted database or a dropped idle
+  connection does not fail a request. PostgreSQL also gets a server-side
+  ``statement_timeout`` (DB_STATEMENT_TIMEOUT_MS).
+
+``create_app`` sets SQLALCHEMY_ENGINE_OPTIONS from ``engine_options()``
+before ``db.init_app``; anything already set there wins over the profile.
+``engine_stats()`` reports the pool state for GET /api/diagnostics/db (ADMINS only).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def backend_name(uri):
+    """'sqlite', 'postgresql', 'mysql', ... for a database URI"""
+    return make_url(uri).get_backend_name()
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database, profile first, explicit options last"""
+    backend = backend_name(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if backend in ('postgresql', 'mysql', 'mariadb'):
+        options.update({
+            'pool_size': config.get('DB_POOL_SIZE', 5),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+        })
+        timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+        if backend == 'postgresql' and timeout:
+            options['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def init_app(app, db):
+    """Register the SQLite pragmas on the app's engines. Call after db.init_app(app)"""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+
+def _pool_stats(pool):
+    stats = {'class': type(pool).__name__}
+    # QueuePool reports all of these; StaticPool / NullPool only some
+    for name in ('size', 'checkedin', 'checkedout', 'overflow', 'timeout'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+def _sqlite_settings(engine, pragmas):
+    with engine.connect() as connection:
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in pragmas}
+
+
+def engine_stats(app, db):
+    """Backend, pool state and (SQLite) effective pragmas of every engine of the app"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    stats = {}
+    for bind, engine in db.engines.items():
+        entry = {
+            'backend': engine.dialect.name,
+            'driver': engine.driver,
+            'url': engine.url.render_as_string(hide_password=True),
+            'pool': _pool_stats(engine.pool),
+        }
+        if engine.dialect.name == 'sqlite':
+            entry['pragmas'] = _sqlite_settings(engine, pragmas)
+        stats[bind or 'default'] = entry
+    return stats
@@ -0,0 +1,126 @@
+"""Set-based enrollment of students into courses.
+
+Rosters are handled as sets. All submitted ids are validated with one
+``IN`` query per chunk and diffed against the course's current
+enrollments, and only the difference is written, using bulk statements.
+Rows that stay enrolled are not touched, so their ``enrolled_at`` is kept.
+Inserts use ``ON CONFLICT DO NOTHING`` (``INSERT IGNORE`` on MySQL), so a
+concurrent request enrolling the same student cannot fail the whole batch.
+"""
+from datetime import datetime
+from sqlalchemy import select, insert, delete
+
+# Keeps IN lists well below the bound-parameter limits of SQLite and friends
+CHUNK_SIZE = 500
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start:start + CHUNK_SIZE]
+
+
+def _as_id(value):
+    """Accept ints and digit strings; anything else is not a valid id"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def valid_student_ids(ids):
+    """The subset of ids that belong to existing users with the student role"""
+    from backend import db
+    from backend.models.user import User
+    valid = set()
+    for chunk in _chunks({i for i in ids if i is not None}):
+        valid.update(db.session.execute(
+            select(User.id).where(User.id.in_(chunk), User.role == 'student')).scalars())
+    return valid
+
+
+def enrolled_student_ids(course_id):
+    from backend import db
+    from backend.models.course import Enrollment
+    return set(db.session.execute(
+        select(Enrollment.student_id).where(Enrollment.course_id == course_id)).scalars())
+
+
+def _insert_ignoring_conflicts(table, rows):
+    from backend import db
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(table).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table).on_conflict_do_nothing()
+    elif dialect in ('mysql', 'mariadb'):
+        statement = insert(table).prefix_with('IGNORE')
+    else:
+        statement = insert(table)
+    for chunk in _chunks(rows):
+        db.session.execute(statement, chunk)
+
+
+def _insert_enrollments(course_id, student_ids):
+    from backend.models.course import Enrollment
+    now = datetime.utcnow()
+    _insert_ignoring_conflicts(Enrollment.__table__, [
+        {'student_id': student_id, 'course_id': course_id, 'enrolled_at': now}
+        for student_id in sorted(student_ids)])
+
+
+def bulk_enroll(course_id, student_ids):
+    """Add students to a course without touching existing enrollments.
+
+    Returns one result per submitted id, in the same format (and order) as
+    the original per-student loop: ``success``, ``skipped`` or ``error``.
+    The caller commits.
+    """
+    ids = [_as_id(student_id) for student_id in student_ids]
+    valid = valid_student_ids(ids)
+    added = valid - enrolled_student_ids(course_id)
+    _insert_enrollments(course_id, added)
+
+    results, reported = [], set()
+    for raw_id, student_id in zip(student_ids, ids):
+        if student_id not in valid:
+            results.append({'student_id': raw_id, 'status': 'error', 'message': 'Invalid student ID'})
+        elif student_id in added and student_id not in reported:
+            reported.add(student_id)
+            results.append({'student_id': raw_id, 'status': 'success', 'message': 'Student enrolled successfully'})
+        else:
+            results.append({'student_id': raw_id, 'status': 'skipped', 'message': 'Student already enrolled'})
+    return results
+
+
+def sync_enrollments(course_id, student_ids):
+    """Make the course roster equal to the valid ids among student_ids.
+
+    Students already enrolled keep their row (and ``enrolled_at``); only the
+    missing ones are inserted and the extra ones deleted. Returns counts and
+    the ids that were skipped as invalid. The caller commits.
+    """
+    from backend import db
+    from backend.models.course import Enrollment
+    ids = [_as_id(student_id) for student_id in student_ids]
+    valid = valid_student_ids(ids)
+    enrolled = enrolled_student_ids(course_id)
+
+    added = valid - enrolled
+    _insert_enrollments(course_id, added)
+    removed = sorted(enrolled - valid)
+    for chunk in _chunks(removed):
+        db.session.execute(delete(Enrollment).where(
+            Enrollment.course_id == course_id, Enrollment.student_id.in_(chunk)))
+
+    return {
+        'added': len(added),
+        'removed': len(removed),
+        'unchanged': len(enrolled & valid),
+        'invalid': [raw_id for raw_id, student_id in zip(student_ids, ids) if student_id not in valid],
+    }
@@ -0,0 +1,193 @@
+"""Fork-server execution mode for the code sandbox.
+
+With SANDBOX_EXECUTOR = 'forkserver', code_runner no longer starts a
+container per run. Each worker process keeps one long-lived container per
+runtime running backend/sandbox/zygote.py, which has the image's preload
+list already imported and forks a child per submission (a uid and a /tmp
+directory of its own per slot, rlimits, no network). A run then costs a fork
+and a round trip over a Unix socket instead of a container start and an
+interpreter start.
+
+The socket lives in a private host directory (created under
+SANDBOX_FORKSERVER_SOCKET_DIR, or the system temporary directory by
+default) bind-mounted into the container. When the
+backend itself runs in a container that talks to the host's Docker daemon,
+point it at a directory mounted at the same path in both.
+
+Only the managed images (sandbox_images.py) contain the zygote; while a
+runtime's image is not built, runs of that runtime go through per-run
+containers as before. A zygote container that died is restarted on the
+next run.
+"""
+import os
+import json
+import time
+import shutil
+import atexit
+import socket
+import tempfile
+import threading
+
+HEADER_SIZE = 4
+CONTAINER_SOCKET_DIR = '/run/zygote'
+ZYGOTE_COMMAND = ['python', '/opt/sandbox/zygote.py', f'{CONTAINER_SOCKET_DIR}/zygote.sock',
+                  '/opt/sandbox/preload.txt']
+
+
+class ForkServerUnavailable(Exception):
+    pass
+
+
+def _recv_exact(conn, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('fork server closed the connection')
+        data += chunk
+    return bytes(data)
+
+
+class ForkServerClient:
+    """Sends runs to a zygote listening on a Unix socket"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+
+    def run(self, code, timeout=10, memory=None, output_limit=65536, stdin=None):
+        """Result dict of one run (see zygote.py); raises OSError when the zygote is unreachable"""
+        request = {'code': code, 'timeout': timeout, 'memory': memory, 'output_limit': output_limit,
+                   'stdin': stdin}
+        payload = json.dumps(request).encode()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            # 逾時由 zygote 執行，這裡只多留一點往返時間
+            conn.settimeout(timeout + 5)
+            conn.connect(self.socket_path)
+            conn.sendall(len(payload).to_bytes(HEADER_SIZE, 'big') + payload)
+            size = int.from_bytes(_recv_exact(conn, HEADER_SIZE), 'big')
+            return json.loads(_recv_exact(conn, size))
+
+    def ready(self):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.connect(self.socket_path)
+            return True
+        except OSError:
+            return False
+
+
+class _ZygoteContainer:
+    def __init__(self, image, socket_base=None):
+        self.image = image
+        self.socket_base = socket_base
+        self.socket_dir = None
+        self.client = None
+        self.container = None
+
+    def start(self, docker_client, max_children, mem_limit, start_timeout):
+        # 名稱不可預測、0700 且屬於 worker：容器內的 zygote 以 root (DAC_OVERRIDE) 建立 socket，
+        # 子程序 (uid 20000+N) 無法刪除或替換它；socket 本身為 0666 供 worker 連線
+        tag = self.image.rsplit(':', 1)[-1]
+        self.socket_dir = tempfile.mkdtemp(prefix=f'final-form-zygote-{os.getpid()}-{tag}-', dir=self.socket_base)
+        self.client = ForkServerClient(os.path.join(self.socket_dir, 'zygote.sock'))
+        self.container = docker_client.containers.run(
+            image=self.image,
+            command=ZYGOTE_COMMAND + ['--max-children', str(max_children)],
+            detach=True,
+            auto_remove=True,
+            volumes={self.socket_dir: {'bind': CONTAINER_SOCKET_DIR, 'mode': 'rw'}},
+            network_disabled=True,
+            read_only=True,
+            # /tmp 只有 zygote (root) 可寫，子程序只能寫自己的 /tmp/run-N
+            tmpfs={'/tmp': 'size=64m,mode=755'},
+            mem_limit=mem_limit,
+            pids_limit=max_children * 4 + 16,
+            # root 只為了切換到每個 slot 的 uid、建立與清除工作目錄、終止子程序；子程序沒有任何 capability
+            user='root',
+            cap_drop=['ALL'],
+            cap_add=['SETUID', 'SETGID', 'CHOWN', 'FOWNER', 'DAC_OVERRIDE', 'KILL'],
+            security_opt=['no-new-privileges'],
+            environment={'OPENBLAS_NUM_THREADS': '1', 'OMP_NUM_THREADS': '1', 'MKL_NUM_THREADS': '1'},
+            labels={'final-form.role': 'sandbox-zygote', 'final-form.owner-pid': str(os.getpid())},
+        )
+        deadline = time.monotonic() + start_timeout
+        while not self.client.ready():
+            if time.monotonic() > deadline:
+                self.stop()
+                raise ForkServerUnavailable(f'zygote in {self.image} did not start')
+            time.sleep(0.05)
+
+    def stop(self):
+        container, self.container = self.container, None
+        if container is not None:
+            try:
+                container.kill()
+            except Exception:
+                pass
+        if self.socket_dir is not None:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+class ForkServerPool:
+    def __init__(self):
+        self.enabled = False
+        self.socket_dir = None
+        self.max_children = 8
+        self.mem_limit = '512m'
+        self.start_timeout = 30
+        self._zygotes = {}  # image -> _ZygoteContainer
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SANDBOX_EXECUTOR', 'container') == 'forkserver'
+        self.socket_dir = app.config.get('SANDBOX_FORKSERVER_SOCKET_DIR') or self.socket_dir
+        self.max_children = app.config.get('SANDBOX_FORKSERVER_MAX_CHILDREN', self.max_children)
+        self.mem_limit = app.config.get('SANDBOX_FORKSERVER_MEMORY', self.mem_limit)
+        self.start_timeout = app.config.get('SANDBOX_FORKSERVER_START_TIMEOUT', self.start_timeout)
+        app.extensions['fork_servers'] = self
+
+    def _zygote(self, docker_client, image):
+        if os.getpid() != self._pid:
+            # gunicorn fork 之後，每個 worker 各自啟動自己的 zygote 容器
+            self._zygotes, self._pid = {}, os.getpid()
+        with self._lock:
+            zygote = self._zygotes.get(image)
+            if zygote is None:
+                zygote = _ZygoteContainer(image, self.socket_dir)
+                zygote.start(docker_client, self.max_children, self.mem_limit, self.start_timeout)
+                self._zygotes[image] = zygote
+            return zygote
+
+    def run(self, docker_client, image, code, timeout=10, memory=None, stdin=None):
+        """Run code in the image's zygote, starting or restarting it as needed; returns the result dict"""
+        for attempt in range(2):
+            try:
+                return self._zygote(docker_client, image).client.run(code, timeout, memory, stdin=stdin)
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                # 連不上表示容器已結束（程式碼尚未執行）：重新啟動一次再試
+                self.discard(image)
+                if attempt:
+                    raise ForkServerUnavailable(str(e)) from e
+            except OSError as e:
+                # 執行中斷線，不重跑使用者程式碼
+                self.discard(image)
+                raise ForkServerUnavailable(str(e)) from e
+
+    def discard(self, image):
+        with self._lock:
+            zygote = self._zygotes.pop(image, None)
+        if zygote is not None:
+            zygote.stop()
+
+    def stop_all(self):
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            zygotes, self._zygotes = list(self._zygotes.values()), {}
+        for zygote in zygotes:
+            zygote.stop()
+
+
+fork_servers = ForkServerPool()
+atexit.register(fork_servers.stop_all)
@@ -0,0 +1,54 @@
+"""Conditional GET support for content that only changes when a teacher edits it.
+
+Views decorated with ``conditional_get`` get an ETag and Last-Modified header
+derived from a cheap version query (see ``read_models.course_tree_version``).
+When the client or a CDN already holds that version the view is skipped and
+an empty 304 is returned, so the body is never built or serialized.
+"""
+from functools import wraps
+from flask import current_app, request, make_response
+from werkzeug.http import is_resource_modified
+
+
+def _cache_control(response):
+    # Browsers always revalidate; a shared cache (CDN) may serve its copy for
+    # HTTP_CACHE_S_MAXAGE seconds before revalidating with the ETag.
+    s_maxage = current_app.config.get('HTTP_CACHE_S_MAXAGE', 30)
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.cache_control.s_maxage = s_maxage
+    response.cache_control.must_revalidate = True
+
+
+def _apply_validators(response, version):
+    response.set_etag(version.etag, weak=True)
+    if version.last_modified:
+        response.last_modified = version.last_modified
+    _cache_control(response)
+
+
+def conditional_get(version_func):
+    """Answer conditional requests for a view from ``version_func(**view_args)``.
+
+    ``version_func`` returns a ContentVersion, or None when the resource does
+    not exist, in which case the view runs as usual (and reports the 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = version_func(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            if not is_resource_modified(request.environ, etag=version.etag,
+                                        last_modified=version.last_modified):
+                response = current_app.response_class(status=304)
+                _apply_validators(response, version)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _apply_validators(response, version)
+            return response
+        return wrapper
+    return decorator
@@ -7,6 +7,7 @@ from flask import Flask
 # 修復導入路徑問題
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # 添加父目錄到路徑
 from backend import db, create_app
+from backend.schema import upgrade_schema
 from backend.models.user import User
 from backend.models.course import Course, Unit, Enrollment
 from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
@@ -18,6 +19,7 @@ def init_db():
     with app.app_context():
         # Create tables
         db.create_all()
+        upgrade_schema(db)
         
         # Check if data already exists
         if User.query.first() is not None:
@@ -189,5 +191,20 @@ def init_db():
         
         print("Database initialized with sample data!")
 
-if __name__ == "__main__":
+def main(argv=None):
+    import argparse
+    from backend import synthetic_data
+    parser = argparse.ArgumentParser(description='Create the tables and the sample data')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='also add a synthetic dataset of the size below (see synthetic_data.py)')
+    synthetic_data.add_arguments(parser)
+    args = parser.parse_args(argv)
+
     init_db()
+    if args.synthetic:
+        app = create_app()
+        with app.app_context():
+            synthetic_data.report(synthetic_data.generate(**synthetic_data.options(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""JSON provider for the Flask app.
+
+Uses orjson when it is installed and falls back to the stdlib ``json``
+module otherwise. Both paths encode ``datetime``/``date`` values as ISO 8601
+strings, so models and read models can return them as-is instead of calling
+``isoformat()`` themselves.
+"""
+import datetime
+from flask.json.provider import DefaultJSONProvider, _default as _flask_default
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    return _flask_default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with ISO datetimes and an orjson fast path.
+
+    ``compact`` keeps Flask's meaning: ``True`` never pretty-prints, ``None``
+    pretty-prints only in debug mode and ``False`` always does.
+    """
+
+    default = staticmethod(_default)
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def _orjson_option(self, pretty=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, pretty=False):
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_option(pretty))
+            except TypeError:
+                # e.g. integers beyond 64 bits; the stdlib encoder handles those
+                pass
+        if pretty:
+            return super().dumps(obj, indent=2).encode('utf-8')
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj, self._pretty()) + b'\n',
+                                         mimetype=self.mimetype)
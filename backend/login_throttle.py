@@ -0,0 +1,229 @@
+"""Login throttling against password guessing and credential stuffing.
+
+Failed logins are tracked in a sliding window, per username and per client
+IP. A login is rejected *before* its password hash is checked when:
+
+* the username has LOGIN_THROTTLE_MAX_USER_FAILURES failures in the last
+  LOGIN_THROTTLE_WINDOW seconds (locked out),
+* the IP has LOGIN_THROTTLE_MAX_IP_FAILURES failures in the window, or
+* it arrives sooner than the progressive delay after the username's last
+  failure (LOGIN_THROTTLE_DELAY doubled per failure, up to
+  LOGIN_THROTTLE_MAX_DELAY).
+
+Rejected attempts cost a dictionary lookup instead of a hash check and
+never sleep in the worker; the client is told when to retry instead. A
+successful login clears the username's failures.
+
+Failures are kept in a bounded LRU (LOGIN_THROTTLE_MAX_KEYS keys), so a
+flood of random usernames cannot exhaust memory; the oldest keys are
+dropped first. With several workers, set LOGIN_THROTTLE_STORE_PATH to a
+SQLite file shared by all of them. Behind a reverse proxy, set
+PROXY_FIX_X_FOR to the number of proxies so ``request.remote_addr`` is the
+client address and not the proxy's (create_app installs werkzeug's ProxyFix).
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class _MemoryStore:
+    """Failure timestamps per key in a bounded LRU"""
+
+    def __init__(self, max_keys, max_per_key):
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self._keys = OrderedDict()  # key -> deque of failure times, oldest first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def recent(self, key, since):
+        with self._lock:
+            failures = self._keys.get(key)
+            if not failures:
+                return []
+            self._keys.move_to_end(key)
+            return [at for at in failures if at > since]
+
+    def add(self, key, at):
+        with self._lock:
+            failures = self._keys.get(key)
+            if failures is None:
+                failures = self._keys[key] = deque(maxlen=self.max_per_key)
+            failures.append(at)
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def size(self):
+        return len(self._keys)
+
+
+class _SQLiteStore:
+    """Failure timestamps in a SQLite file shared by all workers.
+
+    Expired rows and keys beyond max_keys are pruned at most once a minute.
+    """
+
+    def __init__(self, path, max_keys, max_per_key, window):
+        self.path = path
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self.window = window
+        self.evictions = 0
+        self._next_prune = 0.0
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS login_failures (key TEXT NOT NULL, at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_login_failures_key_at ON login_failures (key, at)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+
+    def recent(self, key, since):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT at FROM login_failures WHERE key = ? AND at > ? ORDER BY at DESC LIMIT ?',
+                                (key, since, self.max_per_key)).fetchall()
+            return [row[0] for row in reversed(rows)]
+        finally:
+            conn.close()
+
+    def add(self, key, at):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT INTO login_failures (key, at) VALUES (?, ?)', (key, at))
+            if at >= self._next_prune:
+                # Expired rows are useless; past max_keys, the least recently failed keys go
+                self._next_prune = at + 60
+                conn.execute('DELETE FROM login_failures WHERE at <= ?', (at - self.window,))
+                deleted = conn.execute(
+                    'DELETE FROM login_failures WHERE key IN (SELECT key FROM login_failures GROUP BY key '
+                    'ORDER BY MAX(at) DESC LIMIT -1 OFFSET ?)', (self.max_keys,)).rowcount
+                self.evictions += max(deleted, 0)
+        finally:
+            conn.close()
+
+    def clear(self, key):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM login_failures WHERE key = ?', (key,))
+        finally:
+            conn.close()
+
+    def size(self):
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COUNT(DISTINCT key) FROM login_failures').fetchone()[0]
+        finally:
+            conn.close()
+
+
+class LoginThrottle:
+    def __init__(self, window=300, max_user_failures=5, max_ip_failures=50,
+                 delay=0.5, max_delay=8.0, max_keys=10000):
+        self.enabled = True
+        self.window = window
+        self.max_user_failures = max_user_failures
+        self.max_ip_failures = max_ip_failures
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        self.store = self._memory_store()
+        self._counter_lock = threading.Lock()
+        self.counters = {'blocked_user': 0, 'blocked_ip': 0, 'blocked_delay': 0,
+                         'failures': 0, 'successes': 0}
+
+    def _memory_store(self):
+        return _MemoryStore(self.max_keys, max(self.max_user_failures, self.max_ip_failures))
+
+    def init_app(self, app):
+        self.enabled = app.config.get('LOGIN_THROTTLE_ENABLED', self.enabled)
+        self.window = app.config.get('LOGIN_THROTTLE_WINDOW', self.window)
+        self.max_user_failures = app.config.get('LOGIN_THROTTLE_MAX_USER_FAILURES', self.max_user_failures)
+        self.max_ip_failures = app.config.get('LOGIN_THROTTLE_MAX_IP_FAILURES', self.max_ip_failures)
+        self.delay = app.config.get('LOGIN_THROTTLE_DELAY', self.delay)
+        self.max_delay = app.config.get('LOGIN_THROTTLE_MAX_DELAY', self.max_delay)
+        self.max_keys = app.config.get('LOGIN_THROTTLE_MAX_KEYS', self.max_keys)
+        path = app.config.get('LOGIN_THROTTLE_STORE_PATH')
+        if path:
+            self.store = _SQLiteStore(path, self.max_keys,
+                                      max(self.max_user_failures, self.max_ip_failures), self.window)
+        else:
+            self.store = self._memory_store()
+        app.extensions['login_throttle'] = self
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def check(self, username, ip):
+        """Return seconds until the attempt may be made, 0 if it may go ahead now"""
+        if not self.enabled:
+            return 0
+        now = time.time()
+        since = now - self.window
+        try:
+            user_failures = self.store.recent(f'user:{username}', since)
+            ip_failures = self.store.recent(f'ip:{ip}', since) if ip else []
+        except sqlite3.Error as e:
+            # Fail open: a broken store must not lock everyone out
+            print(f"Login throttle store failed: {e}")
+            return 0
+
+        if len(user_failures) >= self.max_user_failures:
+            self._count('blocked_user')
+            return user_failures[-self.max_user_failures] + self.window - now
+        if len(ip_failures) >= self.max_ip_failures:
+            self._count('blocked_ip')
+            return ip_failures[-self.max_ip_failures] + self.window - now
+        if user_failures:
+            delay = min(self.delay * 2 ** (len(user_failures) - 1), self.max_delay)
+            wait = user_failures[-1] + delay - now
+            if wait > 0:
+                self._count('blocked_delay')
+                return wait
+        return 0
+
+    def record_failure(self, username, ip):
+        if not self.enabled:
+            return
+        self._count('failures')
+        now = time.time()
+        try:
+            self.store.add(f'user:{username}', now)
+            if ip:
+                self.store.add(f'ip:{ip}', now)
+        except sqlite3.Error as e:
+            print(f"Login throttle store failed: {e}")
+
+    def record_success(self, username, ip):
+        if not self.enabled:
+            return
+        self._count('successes')
+        try:
+            self.store.clear(f'user:{username}')
+        except sqlite3.Error as e:
+            print(f"Login throttle store failed: {e}")
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        counters['blocked'] = counters['blocked_user'] + counters['blocked_ip'] + counters['blocked_delay']
+        counters.update({
+            'tracked_keys': self.store.size(),
+            'max_keys': self.max_keys,
+            'evictions': self.store.evictions,
+            'shared': isinstance(self.store, _SQLiteStore),
+        })
+        return counters
+
+
+login_throttle = LoginThrottle()
@@ -21,8 +21,8 @@ class Course(db.Model):
             'title': self.title,
             'description': self.description,
             'creator_id': self.creator_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'units_count': len(self.units) if self.units else 0,
             'enrollment_count': len(self.enrollments) if self.enrollments else 0,
             'total_lessons_in_course': sum(len(unit.lessons) for unit in self.units if unit.lessons) if self.units else 0
@@ -53,8 +53,8 @@ class Unit(db.Model):
             'description': self.description,
             'order': self.order,
             'course_id': self.course_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'lessons_count': len(self.lessons) if self.lessons else 0
         }
     
@@ -78,8 +78,24 @@ class Enrollment(db.Model):
             'id': self.id,
             'student_id': self.student_id,
             'course_id': self.course_id,
-            'enrolled_at': self.enrolled_at.isoformat() if self.enrolled_at else None
+            'enrolled_at': self.enrolled_at
         }
     
     def __repr__(self):
         return f'<Enrollment {self.student_id} in {self.course_id}>'
+
+
+class ImportKey(db.Model):
+    """Maps the string ids used in courses/*.json to local row ids, so re-importing a file updates instead of duplicating"""
+    __tablename__ = 'import_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'course', 'unit' or 'lesson'
+    external_id = db.Column(db.String(200), nullable=False)
+    local_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('kind', 'external_id', name='unique_import_key'),)
+    
+    def __repr__(self):
+        return f'<ImportKey {self.kind}:{self.external_id} -> {self.local_id}>'
@@ -1,7 +1,13 @@
 from backend import db
+from backend.sandbox_images import DEFAULT_RUNTIME
+from sqlalchemy.orm import deferred, undefer_group
 from datetime import datetime
 import json
 
+# Deferred column groups: large text columns that list queries never need.
+# Use the summary_query() helpers (or undefer_group) to load them on demand.
+CODING_EXERCISE_TEXT = 'coding_exercise_text'
+
 class Lesson(db.Model):
     __tablename__ = 'lessons'
     
@@ -29,8 +35,8 @@ class Lesson(db.Model):
             'description': self.description,
             'order': self.order,
             'unit_id': self.unit_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'has_coding_exercise': self.coding_exercise is not None,
             'multiple_choice_count': len(self.multiple_choice_questions) if self.multiple_choice_questions else 0,
             'fill_blank_count': len(self.fill_blank_exercises) if self.fill_blank_exercises else 0
@@ -45,20 +51,41 @@ class CodingExercise(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'), nullable=False, unique=True)
-    instructions = db.Column(db.Text, nullable=False)
-    starter_code = db.Column(db.Text)
-    solution_code = db.Column(db.Text, nullable=False)
+    instructions = deferred(db.Column(db.Text, nullable=False), group=CODING_EXERCISE_TEXT)
+    starter_code = deferred(db.Column(db.Text), group=CODING_EXERCISE_TEXT)
+    solution_code = deferred(db.Column(db.Text, nullable=False), group=CODING_EXERCISE_TEXT)
     test_cases = db.Column(db.Text, nullable=False)  # Stored as JSON string
     max_score = db.Column(db.Integer, default=100)
+    # Sandbox image the code runs in, see sandbox_images.RUNTIMES
+    runtime = db.Column(db.String(32), nullable=False, default=DEFAULT_RUNTIME, server_default=DEFAULT_RUNTIME)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @classmethod
+    def summary_query(cls, include_text=False):
+        """Query exercises without instructions/starter/solution code unless asked for"""
+        query = cls.query
+        if include_text:
+            query = query.options(undefer_group(CODING_EXERCISE_TEXT))
+        return query
+    
     def get_test_cases(self):
         return json.loads(self.test_cases)
     
     def set_test_cases(self, test_cases_list):
         self.test_cases = json.dumps(test_cases_list)
     
+    def get_input_tests(self):
+        """Test cases that feed stdin ({'input', 'expected_output'}); empty for output-only exercises
+
+        An exercise is input-driven when any case has an 'input' key, even an empty one; then
+        every case is graded that way and a case without 'input' runs with empty stdin.
+        """
+        cases = [case for case in self.get_test_cases() if isinstance(case, dict)]
+        if not any('input' in case for case in cases):
+            return []
+        return [dict(case, input=case.get('input') or '') for case in cases]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -68,8 +95,9 @@ class CodingExercise(db.Model):
             'solution_code': self.solution_code,
             'test_cases': self.get_test_cases(),
             'max_score': self.max_score,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'runtime': self.runtime,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
@@ -104,8 +132,8 @@ class MultipleChoiceQuestion(db.Model):
             'correct_option_index': self.correct_option_index,
             'explanation': self.explanation,
             'points': self.points,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
@@ -136,8 +164,8 @@ class FillBlankExercise(db.Model):
             'text_template': self.text_template,
             'blanks': self.get_blanks(),
             'points': self.points,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
     
     def __repr__(self):
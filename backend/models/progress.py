@@ -1,7 +1,13 @@
 from backend import db
+from sqlalchemy.orm import deferred, undefer_group
 from datetime import datetime
 import json
 
+# Deferred column groups: JSON result blobs and submitted source code are only
+# needed by detail views. Use the summary_query() helpers to load them on demand.
+PROGRESS_RESULTS = 'progress_results'
+SUBMISSION_CONTENT = 'submission_content'
+
 class Progress(db.Model):
     __tablename__ = 'progress'
     
@@ -18,13 +24,21 @@ class Progress(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Store detailed results as JSON
-    coding_results = db.Column(db.Text)  # JSON string with test case results
-    multiple_choice_results = db.Column(db.Text)  # JSON string with question results
-    fill_blank_results = db.Column(db.Text)  # JSON string with blank results
+    coding_results = deferred(db.Column(db.Text), group=PROGRESS_RESULTS)  # JSON string with test case results
+    multiple_choice_results = deferred(db.Column(db.Text), group=PROGRESS_RESULTS)  # JSON string with question results
+    fill_blank_results = deferred(db.Column(db.Text), group=PROGRESS_RESULTS)  # JSON string with blank results
     
     # Ensure a student can only have one progress record per lesson
     __table_args__ = (db.UniqueConstraint('student_id', 'lesson_id', name='unique_student_lesson_progress'),)
     
+    @classmethod
+    def summary_query(cls, include_results=False):
+        """Query progress rows with scores only; result blobs are loaded on demand"""
+        query = cls.query
+        if include_results:
+            query = query.options(undefer_group(PROGRESS_RESULTS))
+        return query
+    
     def get_coding_results(self):
         return json.loads(self.coding_results) if self.coding_results else {}
     
@@ -57,9 +71,9 @@ class Progress(db.Model):
             'total_score': self.get_total_score(),
             'completed': self.completed,
             'attempts': self.attempts,
-            'last_attempt_at': self.last_attempt_at.isoformat() if self.last_attempt_at else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'last_attempt_at': self.last_attempt_at,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'coding_results': self.get_coding_results(),
             'multiple_choice_results': self.get_multiple_choice_results(),
             'fill_blank_results': self.get_fill_blank_results()
@@ -77,11 +91,19 @@ class SubmissionHistory(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'), nullable=False)
     submission_type = db.Column(db.String(20), nullable=False)  # 'coding', 'multiple_choice', or 'fill_blank'
-    content = db.Column(db.Text, nullable=False)  # The submitted content
+    content = deferred(db.Column(db.Text, nullable=False), group=SUBMISSION_CONTENT)  # The submitted content
     score = db.Column(db.Integer)  # Score for this submission
     feedback = db.Column(db.Text)  # Feedback on the submission
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @classmethod
+    def summary_query(cls, include_content=False):
+        """Query submissions without the submitted content unless asked for"""
+        query = cls.query
+        if include_content:
+            query = query.options(undefer_group(SUBMISSION_CONTENT))
+        return query
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,7 +113,7 @@ class SubmissionHistory(db.Model):
             'content': self.content,
             'score': self.score,
             'feedback': self.feedback,
-            'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None
+            'submitted_at': self.submitted_at
         }
     
     def __repr__(self):
@@ -0,0 +1,468 @@
+"""Read-only row models for serialization-heavy endpoints.
+
+The classes here are NamedTuples (so they carry no per-instance __dict__) filled
+straight from Core ``select`` rows. They skip identity-map bookkeeping and
+attribute instrumentation, and compute child counts in SQL instead of loading
+relationships. Their ``to_dict`` output matches the corresponding model's
+``to_dict`` so routes can switch between the two freely; datetimes are left
+for the app's JSON provider to encode.
+"""
+import hashlib
+import json
+from typing import NamedTuple, Optional
+from datetime import datetime
+from sqlalchemy import select, func, true, and_, or_
+from backend import db
+from backend.models.user import User
+from backend.models.course import Course, Unit, Enrollment
+from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+from backend.models.progress import Progress
+
+
+class CourseSummary(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    creator_id: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    units_count: int
+    enrollment_count: int
+    total_lessons_in_course: int
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'creator_id': self.creator_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'units_count': self.units_count,
+            'enrollment_count': self.enrollment_count,
+            'total_lessons_in_course': self.total_lessons_in_course
+        }
+
+
+class UnitSummary(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    order: int
+    course_id: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    lessons_count: int
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'order': self.order,
+            'course_id': self.course_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'lessons_count': self.lessons_count
+        }
+
+
+class LessonSummary(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    order: int
+    unit_id: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    has_coding_exercise: bool
+    multiple_choice_count: int
+    fill_blank_count: int
+    multiple_choice_points: int
+    fill_blank_points: int
+
+    @property
+    def content_type(self):
+        # Same precedence as routes.lessons.get_lesson_content_type
+        if self.has_coding_exercise:
+            return 'coding'
+        if self.multiple_choice_count:
+            return 'multiple_choice'
+        if self.fill_blank_count:
+            return 'fill_in_blank'
+        return 'coding'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'order': self.order,
+            'unit_id': self.unit_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'has_coding_exercise': self.has_coding_exercise,
+            'multiple_choice_count': self.multiple_choice_count,
+            'fill_blank_count': self.fill_blank_count
+        }
+
+
+class StudentSummary(NamedTuple):
+    id: int
+    username: str
+    email: Optional[str]
+    created_at: Optional[datetime]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email or '',
+            'created_at': self.created_at
+        }
+
+
+class StudentRef(NamedTuple):
+    """Compact student row for pickers"""
+    id: int
+    username: str
+
+    def to_dict(self):
+        return {'id': self.id, 'username': self.username}
+
+
+class EnrollmentRow(NamedTuple):
+    enrollment_id: int
+    student_id: int
+    username: str
+    email: Optional[str]
+    enrolled_at: Optional[datetime]
+
+    def to_dict(self):
+        return {
+            'enrollment_id': self.enrollment_id,
+            'student_id': self.student_id,
+            'username': self.username,
+            'email': self.email,
+            'enrolled_at': self.enrolled_at
+        }
+
+
+class EnrolledCourseSummary(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    enrolled_at: Optional[datetime]
+    lessons_count: int
+    completed_lessons: int
+    last_activity: Optional[datetime]
+
+    def to_dict(self):
+        completion_percentage = (self.completed_lessons / self.lessons_count * 100) if self.lessons_count > 0 else 0
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'lessons_count': self.lessons_count,
+            'completed_lessons': self.completed_lessons,
+            'completion_percentage': round(completion_percentage),
+            'last_activity': self.last_activity,
+            'enrolled_at': self.enrolled_at
+        }
+
+
+class ProgressSummary(NamedTuple):
+    id: int
+    student_id: int
+    lesson_id: int
+    coding_score: int
+    multiple_choice_score: int
+    fill_blank_score: int
+    completed: bool
+    attempts: int
+    last_attempt_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    def get_total_score(self):
+        return (self.coding_score or 0) + (self.multiple_choice_score or 0) + (self.fill_blank_score or 0)
+
+
+class ActivityRow(NamedTuple):
+    progress_id: int
+    lesson_id: int
+    lesson_title: str
+    unit_title: str
+    course_id: int
+    course_title: str
+    completed: bool
+    updated_at: Optional[datetime]
+
+
+def _count(column, *criteria):
+    return select(func.count(column)).where(*criteria).scalar_subquery()
+
+
+def _lesson_count_for_course():
+    return (select(func.count(Lesson.id))
+            .join(Unit, Lesson.unit_id == Unit.id)
+            .where(Unit.course_id == Course.id)
+            .scalar_subquery())
+
+
+def course_summaries(course_ids=None):
+    """Course list rows with unit, enrollment and lesson counts computed in SQL"""
+    stmt = select(
+        Course.id, Course.title, Course.description, Course.creator_id,
+        Course.created_at, Course.updated_at,
+        _count(Unit.id, Unit.course_id == Course.id),
+        _count(Enrollment.id, Enrollment.course_id == Course.id),
+        _lesson_count_for_course()
+    ).order_by(Course.id)
+    if course_ids is not None:
+        stmt = stmt.where(Course.id.in_(course_ids))
+    return [CourseSummary(*row) for row in db.session.execute(stmt)]
+
+
+def course_summary(course_id):
+    rows = course_summaries([course_id])
+    return rows[0] if rows else None
+
+
+def unit_summaries(course_id):
+    """Units of a course ordered by their order field"""
+    stmt = select(
+        Unit.id, Unit.title, Unit.description, Unit.order, Unit.course_id,
+        Unit.created_at, Unit.updated_at,
+        _count(Lesson.id, Lesson.unit_id == Unit.id)
+    ).where(Unit.course_id == course_id).order_by(Unit.order, Unit.id)
+    return [UnitSummary(*row) for row in db.session.execute(stmt)]
+
+
+def lesson_summaries(course_id):
+    """Lessons of a course with content counts and max points, ordered within each unit"""
+    has_coding = select(CodingExercise.id).where(CodingExercise.lesson_id == Lesson.id).exists()
+    stmt = select(
+        Lesson.id, Lesson.title, Lesson.description, Lesson.order, Lesson.unit_id,
+        Lesson.created_at, Lesson.updated_at,
+        has_coding,
+        _count(MultipleChoiceQuestion.id, MultipleChoiceQuestion.lesson_id == Lesson.id),
+        _count(FillBlankExercise.id, FillBlankExercise.lesson_id == Lesson.id),
+        select(func.coalesce(func.sum(MultipleChoiceQuestion.points), 0))
+            .where(MultipleChoiceQuestion.lesson_id == Lesson.id).scalar_subquery(),
+        select(func.coalesce(func.sum(FillBlankExercise.points), 0))
+            .where(FillBlankExercise.lesson_id == Lesson.id).scalar_subquery()
+    ).join(Unit, Lesson.unit_id == Unit.id)\
+     .where(Unit.course_id == course_id)\
+     .order_by(Unit.order, Unit.id, Lesson.order, Lesson.id)
+    return [LessonSummary(*row) for row in db.session.execute(stmt)]
+
+
+def student_summaries():
+    stmt = select(User.id, User.username, User.email, User.created_at)\
+        .where(User.role == 'student').order_by(User.id)
+    return [StudentSummary(*row) for row in db.session.execute(stmt)]
+
+
+# Sort keys of the student directory. Text keys sort case-insensitively, on
+# the same expressions the (role, lower(...)) indexes on User cover; a
+# missing email sorts as ''.
+STUDENT_SORT_KEYS = {
+    'username': func.lower(User.username),
+    'email': func.lower(func.coalesce(User.email, '')),
+    'created_at': User.created_at,
+    'id': User.id,
+}
+
+
+def _prefix_range(key, prefix):
+    # 'abc%' as a range on a lowercased sort key, so its btree index answers it on any database
+    prefix = prefix.lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(key >= prefix, key < upper)
+
+
+def student_directory(q=None, sort='username', descending=False, limit=50, after=None, compact=False):
+    """One page of students, optionally filtered by username or email prefix.
+
+    Keyset pagination: ``after`` is the (sort key, id) of the last row of
+    the previous page. Returns (rows, key of the last row or None when this
+    was the last page).
+    """
+    sort_key = STUDENT_SORT_KEYS[sort]
+    columns = (User.id, User.username) if compact else (User.id, User.username, User.email, User.created_at)
+    row_type = StudentRef if compact else StudentSummary
+    stmt = select(*columns, sort_key.label('sort_key')).where(User.role == 'student')
+    if q:
+        stmt = stmt.where(or_(_prefix_range(STUDENT_SORT_KEYS['username'], q),
+                              _prefix_range(STUDENT_SORT_KEYS['email'], q)))
+    if after is not None:
+        last_key, last_id = after
+        if descending:
+            stmt = stmt.where(or_(sort_key < last_key, and_(sort_key == last_key, User.id < last_id)))
+        else:
+            stmt = stmt.where(or_(sort_key > last_key, and_(sort_key == last_key, User.id > last_id)))
+    order = (sort_key.desc(), User.id.desc()) if descending else (sort_key, User.id)
+    rows = db.session.execute(stmt.order_by(*order).limit(limit + 1)).all()
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_key = (rows[-1].sort_key, rows[-1].id)
+    return [row_type(*row[:-1]) for row in rows], next_key
+
+
+def enrollment_rows(course_id):
+    """Enrolled students of a course, joined with their user rows"""
+    stmt = select(Enrollment.id, User.id, User.username, User.email, Enrollment.enrolled_at)\
+        .join(User, Enrollment.student_id == User.id)\
+        .where(Enrollment.course_id == course_id)\
+        .order_by(Enrollment.id)
+    return [EnrollmentRow(*row) for row in db.session.execute(stmt)]
+
+
+def enrolled_course_summaries(student_id):
+    """A student's enrolled courses with lesson totals, completions and last activity"""
+    in_course = (Progress.lesson_id == Lesson.id, Lesson.unit_id == Unit.id,
+                 Unit.course_id == Course.id, Progress.student_id == student_id)
+    completed = select(func.count(Progress.id))\
+        .where(*in_course, Progress.completed == true()).scalar_subquery()
+    last_activity = select(func.max(Progress.updated_at)).where(*in_course).scalar_subquery()
+    stmt = select(
+        Course.id, Course.title, Course.description, Enrollment.enrolled_at,
+        _lesson_count_for_course(), completed, last_activity
+    ).join(Enrollment, Enrollment.course_id == Course.id)\
+     .where(Enrollment.student_id == student_id)\
+     .order_by(Course.id)
+    return [EnrolledCourseSummary(*row) for row in db.session.execute(stmt)]
+
+
+_PROGRESS_COLUMNS = (
+    Progress.id, Progress.student_id, Progress.lesson_id, Progress.coding_score,
+    Progress.multiple_choice_score, Progress.fill_blank_score, Progress.completed,
+    Progress.attempts, Progress.last_attempt_at, Progress.updated_at
+)
+
+
+def progress_summaries(course_id, student_id=None):
+    """Score rows for a course, for one student or for everyone"""
+    stmt = select(*_PROGRESS_COLUMNS)\
+        .join(Lesson, Progress.lesson_id == Lesson.id)\
+        .join(Unit, Lesson.unit_id == Unit.id)\
+        .where(Unit.course_id == course_id)
+    if student_id is not None:
+        stmt = stmt.where(Progress.student_id == student_id)
+    return [ProgressSummary(*row) for row in db.session.execute(stmt)]
+
+
+def recent_activity(student_id, limit=10):
+    """Most recently updated progress rows of a student with lesson/unit/course titles"""
+    stmt = select(
+        Progress.id, Lesson.id, Lesson.title, Unit.title, Course.id, Course.title,
+        Progress.completed, Progress.updated_at
+    ).join(Lesson, Progress.lesson_id == Lesson.id)\
+     .join(Unit, Lesson.unit_id == Unit.id)\
+     .join(Course, Unit.course_id == Course.id)\
+     .where(Progress.student_id == student_id)\
+     .order_by(Progress.updated_at.desc())\
+     .limit(limit)
+    return [ActivityRow(*row) for row in db.session.execute(stmt)]
+
+
+
+class MultipleChoiceKey(NamedTuple):
+    id: int
+    correct_option_index: int
+    points: int
+    explanation: Optional[str]
+
+
+class FillBlankKey(NamedTuple):
+    id: int
+    blanks: object  # parsed JSON, as returned by FillBlankExercise.get_blanks()
+    points: int
+
+
+def multiple_choice_keys(lesson_id):
+    """Answer key of a lesson's multiple choice questions, without question text"""
+    stmt = select(MultipleChoiceQuestion.id, MultipleChoiceQuestion.correct_option_index,
+                  MultipleChoiceQuestion.points, MultipleChoiceQuestion.explanation)\
+        .where(MultipleChoiceQuestion.lesson_id == lesson_id)\
+        .order_by(MultipleChoiceQuestion.id)
+    return tuple(MultipleChoiceKey(*row) for row in db.session.execute(stmt))
+
+
+def fill_blank_keys(lesson_id):
+    """Answer key of a lesson's fill-in-the-blank exercises"""
+    stmt = select(FillBlankExercise.id, FillBlankExercise.blanks, FillBlankExercise.points)\
+        .where(FillBlankExercise.lesson_id == lesson_id)\
+        .order_by(FillBlankExercise.id)
+    return tuple(FillBlankKey(row.id, json.loads(row.blanks), row.points)
+                 for row in db.session.execute(stmt))
+
+class ContentVersion(NamedTuple):
+    """Validator state of a piece of course content.
+
+    ``last_modified`` is the newest ``updated_at`` in the subtree; ``counts``
+    catches deletions, which never bump any remaining row's ``updated_at``.
+    """
+    last_modified: Optional[datetime]
+    counts: tuple
+
+    @property
+    def etag(self):
+        stamp = self.last_modified.isoformat() if self.last_modified else ''
+        raw = f"{stamp}-{'.'.join(str(c or 0) for c in self.counts)}"
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _table_stats(model, *criteria, joins=()):
+    """(max(updated_at), count(id)) of a table as two scalar subqueries"""
+    stats = []
+    for column in (func.max(model.updated_at), func.count(model.id)):
+        stmt = select(column)
+        for target, onclause in joins:
+            stmt = stmt.join(target, onclause)
+        stats.append(stmt.where(*criteria).scalar_subquery())
+    return stats
+
+
+def _content_version(parts, extra=()):
+    row = db.session.execute(select(*parts, *extra)).one()
+    stamps = [row[i] for i in range(0, len(parts), 2)]
+    counts = tuple(row[i] for i in range(1, len(parts), 2)) + tuple(row[len(parts):])
+    stamps = [s for s in stamps if s is not None]
+    return ContentVersion(max(stamps) if stamps else None, counts)
+
+
+def course_tree_version(course_id=None):
+    """Version of one course subtree, or of the whole catalog when course_id is None.
+
+    Covers courses, units, lessons and exercises, plus enrollment count and
+    newest enrollment id because course payloads report enrollment counts.
+    Returns None when the course does not exist.
+    """
+    course_filter = () if course_id is None else (Course.id == course_id,)
+    unit_filter = () if course_id is None else (Unit.course_id == course_id,)
+    lesson_joins = ((Unit, Lesson.unit_id == Unit.id),)
+    parts = (_table_stats(Course, *course_filter)
+             + _table_stats(Unit, *unit_filter)
+             + _table_stats(Lesson, *unit_filter, joins=lesson_joins))
+    for model in (CodingExercise, MultipleChoiceQuestion, FillBlankExercise):
+        parts += _table_stats(model, *unit_filter,
+                              joins=((Lesson, model.lesson_id == Lesson.id),) + lesson_joins)
+    enrollment_filter = () if course_id is None else (Enrollment.course_id == course_id,)
+    enrollments = [select(func.count(Enrollment.id)).where(*enrollment_filter).scalar_subquery(),
+                   select(func.max(Enrollment.id)).where(*enrollment_filter).scalar_subquery()]
+    version = _content_version(parts, enrollments)
+    if course_id is not None and not version.counts[0]:
+        return None
+    return version
+
+
+def lesson_version(lesson_id):
+    """Version of a lesson and its exercises; None when the lesson does not exist"""
+    parts = _table_stats(Lesson, Lesson.id == lesson_id)
+    for model in (CodingExercise, MultipleChoiceQuestion, FillBlankExercise):
+        parts += _table_stats(model, model.lesson_id == lesson_id)
+    version = _content_version(parts)
+    return version if version.counts[0] else None
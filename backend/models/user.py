@@ -1,6 +1,23 @@
 from backend import db
+from flask import current_app, has_app_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from functools import lru_cache
+
+# werkzeug method string, including the cost, e.g. 'pbkdf2:sha256:600000'.
+# Overridden by the PASSWORD_HASH_METHOD setting.
+DEFAULT_PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_PASSWORD_HASH_METHOD
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+@lru_cache(maxsize=8)
+def _hash_parameters(method):
+    # Hash once to learn the parameters werkzeug actually stores for this
+    # method, e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:260000'
+    return generate_password_hash('', method=method).split('$', 1)[0]
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -12,6 +29,13 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # 'teacher' or 'student'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Case-insensitive prefix search and sorting in the student directory (see read_models.student_directory).
+    # Created on existing databases by backend/schema.py
+    __table_args__ = (
+        db.Index('ix_users_role_username_lower', 'role', db.func.lower(username)),
+        db.Index('ix_users_role_email_key', 'role', db.func.lower(db.func.coalesce(email, ''))),
+    )
+    
     # Relationships
     # A teacher can create many courses
     courses_created = db.relationship('Course', backref='creator', lazy=True, 
@@ -32,10 +56,19 @@ class User(db.Model):
         self.role = role
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
+    
+    def needs_rehash(self):
+        """True if the stored hash was made with other parameters than the configured ones"""
+        return self.password_hash.split('$', 1)[0] != _hash_parameters(password_hash_method())
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # A correct password is re-hashed with the current parameters; the caller commits
+        if not check_password_hash(self.password_hash, password):
+            return False
+        if self.needs_rehash():
+            self.set_password(password)
+        return True
     
     def is_teacher(self):
         return self.role == 'teacher'
@@ -49,7 +82,7 @@ class User(db.Model):
             'username': self.username,
             'email': self.email,
             'role': self.role,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
     
     def __repr__(self):
@@ -0,0 +1,280 @@
+"""On-demand profiling of live workers.
+
+Two tools, both off unless PROFILING_ENABLED is set and only usable by the
+users listed in PROFILING_ADMINS (bearer token required, see
+auth_tokens.py):
+
+* cProfile sessions: ``POST /api/diagnostics/profile`` arms a session for
+  the next N requests to one endpoint. Each of those requests runs under
+  cProfile and the results are merged; ``GET .../profile/<id>`` returns
+  them as a pstats file (``snakeviz``, ``python -m pstats``) or as text.
+  Only one request is profiled at a time per process (cProfile is not
+  meant to run on several threads at once); matching requests that arrive
+  meanwhile simply run unprofiled and do not use up the session.
+* Sampling profiler: a daemon thread that every PROFILING_SAMPLE_INTERVAL
+  seconds records the stack of each thread currently serving a request.
+  Stacks are aggregated per second and the last PROFILING_SAMPLE_WINDOW
+  seconds are served in the flamegraph "collapsed" format
+  (``flamegraph.pl``, speedscope). It never touches idle threads and costs
+  one ``sys._current_frames()`` per interval.
+
+Everything is per process. With several gunicorn workers a session or the
+sampler lives in the worker that received the call (its pid is returned);
+repeat the call or profile with a single worker.
+"""
+import io
+import os
+import sys
+import time
+import uuid
+import marshal
+import pstats
+import cProfile
+import threading
+from collections import Counter, deque
+from flask import g, request
+
+PROFILE_FORMATS = ('pstats', 'text')
+SAMPLE_FORMATS = ('collapsed', 'text')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def collapsed_stack(frame):
+    """'outer;...;inner' for a frame, the format of flamegraph.pl"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class _ProfileSession:
+    def __init__(self, endpoint, requests):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.requested = requests
+        self.remaining = requests
+        self.created_at = time.time()
+        self.stats = None
+        self.seconds = 0.0
+
+    def add(self, profile, seconds):
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        self.remaining -= 1
+        self.seconds += seconds
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'endpoint': self.endpoint,
+            'requests': self.requested - self.remaining,
+            'requested': self.requested,
+            'done': self.remaining <= 0,
+            'seconds': round(self.seconds, 6),
+            'pid': os.getpid(),
+        }
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of request threads into per-second counters"""
+
+    def __init__(self, profiler, interval, window):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self.buckets = deque(maxlen=max(1, int(window)))  # (second, Counter of stacks)
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            watched = self.profiler.request_threads()
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            second = int(time.time())
+            with self._lock:
+                if not self.buckets or self.buckets[-1][0] != second:
+                    self.buckets.append((second, Counter()))
+                counter = self.buckets[-1][1]
+                for ident in watched:
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        counter[collapsed_stack(frame)] += 1
+                        self.samples += 1
+            del frames
+
+    def stop(self):
+        self._stop_event.set()
+
+    def collapsed(self, window=None):
+        since = time.time() - window if window else 0
+        total = Counter()
+        with self._lock:
+            for second, counter in self.buckets:
+                if second >= since:
+                    total.update(counter)
+        return total
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.admins = ()
+        self.max_requests = 100
+        self.sample_interval = 0.01
+        self.sample_window = 60
+        self._sessions = {}  # id -> _ProfileSession, newest last
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()  # one cProfile at a time per process
+        self._request_threads = set()
+        self.sampler = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILING_ENABLED', self.enabled)
+        self.admins = tuple(app.config.get('PROFILING_ADMINS') or ())
+        self.max_requests = app.config.get('PROFILING_MAX_REQUESTS', self.max_requests)
+        self.sample_interval = app.config.get('PROFILING_SAMPLE_INTERVAL', self.sample_interval)
+        self.sample_window = app.config.get('PROFILING_SAMPLE_WINDOW', self.sample_window)
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+        if app.config.get('PROFILING_SAMPLER_AUTOSTART'):
+            self.start_sampler()
+
+    def is_admin(self, user):
+        """Whether a token user (see auth_tokens.token_user) may use the profiler"""
+        return bool(self.enabled and user and user.get('username') in self.admins)
+
+    # cProfile sessions
+
+    def arm(self, endpoint, requests):
+        session = _ProfileSession(endpoint, max(1, min(int(requests), self.max_requests)))
+        with self._lock:
+            self._sessions[session.id] = session
+            # Keep the last few finished sessions around for download
+            while len(self._sessions) > 20:
+                self._sessions.pop(next(iter(self._sessions)))
+        return session
+
+    def session(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def cancel(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def _armed_session(self, endpoint):
+        with self._lock:
+            for session in self._sessions.values():
+                if session.remaining > 0 and session.endpoint == endpoint:
+                    return session
+        return None
+
+    def _start_request(self):
+        if self.sampler is not None:
+            with self._lock:
+                self._request_threads.add(threading.get_ident())
+        session = self._armed_session(request.endpoint)
+        if session is None or not self._profiling.acquire(blocking=False):
+            return
+        profile = cProfile.Profile()
+        g._profile = (session, profile, time.perf_counter())
+        profile.enable()
+
+    def _finish_request(self, exc=None):
+        current = g.pop('_profile', None)
+        if current is not None:
+            session, profile, started = current
+            profile.disable()
+            self._profiling.release()
+            with self._lock:
+                if session.remaining > 0:
+                    session.add(profile, time.perf_counter() - started)
+        if self.sampler is not None:
+            with self._lock:
+                self._request_threads.discard(threading.get_ident())
+
+    def dump(self, session, format='pstats'):
+        """A finished or running session's merged stats as bytes (pstats) or text"""
+        with self._lock:
+            stats = session.stats
+            if stats is None:
+                return None
+            if format == 'pstats':
+                return marshal.dumps(stats.stats)
+            out = io.StringIO()
+            stats.stream = out
+            try:
+                stats.sort_stats('cumulative').print_stats(60)
+            finally:
+                stats.stream = sys.stdout
+            return out.getvalue()
+
+    # Sampling profiler
+
+    def request_threads(self):
+        with self._lock:
+            return list(self._request_threads)
+
+    def start_sampler(self, interval=None, window=None):
+        with self._lock:
+            if self.sampler is None:
+                self.sampler = _Sampler(self, interval or self.sample_interval, window or self.sample_window)
+                self.sampler.start()
+            return self.sampler
+
+    def stop_sampler(self):
+        with self._lock:
+            sampler, self.sampler = self.sampler, None
+            self._request_threads.clear()
+        if sampler is not None:
+            sampler.stop()
+        return sampler
+
+    def sampler_status(self):
+        sampler = self.sampler
+        if sampler is None:
+            return {'running': False, 'pid': os.getpid()}
+        return {
+            'running': True,
+            'pid': os.getpid(),
+            'interval': sampler.interval,
+            'window': sampler.buckets.maxlen,
+            'samples': sampler.samples,
+            'started_at': sampler.started_at,
+        }
+
+    def sampled_stacks(self, format='collapsed', window=None):
+        sampler = self.sampler
+        if sampler is None:
+            return None
+        stacks = sampler.collapsed(window)
+        if format == 'collapsed':
+            return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        # text: the innermost frames seen most often, i.e. where request threads spend their time
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return ''.join(f'{count:8d} {count * 100 / total:5.1f}%  {leaf}\n' for leaf, count in leaves.most_common(60))
+
+
+profiler = Profiler()
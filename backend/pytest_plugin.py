@@ -0,0 +1,66 @@
+"""pytest plugin: SQL query budgets for endpoints.
+
+Load it with ``pytest -p backend.pytest_plugin`` or
+``pytest_plugins = ['backend.pytest_plugin']`` in a conftest.py. It counts
+the statements run on any SQLAlchemy engine and fails the test when a
+budget is exceeded, listing the repeated query shapes and where they were
+issued (see backend/query_inspector.py):
+
+    def test_course_tree(client, query_budget):
+        with query_budget(4):
+            client.get('/api/courses/1')
+        # per_shape catches N+1 loops regardless of the data size
+        with query_budget(per_shape=1):
+            client.get('/api/courses/1/units')
+
+    @pytest.mark.query_budget(10, per_shape=2)
+    def test_dashboard(client):
+        client.get('/api/student/dashboard?student_id=3')
+"""
+import contextlib
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.query_inspector import QueryCollector
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(max_queries=None, per_shape=None): fail the test when it runs more '
+                   'SQL statements in total, or more of one query shape, than allowed')
+
+
+@contextlib.contextmanager
+def _budget(max_queries=None, per_shape=None):
+    collector = QueryCollector()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        collector.add(statement)
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        yield collector
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    if max_queries is not None and collector.total > max_queries:
+        pytest.fail(f'Query budget exceeded: {collector.total} > {max_queries}\n{collector.report()}',
+                    pytrace=False)
+    if per_shape is not None and collector.counts and max(collector.counts.values()) > per_shape:
+        pytest.fail(f'Query shape run more than {per_shape} times (N+1?)\n{collector.report(per_shape + 1)}',
+                    pytrace=False)
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager factory: ``with query_budget(max_queries, per_shape=None) as queries:``"""
+    return _budget
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    # Only the test body counts; queries of fixture setup are outside the budget
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        return (yield)
+    with _budget(*marker.args, **marker.kwargs):
+        return (yield)
@@ -0,0 +1,125 @@
+"""N+1 query detection for development and tests.
+
+Lazy relationships loaded inside loops (``course.units`` ->
+``unit.lessons`` -> ``lesson.coding_exercise``) show up as the same query
+shape repeated once per row. In debug and testing mode every SQL statement
+of a request is fingerprinted: parameters and literals are already or are
+made placeholders, and ``IN`` lists of any length collapse to one, so
+``WHERE lesson_id = 1`` and ``WHERE lesson_id = 2`` count as the same
+query. When one fingerprint runs QUERY_DETECTOR_THRESHOLD times or more in
+a request, a warning is logged with the route, the count, the statement
+and the line of backend code that issued it first.
+
+QUERY_DETECTOR_ENABLED = None (the default) turns the detector on only when
+the app runs with DEBUG or TESTING; nothing is hooked in production.
+
+Tests can assert query budgets with the ``query_budget`` fixture from
+backend/pytest_plugin.py.
+"""
+import os
+import re
+import sys
+from collections import Counter
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER = re.compile(r'\?|%\(\w+\)s|%s|:\w+|\$\d+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Statement with every literal and bound value replaced by ?, IN lists collapsed"""
+    statement = _STRING.sub('?', statement)
+    statement = _PARAMETER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(?)', statement)
+    return _SPACES.sub(' ', statement).strip()
+
+
+def code_location():
+    """'file:line in function' of the innermost backend frame outside this module"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith('<'):  # <string>, <frozen ...>
+            filename = os.path.abspath(filename)
+        if filename.startswith(BACKEND_DIR) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, BACKEND_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryCollector:
+    """Statements grouped by fingerprint, with where each shape was first issued"""
+
+    def __init__(self):
+        self.total = 0
+        self.counts = Counter()
+        self.statements = {}
+        self.locations = {}
+
+    def add(self, statement):
+        key = fingerprint(statement)
+        self.total += 1
+        self.counts[key] += 1
+        if key not in self.statements:
+            self.statements[key] = statement
+            self.locations[key] = code_location()
+
+    def repeated(self, threshold):
+        """[(count, fingerprint, first location)] of the shapes run at least threshold times, most first"""
+        return [(count, key, self.locations[key])
+                for key, count in self.counts.most_common() if count >= threshold]
+
+    def report(self, threshold=2):
+        lines = [f'{self.total} queries, {len(self.counts)} distinct']
+        for count, key, location in self.repeated(threshold):
+            lines.append(f'  {count} x {key[:200]}' + (f'  (first at {location})' if location else ''))
+        return '\n'.join(lines)
+
+
+class QueryDetector:
+    def __init__(self, threshold=5):
+        self.enabled = None
+        self.threshold = threshold
+
+    def init_app(self, app, db):
+        self.threshold = app.config.get('QUERY_DETECTOR_THRESHOLD', self.threshold)
+        self.enabled = app.config.get('QUERY_DETECTOR_ENABLED')
+        if self.enabled is None:
+            self.enabled = bool(app.debug or app.testing)
+        app.extensions['query_detector'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+
+    def _start_request(self):
+        g._queries = QueryCollector()
+
+    def _finish_request(self, response):
+        collector = g.pop('_queries', None)
+        if collector is None:
+            return response
+        for count, key, location in collector.repeated(self.threshold):
+            current_app.logger.warning(
+                'Possible N+1 in %s %s (%s): %d x %s%s', request.method, request.path,
+                request.endpoint, count, key[:300], f' first at {location}' if location else '')
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_queries' in g:
+        g._queries.add(statement)
+
+
+query_detector = QueryDetector()
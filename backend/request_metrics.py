@@ -0,0 +1,256 @@
+"""Per-request performance instrumentation.
+
+For every request this records the wall time, the number of SQL statements
+and the time spent in them (SQLAlchemy ``before_cursor_execute`` /
+``after_cursor_execute`` events), the time spent in the code sandbox
+(``sandbox_timer()``, used by code_runner) and the response size.
+
+Each response carries a ``Server-Timing`` header (``app``, ``db`` with the
+query count, ``sandbox`` when code ran), so the browser's network panel
+shows the split. Per endpoint the totals, a latency histogram with fixed
+buckets and a rolling window of the last REQUEST_METRICS_WINDOW durations
+(for p50/p90/p95/p99) are kept in memory and exposed at ``/metrics`` in the
+Prometheus text format, together with the content cache and login throttle
+counters. ``/metrics`` is only served when REQUEST_METRICS_TOKEN is set, and
+only to requests that send it as ``Authorization: Bearer <token>`` (the
+scraper's ``bearer_token``).
+
+Numbers are per process: with several gunicorn workers each one keeps its
+own, and a scrape sees the worker that happened to answer it. Streamed
+responses (course export, gradebook CSV) are measured until the body starts
+streaming.
+"""
+import hmac
+import threading
+import time
+from collections import deque, Counter
+from contextlib import contextmanager
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+
+# Latency histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _EndpointStats:
+    def __init__(self, window, buckets):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * len(buckets)
+        self.count = 0
+        self.seconds = 0.0
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.sandbox_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = Counter()
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+class RequestMetrics:
+    def __init__(self, window=1000, buckets=DEFAULT_BUCKETS):
+        self.enabled = True
+        self.server_timing = True
+        self.window = window
+        self.buckets = tuple(buckets)
+        self._endpoints = {}  # (endpoint, method) -> _EndpointStats
+        self._lock = threading.Lock()
+        self._app = None
+        self.token = None
+
+    def init_app(self, app, db):
+        self.enabled = app.config.get('REQUEST_METRICS_ENABLED', self.enabled)
+        self.server_timing = app.config.get('REQUEST_METRICS_SERVER_TIMING', self.server_timing)
+        self.window = app.config.get('REQUEST_METRICS_WINDOW', self.window)
+        self.buckets = tuple(app.config.get('REQUEST_METRICS_BUCKETS', self.buckets))
+        self.token = app.config.get('REQUEST_METRICS_TOKEN') or None
+        app.extensions['request_metrics'] = self
+        if not self.enabled:
+            return
+        self._app = app
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        if self.token:
+            app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+    # Per request
+
+    def _start_request(self):
+        if request.endpoint != 'metrics':
+            g._metrics = {'started': time.perf_counter(), 'sql_queries': 0, 'sql_seconds': 0.0,
+                          'sandbox_seconds': 0.0}
+
+    def _finish_request(self, response):
+        current = g.pop('_metrics', None)
+        if current is None:
+            return response
+        elapsed = time.perf_counter() - current['started']
+        size = response.calculate_content_length() or 0
+        self._record(request.endpoint or '<unmatched>', request.method, response.status_code,
+                     elapsed, current, size)
+        if self.server_timing:
+            timings = [f"app;dur={elapsed * 1000:.1f}",
+                       f"db;dur={current['sql_seconds'] * 1000:.1f};desc=\"{current['sql_queries']} queries\""]
+            if current['sandbox_seconds']:
+                timings.append(f"sandbox;dur={current['sandbox_seconds'] * 1000:.1f}")
+            response.headers.add('Server-Timing', ', '.join(timings))
+        return response
+
+    def _record(self, endpoint, method, status, elapsed, current, size):
+        with self._lock:
+            stats = self._endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, method)] = _EndpointStats(self.window, self.buckets)
+            stats.recent.append(elapsed)
+            for index, bound in enumerate(self.buckets):
+                if elapsed <= bound:
+                    stats.buckets[index] += 1
+                    break
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.sql_queries += current['sql_queries']
+            stats.sql_seconds += current['sql_seconds']
+            stats.sandbox_seconds += current['sandbox_seconds']
+            stats.response_bytes += size
+            stats.statuses[status] += 1
+
+    @contextmanager
+    def sandbox_timer(self):
+        """Count the time spent in the block as sandbox execution of the current request"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if has_request_context() and '_metrics' in g:
+                g._metrics['sandbox_seconds'] += time.perf_counter() - started
+
+    # Reporting
+
+    def snapshot(self):
+        """{(endpoint, method): dict of totals, bucket counts and window quantiles}"""
+        result = {}
+        with self._lock:
+            for key, stats in self._endpoints.items():
+                recent = sorted(stats.recent)
+                result[key] = {
+                    'count': stats.count,
+                    'seconds': stats.seconds,
+                    'buckets': list(stats.buckets),
+                    'quantiles': {q: _quantile(recent, q) for q in QUANTILES} if recent else {},
+                    'window_count': len(recent),
+                    'window_seconds': sum(recent),
+                    'sql_queries': stats.sql_queries,
+                    'sql_seconds': stats.sql_seconds,
+                    'sandbox_seconds': stats.sandbox_seconds,
+                    'response_bytes': stats.response_bytes,
+                    'statuses': dict(stats.statuses),
+                }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render_prometheus(self, app=None):
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        keys = sorted(snapshot)
+        histogram = []
+        for endpoint, method in keys:
+            data = snapshot[(endpoint, method)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, data['buckets']):
+                cumulative += count
+                histogram.append(f'http_request_duration_seconds_bucket'
+                                 f'{_labels(endpoint=endpoint, method=method, le=bound)} {cumulative}')
+            histogram.append(f'http_request_duration_seconds_bucket'
+                             f'{_labels(endpoint=endpoint, method=method, le="+Inf")} {data["count"]}')
+            histogram.append(f'http_request_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} '
+                             f'{data["seconds"]:.6f}')
+            histogram.append(f'http_request_duration_seconds_count{_labels(endpoint=endpoint, method=method)} '
+                             f'{data["count"]}')
+        metric('http_request_duration_seconds', 'histogram', 'Request wall time', histogram)
+
+        summary = []
+        for endpoint, method in keys:
+            data = snapshot[(endpoint, method)]
+            for q, value in data['quantiles'].items():
+                summary.append(f'http_request_recent_duration_seconds'
+                               f'{_labels(endpoint=endpoint, method=method, quantile=q)} {value:.6f}')
+            summary.append(f'http_request_recent_duration_seconds_sum{_labels(endpoint=endpoint, method=method)} '
+                           f'{data["window_seconds"]:.6f}')
+            summary.append(f'http_request_recent_duration_seconds_count{_labels(endpoint=endpoint, method=method)} '
+                           f'{data["window_count"]}')
+        metric('http_request_recent_duration_seconds', 'summary',
+               f'Request wall time over the last {self.window} requests per endpoint', summary)
+
+        metric('http_requests_total', 'counter', 'Requests by response status', [
+            f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}'
+            for endpoint, method in keys for status, count in sorted(snapshot[(endpoint, method)]['statuses'].items())])
+        for name, field, help_text, fmt in (
+                ('http_request_sql_queries_total', 'sql_queries', 'SQL statements executed', '{}'),
+                ('http_request_sql_seconds_total', 'sql_seconds', 'Time spent in SQL statements', '{:.6f}'),
+                ('http_request_sandbox_seconds_total', 'sandbox_seconds', 'Time spent running code in the sandbox',
+                 '{:.6f}'),
+                ('http_response_bytes_total', 'response_bytes', 'Response body bytes (streamed bodies excluded)',
+                 '{}')):
+            metric(name, 'counter', help_text, [
+                f'{name}{_labels(endpoint=endpoint, method=method)} ' + fmt.format(snapshot[(endpoint, method)][field])
+                for endpoint, method in keys])
+
+        # Counters of the in-process caches, as reported by their stats()
+        app = app or self._app
+        for extension in ('content_cache', 'login_throttle'):
+            component = app.extensions.get(extension) if app is not None else None
+            if component is None:
+                continue
+            for key, value in sorted(component.stats().items()):
+                if isinstance(value, (bool, int, float)):
+                    name = f'app_{extension}_{key}'
+                    metric(name, 'gauge', f'{extension} {key}', [f'{name} {float(value):g}'])
+        return '\n'.join(lines) + '\n'
+
+    def _metrics_view(self):
+        expected = f'Bearer {self.token}'.encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return current_app.response_class('Unauthorized\n', status=401, content_type='text/plain',
+                                              headers={'WWW-Authenticate': 'Bearer'})
+        return current_app.response_class(self.render_prometheus(current_app),
+                                          content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and '_metrics' in g:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None and '_metrics' in g:
+        g._metrics['sql_queries'] += 1
+        g._metrics['sql_seconds'] += time.perf_counter() - started
+
+
+request_metrics = RequestMetrics()
@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify
-# from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-# JWT functionality removed
+from flask import Blueprint, request, jsonify, current_app
+from backend.auth_tokens import issue_token, token_user, is_admin
+from backend.login_throttle import login_throttle
 from backend.models.user import User
 from backend import db
 import datetime
+import math
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -57,27 +58,50 @@ def login():
     if 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Username and password are required'}), 400
     
+    # 登入失敗過多時直接拒絕，不必再驗證密碼雜湊
+    username, ip = data['username'], request.remote_addr
+    retry_after = login_throttle.check(username, ip)
+    if retry_after > 0:
+        retry_after = math.ceil(retry_after)
+        return jsonify({'error': 'Too many login attempts, please try again later',
+                        'retry_after': retry_after}), 429, {'Retry-After': str(retry_after)}
+    
     # Find user by username
-    user = User.query.filter_by(username=data['username']).first()
+    user = User.query.filter_by(username=username).first()
     
     # Check if user exists and password is correct
     if not user or not user.check_password(data['password']):
+        login_throttle.record_failure(username, ip)
         return jsonify({'error': 'Invalid username or password'}), 401
+    login_throttle.record_success(username, ip)
+    
+    # Persist the hash if check_password upgraded it to the configured parameters
+    if db.session.is_modified(user):
+        db.session.commit()
     
-    # JWT Removed. Login now only validates credentials.
-    # No token is returned.
+    # Signed token with the user id and role; send it back as "Authorization: Bearer <token>"
     return jsonify({
         'message': 'Login successful',
-        'user': user.to_dict()
+        'user': user.to_dict(),
+        'access_token': issue_token(user),
+        'token_type': 'Bearer',
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
     }), 200
 
 
+@bp.route('/login/stats', methods=['GET'])
+def login_stats():
+    # Counters of failed and blocked login attempts, for the usernames in ADMINS
+    if not is_admin():
+        return jsonify({'error': 'Login stats are restricted to administrators'}), 403
+    return jsonify({'login_throttle': login_throttle.stats()}), 200
+
+
 @bp.route('/profile', methods=['GET'])
-# @jwt_required() # JWT Removed
 def profile():
-    # current_user_id = get_jwt_identity() # JWT Removed. This needs user_id from path or query.
-    # For now, this endpoint will not function as intended without JWT.
-    user_id = request.args.get('user_id') # Example: pass user_id as query param
+    # User from the token, or the user_id query parameter for clients without one
+    current_user = token_user()
+    user_id = current_user['id'] if current_user else request.args.get('user_id')
     if not user_id:
         return jsonify({'error': 'User ID required for profile'}), 400
     current_user_id = int(user_id)
@@ -90,12 +114,11 @@ def profile():
 
 
 @bp.route('/change-password', methods=['PUT'])
-# @jwt_required() # JWT Removed
 def change_password():
-    # current_user_id = get_jwt_identity() # JWT Removed. This needs user_id from path or query.
-    # For now, this endpoint will not function as intended without JWT.
+    # User from the token, or user_id in the payload for clients without one
     data = request.get_json()
-    user_id = data.get('user_id') # Example: expect user_id in payload
+    current_user = token_user()
+    user_id = current_user['id'] if current_user else data.get('user_id')
     if not user_id:
         return jsonify({'error': 'User ID required to change password'}), 400
     current_user_id = int(user_id)
@@ -1,34 +1,58 @@
-from flask import Blueprint, request, jsonify
-from backend.models.user import User
-from backend.models.lesson import Lesson
+from flask import Blueprint, request, jsonify, current_app
+from backend.auth_tokens import request_user
+from backend.models.lesson import Lesson, CodingExercise
 from backend.models.progress import Progress, SubmissionHistory
 from backend import db
+from backend.request_metrics import request_metrics
+from backend import sandbox_images
+from backend.fork_server import fork_servers, ForkServerUnavailable
+from backend.code_batcher import code_batcher
 from datetime import datetime
-import docker
 import tempfile
+import threading
 import os
 import time
 import re
 
 bp = Blueprint('code_runner', __name__, url_prefix='/api/code')
 
-# Docker配置
-DOCKER_IMAGE = 'python:3.9-alpine'
+# Docker配置（映像依練習的 runtime 決定，見 sandbox_images.py）
 EXECUTION_TIMEOUT = 10  # 秒
 MEMORY_LIMIT = '128m'
+MAX_INPUTS = 20  # /run 的 inputs 每次最多几组
 CPU_LIMIT = 0.5
 
+# 每個 worker 進程共用一個 Docker client（內含 HTTP 連線池），不再每次呼叫都重新建立
+_docker_client = None
+_docker_client_lock = threading.Lock()
+
+def _forget_docker_client():
+    # fork 之後子進程不能沿用父進程的連線
+    global _docker_client
+    _docker_client = None
+
+os.register_at_fork(after_in_child=_forget_docker_client)
+
 def get_docker_client():
-    """获取Docker客户端"""
-    try:
-        client = docker.from_env()
+    """获取Docker客户端（进程内共享，连接失败时下次调用再重试）"""
+    global _docker_client
+    client = _docker_client
+    if client is not None:
         return client
-    except Exception as e:
-        print(f"Docker连接失败: {str(e)}")
-        return None
+    with _docker_client_lock:
+        if _docker_client is None:
+            try:
+                # docker SDK 很重，只在真正執行程式碼時才載入
+                import docker
+                # 連線池大小應涵蓋同時執行的請求數（threads 或 gevent worker_connections）
+                _docker_client = docker.from_env(max_pool_size=current_app.config.get('DOCKER_POOL_SIZE', 10))
+            except Exception as e:
+                print(f"Docker连接失败: {str(e)}")
+                return None
+        return _docker_client
 
-def is_code_safe(code):
-    """检查代码安全性"""
+def is_code_safe(code, allow_input=False):
+    """检查代码安全性（allow_input: 练习以 stdin 测试时允许 input()）"""
     dangerous_patterns = [
         r'import\s+os',
         r'import\s+subprocess',
@@ -56,42 +80,76 @@ def is_code_safe(code):
         r'for.*in.*range\s*\(\s*\d{6,}',  # 防止大循环
     ]
     
+    if allow_input:
+        dangerous_patterns.remove(r'input\s*\(')
+    
     for pattern in dangerous_patterns:
         if re.search(pattern, code, re.IGNORECASE):
             return False, f"代码包含不安全的操作: {pattern}"
     
     return True, "代码安全"
 
-def execute_python_code(code):
-    """在Docker容器中安全执行Python代码"""
+def _prepare_sandbox(code, runtime, allow_input):
+    """(client, image, None)，或无法执行时 (None, None, execute_python_code 的失败返回值)"""
     client = get_docker_client()
     if not client:
-        return False, "Docker服务不可用", "", "无法连接到Docker服务"
+        return None, None, (False, "Docker服务不可用", "", "无法连接到Docker服务")
+    import docker  # get_docker_client 已載入，這裡只是取得 docker.errors
     
     # 安全检查
-    is_safe, safety_message = is_code_safe(code)
+    is_safe, safety_message = is_code_safe(code, allow_input)
     if not is_safe:
-        return False, "", "", safety_message
+        return None, None, (False, "", "", safety_message)
+    
+    try:
+        image, image_error = sandbox_images.resolve_image(client, runtime)
+    except docker.errors.APIError as e:
+        return None, None, (False, "", str(e), "Docker API错误")
+    if not image:
+        return None, None, (False, "", "", image_error)
+    return client, image, None
+
+def _uses_fork_server(image, runtime):
+    # zygote 只存在於自建映像中，stock 映像仍以每次一個容器執行
+    return fork_servers.enabled and image == sandbox_images.image_name(runtime or sandbox_images.DEFAULT_RUNTIME)
+
+def execute_python_code(code, runtime=None, stdin=None, allow_input=False):
+    """在Docker容器中安全执行Python代码（runtime 选择沙箱映像，stdin 为程序的标准输入）"""
+    client, image, failure = _prepare_sandbox(code, runtime, allow_input)
+    if failure:
+        return failure
+    import docker  # _prepare_sandbox 已載入，這裡只是取得 docker.errors
+    
+    if _uses_fork_server(image, runtime):
+        return execute_in_fork_server(client, image, code, stdin)
+    # 同一時間窗內的提交合併到同一個容器執行（见 backend/code_batcher.py）
+    if code_batcher.enabled:
+        return execute_in_batch(client, image, code, stdin)
+    if stdin is not None:
+        return execute_cases_in_container(client, image, code, [stdin])[0]
     
     try:
         # 创建临时文件
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
             f.write(code)
             temp_file = f.name
+        # NamedTemporaryFile 建立時為 0600，自建映像以非 root 的 sandbox 使用者執行也要能讀取
+        os.chmod(temp_file, 0o644)
         
         # 准备Docker执行环境
         container_code_path = '/tmp/user_code.py'
         
         # 运行Docker容器 - 最简化版本，确保兼容性
         try:
-            result = client.containers.run(
-                image=DOCKER_IMAGE,
-                command=f'python {container_code_path}',
-                volumes={temp_file: {'bind': container_code_path, 'mode': 'ro'}},
-                remove=True,  # 执行完自动删除
-                stdout=True,
-                stderr=True
-            )
+            with request_metrics.sandbox_timer():
+                result = client.containers.run(
+                    image=image,
+                    command=f'python {container_code_path}',
+                    volumes={temp_file: {'bind': container_code_path, 'mode': 'ro'}},
+                    remove=True,  # 执行完自动删除
+                    stdout=True,
+                    stderr=True
+                )
             
             # 获取输出 - result 已经是字节串
             if isinstance(result, bytes):
@@ -126,6 +184,107 @@ def execute_python_code(code):
         except:
             pass
 
+def lesson_exercise(lesson_id):
+    """The lesson's coding exercise (runtime, test cases) without its text columns, None when it has none"""
+    return CodingExercise.summary_query().filter_by(lesson_id=lesson_id).first()
+
+def _normalize_output(text):
+    # 忽略行尾空白与结尾空行
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+def grade_input_tests(code, runtime, tests):
+    """每个测试用例的 input 作为 stdin 执行一次并比对 expected_output。
+
+    返回 (test_results, passed_tests, total_tests, success, execution_output)
+    """
+    results = execute_python_code_cases(code, [str(test.get('input', '')) for test in tests], runtime,
+                                        allow_input=True)
+    test_results = []
+    passed_tests = 0
+    for number, (test, (success, stdout, stderr, message)) in enumerate(zip(tests, results), 1):
+        expected = str(test.get('expected_output', ''))
+        if not success:
+            passed, feedback = False, f'代码执行失败: {stderr or message}'
+        elif _normalize_output(stdout) == _normalize_output(expected):
+            passed, feedback = True, '输出正确'
+        else:
+            passed, feedback = False, f'输出与预期不符。预期: "{expected.strip()}"，实际输出: "{stdout.strip()}"'
+        passed_tests += passed
+        test_results.append({
+            'test_case': number,
+            'passed': passed,
+            'input': test.get('input', ''),
+            'message': feedback
+        })
+    success, stdout, stderr, message = results[0]
+    execution_output = stdout if success else f"错误: {stderr or message}"
+    return test_results, passed_tests, len(tests), all(result[0] for result in results), execution_output
+
+def _memory_bytes(limit):
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    return int(limit[:-1]) * units[limit[-1].lower()] if limit[-1].lower() in units else int(limit)
+
+def execute_python_code_cases(code, inputs, runtime=None, allow_input=False):
+    """同一程序对多组 stdin 输入各执行一次（同一个沙箱内），返回每组输入的 execute_python_code 结果"""
+    client, image, failure = _prepare_sandbox(code, runtime, allow_input)
+    if failure:
+        return [failure] * len(inputs)
+    if _uses_fork_server(image, runtime):
+        return [execute_in_fork_server(client, image, code, stdin) for stdin in inputs]
+    return execute_cases_in_container(client, image, code, inputs)
+
+def execute_cases_in_container(client, image, code, inputs):
+    """在一个容器中依次以每组输入运行程序"""
+    import docker
+    try:
+        with request_metrics.sandbox_timer():
+            results = code_batcher.execute_in_container(
+                client, image, [{'code': code, 'stdin': stdin} for stdin in inputs], EXECUTION_TIMEOUT,
+                _memory_bytes(MEMORY_LIMIT))
+    except docker.errors.ContainerError as e:
+        return [(False, "", str(e), "代码执行出错")] * len(inputs)
+    except docker.errors.APIError as e:
+        return [(False, "", str(e), "Docker API错误")] * len(inputs)
+    except Exception as e:
+        return [(False, "", str(e), f"容器执行异常: {type(e).__name__}")] * len(inputs)
+    return [_result_tuple(result) for result in results]
+
+def execute_in_fork_server(client, image, code, stdin=None):
+    """与 execute_python_code 相同的返回值，在 zygote 中 fork 子进程执行"""
+    try:
+        with request_metrics.sandbox_timer():
+            result = fork_servers.run(client, image, code, timeout=EXECUTION_TIMEOUT,
+                                      memory=_memory_bytes(MEMORY_LIMIT), stdin=stdin)
+    except ForkServerUnavailable as e:
+        return False, "", str(e), "沙箱执行服务不可用"
+    except Exception as e:
+        return False, "", str(e), f"容器执行异常: {type(e).__name__}"
+    return _result_tuple(result)
+
+def execute_in_batch(client, image, code, stdin=None):
+    """与 execute_python_code 相同的返回值，与同一时间窗内的其他提交共用一个容器"""
+    import docker
+    try:
+        with request_metrics.sandbox_timer():
+            result = code_batcher.run(image, {'code': code, 'stdin': stdin}, lambda runs: code_batcher.execute_in_container(
+                client, image, runs, EXECUTION_TIMEOUT, _memory_bytes(MEMORY_LIMIT)))
+    except docker.errors.APIError as e:
+        return False, "", str(e), "Docker API错误"
+    except Exception as e:
+        return False, "", str(e), f"容器执行异常: {type(e).__name__}"
+    return _result_tuple(result)
+
+def _result_tuple(result):
+    """fork server / 批次执行的结果 dict 转成 execute_python_code 的返回值"""
+    if result['timed_out']:
+        return False, result['stdout'].strip(), "", f"执行超时（超过 {EXECUTION_TIMEOUT} 秒）"
+    if result['truncated']:
+        return False, result['stdout'].strip(), "", "输出过多，执行已终止"
+    if result['exit_code'] != 0:
+        return False, "", result['stderr'], "代码执行出错"
+    # 与容器模式一致：成功时 stdout 与 stderr 合并输出
+    return True, (result['stdout'] + result['stderr']).strip(), "", "执行成功"
+
 @bp.route('/run', methods=['POST'])
 def run_code():
     """运行代码并返回结果"""
@@ -139,8 +298,29 @@ def run_code():
     if not submitted_code:
         return jsonify({'error': 'Empty code submitted'}), 400
     
+    # 在练习指定的执行环境中运行；未指定练习时使用 runtime 参数或默认环境
+    runtime = data.get('runtime')
+    allow_input = False
+    if data.get('lesson_id'):
+        exercise = lesson_exercise(data['lesson_id'])
+        if exercise:
+            runtime = exercise.runtime
+            # 以 stdin 测试的练习允许 input()
+            allow_input = bool(exercise.get_input_tests())
+    
+    stdin = data.get('stdin')
+    inputs = data.get('inputs')
+    if stdin is not None and not isinstance(stdin, str):
+        return jsonify({'error': 'stdin must be a string'}), 400
+    if inputs is not None:
+        if not isinstance(inputs, list) or not all(isinstance(item, str) for item in inputs):
+            return jsonify({'error': 'inputs must be a list of strings'}), 400
+        if not inputs or len(inputs) > MAX_INPUTS:
+            return jsonify({'error': f'inputs must contain 1 to {MAX_INPUTS} entries'}), 400
+        return run_code_cases(submitted_code, inputs, runtime, allow_input)
+    
     # 执行代码
-    success, stdout, stderr, message = execute_python_code(submitted_code)
+    success, stdout, stderr, message = execute_python_code(submitted_code, runtime, stdin, allow_input)
     
     if success:
         return jsonify({
@@ -157,6 +337,22 @@ def run_code():
             'execution_time': None
         }), 400
 
+def run_code_cases(code, inputs, runtime, allow_input):
+    """同一程序对多组输入执行，逐组返回输出"""
+    results = [{
+        'input': stdin,
+        'success': success,
+        'output': stdout,
+        'error': None if success else (stderr or message)
+    } for stdin, (success, stdout, stderr, message) in zip(
+        inputs, execute_python_code_cases(code, inputs, runtime, allow_input))]
+    succeeded = all(result['success'] for result in results)
+    return jsonify({
+        'message': 'Code executed successfully' if succeeded else 'Code execution failed',
+        'results': results,
+        'execution_time': '< 1s' if succeeded else None
+    }), 200 if succeeded else 400
+
 @bp.route('/submit/<int:lesson_id>', methods=['POST'])
 def submit_code(lesson_id):
     """提交编程作业并自动评分"""
@@ -164,13 +360,13 @@ def submit_code(lesson_id):
     # 为了简化，这里使用请求中的 student_id 参数
     data = request.get_json()
     
-    # 从请求中获取 student_id，如果没有则使用默认值 1
-    user_id = data.get('student_id', 1)
+    # 优先使用 token 中的用户，否则从请求中获取 student_id，如果没有则使用默认值 1
+    caller = request_user(data.get('student_id', 1))
     
     # 验证用户
-    user = User.query.get(user_id)
-    if not user or not user.is_student():
+    if not caller or caller[1] != 'student':
         return jsonify({'error': 'Only students can submit solutions'}), 403
+    user_id = caller[0]
     
     if not data or 'code' not in data:
         return jsonify({'error': 'No code submitted'}), 400
@@ -186,63 +382,75 @@ def submit_code(lesson_id):
         return jsonify({'error': 'Lesson not found'}), 404
     
     try:
-        # 执行代码并获取实际输出
-        success, stdout, stderr, message = execute_python_code(submitted_code)
-        
-        # 评分逻辑
-        test_results = []
-        passed_tests = 0
-        total_tests = 3
+        exercise = lesson_exercise(lesson_id)
+        runtime = exercise.runtime if exercise else None
+        input_tests = exercise.get_input_tests() if exercise else []
         
-        if not success:
-            # 代码执行失败
-            test_results = [{
-                'test_case': 1,
-                'passed': False,
-                'message': f'代码执行失败: {stderr or message}'
-            }]
-            score = 0
+        if input_tests:
+            # 以 stdin 测试的练习：每个测试用例的输入在同一个沙箱中各执行一次，比对输出
+            test_results, passed_tests, total_tests, success, execution_output = grade_input_tests(
+                submitted_code, runtime, input_tests)
         else:
-            # 测试1: 代码成功执行
-            test_results.append({
-                'test_case': 1,
-                'passed': True,
-                'message': '代码成功执行'
-            })
-            passed_tests += 1
-            
-            # 测试2: 检查是否有输出
-            if stdout.strip():
+            # 执行代码并获取实际输出
+            success, stdout, stderr, message = execute_python_code(submitted_code, runtime)
+        
+            # 评分逻辑
+            test_results = []
+            passed_tests = 0
+            total_tests = 3
+        
+            if not success:
+                # 代码执行失败
+                test_results = [{
+                    'test_case': 1,
+                    'passed': False,
+                    'message': f'代码执行失败: {stderr or message}'
+                }]
+                score = 0
+            else:
+                # 测试1: 代码成功执行
                 test_results.append({
-                    'test_case': 2,
+                    'test_case': 1,
                     'passed': True,
-                    'message': '代码产生了输出'
+                    'message': '代码成功执行'
                 })
                 passed_tests += 1
-            else:
-                test_results.append({
-                    'test_case': 2,
-                    'passed': False,
-                    'message': '代码没有产生输出'
-                })
             
-            # 测试3: 检查特定输出（根据作业要求定制）
-            expected_outputs = ['hello', 'Hello', 'HELLO']
-            output_found = any(expected in stdout for expected in expected_outputs)
+                # 测试2: 检查是否有输出
+                if stdout.strip():
+                    test_results.append({
+                        'test_case': 2,
+                        'passed': True,
+                        'message': '代码产生了输出'
+                    })
+                    passed_tests += 1
+                else:
+                    test_results.append({
+                        'test_case': 2,
+                        'passed': False,
+                        'message': '代码没有产生输出'
+                    })
             
-            if output_found:
-                test_results.append({
-                    'test_case': 3,
-                    'passed': True,
-                    'message': '输出包含预期内容'
-                })
-                passed_tests += 1
-            else:
-                test_results.append({
-                    'test_case': 3,
-                    'passed': False,
-                    'message': f'输出不包含预期内容。实际输出: "{stdout.strip()}"'
-                })
+                # 测试3: 检查特定输出（根据作业要求定制）
+                expected_outputs = ['hello', 'Hello', 'HELLO']
+                output_found = any(expected in stdout for expected in expected_outputs)
+            
+                if output_found:
+                    test_results.append({
+                        'test_case': 3,
+                        'passed': True,
+                        'message': '输出包含预期内容'
+                    })
+                    passed_tests += 1
+                else:
+                    test_results.append({
+                        'test_case': 3,
+                        'passed': False,
+                        'message': f'输出不包含预期内容。实际输出: "{stdout.strip()}"'
+                    })
+            
+            # 准备返回的输出
+            execution_output = stdout if success else f"错误: {stderr or message}"
         
         # 计算分数
         score = int((passed_tests / total_tests) * 100)
@@ -277,9 +485,6 @@ def submit_code(lesson_id):
         
         db.session.commit()
         
-        # 准备返回的输出
-        execution_output = stdout if success else f"错误: {stderr or message}"
-        
         return jsonify({
             'message': 'Code submitted and evaluated',
             'score': score,
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from backend.models.user import User
 from backend.models.course import Course, Unit, Enrollment
-from backend.models.lesson import Lesson
-from backend.models.progress import Progress
+from backend.models import read_models
+from backend.http_cache import conditional_get
+from backend.content_cache import content_cache
+from backend.enrollment import bulk_enroll, sync_enrollments
+from backend.auth_tokens import request_user
 from backend import db
 
 bp = Blueprint('courses', __name__, url_prefix='/api/courses')
@@ -12,6 +15,21 @@ def is_enrolled(student_id, course_id):
     enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
     return enrollment is not None
 
+# Helper function to build the unit/lesson tree of a course
+def build_course_tree(course_id):
+    # 構建包含單元和課程的完整數據結構（兩次查詢，不逐一載入關聯）
+    lessons_by_unit = {}
+    for lesson in read_models.lesson_summaries(course_id):
+        lessons_by_unit.setdefault(lesson.unit_id, []).append(lesson.to_dict())
+    
+    units_data = []
+    for unit in read_models.unit_summaries(course_id):
+        unit_data = unit.to_dict()
+        # 添加課程信息到單元數據中
+        unit_data['lessons'] = lessons_by_unit.get(unit.id, [])
+        units_data.append(unit_data)
+    return units_data
+
 # Create a new course
 @bp.route('', methods=['POST'])
 def create_course():
@@ -33,36 +51,98 @@ def create_course():
     
     return jsonify({'message': 'Course created successfully', 'course': course.to_dict()}), 201
 
+# Import courses in the courses/*.json format
+@bp.route('/import', methods=['POST'])
+def import_courses():
+    from backend.course_import import import_course, import_course_file, bundled_course_files
+    data = request.get_json()
+    if data is None:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    # Accepts a course document, a list of them, or {"files": [...]} naming files in courses/
+    creator_id = request.args.get('creator_id', 1, type=int)
+    creator = User.query.get(creator_id)
+    if creator is None or not creator.is_teacher():
+        return jsonify({'error': 'creator_id must be an existing teacher'}), 400
+    if isinstance(data, dict) and 'files' in data:
+        paths = bundled_course_files(data['files'] if isinstance(data['files'], list) else None)
+        if not paths:
+            return jsonify({'error': 'No matching course files'}), 404
+        jobs = [lambda path=path: import_course_file(path, creator_id=creator_id) for path in paths]
+    else:
+        documents = data if isinstance(data, list) else [data]
+        if not all(isinstance(doc, dict) for doc in documents):
+            return jsonify({'error': 'Course documents must be objects'}), 400
+        jobs = [lambda doc=doc: import_course(doc, doc.get('lessons', []), creator_id=creator_id)
+                for doc in documents]
+    
+    results = []
+    for job in jobs:
+        try:
+            results.append(job())
+        except ValueError as e:
+            return jsonify({'error': str(e), 'results': results}), 400
+        except Exception as e:
+            print(f"Error importing course: {e}")
+            return jsonify({'error': f'Failed to import course: {str(e)}', 'results': results}), 500
+    
+    return jsonify({'message': 'Import completed', 'results': results}), 200
+
 # Get all courses
 @bp.route('', methods=['GET'])
+@conditional_get(read_models.course_tree_version)
 def get_courses():
     # 返回所有課程，不需要認證
-    courses = Course.query.all()
+    courses = read_models.course_summaries()
     return jsonify({'courses': [course.to_dict() for course in courses]}), 200
 
 # Get a specific course
 @bp.route('/<int:course_id>', methods=['GET'])
+@conditional_get(read_models.course_tree_version)
 def get_course(course_id):
     # 簡化API，允許直接獲取課程詳情
-    course = Course.query.get(course_id)
+    course = read_models.course_summary(course_id)
     if not course:
         return jsonify({'error': 'Course not found'}), 404
     
-    # Get course with units and lessons
+    # Get course with units and lessons; the unit/lesson tree is cached until content changes
     course_data = course.to_dict()
-    
-    # 構建包含單元和課程的完整數據結構
-    units_data = []
-    for unit in course.units:
-        unit_data = unit.to_dict()
-        # 添加課程信息到單元數據中
-        unit_data['lessons'] = [lesson.to_dict() for lesson in unit.lessons]
-        units_data.append(unit_data)
-    
-    course_data['units'] = units_data
+    course_data['units'] = content_cache.get_or_load(('course_tree', course_id),
+                                                     lambda: build_course_tree(course_id))
     
     return jsonify({'course': course_data}), 200
 
+# Export a course in the courses/*.json format, streamed in chunks
+@bp.route('/<int:course_id>/export', methods=['GET'])
+def export_course(course_id):
+    from backend.course_export import export_course as export_chunks, EXPORT_FORMATS
+    export_format = request.args.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    include_activity = 'activity' in request.args.get('include', '').split(',')
+    if include_activity:
+        # Students' enrollments, progress and code: only for the course's teacher, as in the gradebook
+        caller = request_user(request.args.get('teacher_id', type=int))
+        if not caller:
+            if not request.args.get('teacher_id', type=int):
+                return jsonify({'error': 'Please provide teacher_id as a query parameter'}), 400
+            return jsonify({'error': 'User not found'}), 404
+        user_id, role = caller
+        course = Course.query.get(course_id)
+        if not course:
+            return jsonify({'error': 'Course not found'}), 404
+        if role != 'teacher' or course.creator_id != user_id:
+            return jsonify({'error': 'You do not have permission to view this course'}), 403
+    
+    chunks = export_chunks(course_id, export_format, include_activity)
+    if chunks is None:
+        return jsonify({'error': 'Course not found'}), 404
+    
+    mimetype = 'application/json' if export_format == 'json' else 'application/x-ndjson'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=course-{course_id}.{export_format}'
+    return response
+
 # Update a course
 @bp.route('/<int:course_id>', methods=['PUT'])
 def update_course(course_id):
@@ -128,13 +208,14 @@ def create_unit(course_id):
 
 # Get all units in a course
 @bp.route('/<int:course_id>/units', methods=['GET'])
+@conditional_get(read_models.course_tree_version)
 def get_units(course_id):
     course = Course.query.get(course_id)
     if not course:
         return jsonify({'error': 'Course not found'}), 404
     
     # Get all units in the course, ordered by their order field
-    units = Unit.query.filter_by(course_id=course_id).order_by(Unit.order).all()
+    units = read_models.unit_summaries(course_id)
     return jsonify({'units': [unit.to_dict() for unit in units]}), 200
 
 # Enroll students in a course
@@ -150,25 +231,8 @@ def enroll_students(course_id):
     if 'student_ids' not in data or not isinstance(data['student_ids'], list):
         return jsonify({'error': 'List of student IDs is required'}), 400
     
-    # Enroll each student
-    results = []
-    for student_id in data['student_ids']:
-        # Check if student exists and is actually a student
-        student = User.query.get(student_id)
-        if not student or not student.is_student():
-            results.append({'student_id': student_id, 'status': 'error', 'message': 'Invalid student ID'})
-            continue
-        
-        # Check if student is already enrolled
-        existing_enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
-        if existing_enrollment:
-            results.append({'student_id': student_id, 'status': 'skipped', 'message': 'Student already enrolled'})
-            continue
-        
-        # Create new enrollment
-        enrollment = Enrollment(student_id=student_id, course_id=course_id)
-        db.session.add(enrollment)
-        results.append({'student_id': student_id, 'status': 'success', 'message': 'Student enrolled successfully'})
+    # Validate every id and diff against the current roster in a few set-based queries
+    results = bulk_enroll(course_id, data['student_ids'])
     
     db.session.commit()
     
@@ -188,25 +252,13 @@ def update_course_enrollments(course_id):
         return jsonify({'error': '必須提供學生ID列表'}), 400
 
     try:
-        # 1. Remove all existing enrollments for this course
-        Enrollment.query.filter_by(course_id=course_id).delete()
-        
-        # 2. Add new enrollments for the provided student_ids
-        new_enrollments = []
-        for student_id in student_ids:
-            student = User.query.get(student_id)
-            if student and student.role == 'student':
-                enrollment = Enrollment(student_id=student_id, course_id=course_id)
-                new_enrollments.append(enrollment)
-            else:
-                # Optionally, log or raise an error for invalid student_ids
-                print(f"警告：學生ID {student_id} 不存在或非學生角色，已跳過註冊。")
-        
-        if new_enrollments:
-            db.session.add_all(new_enrollments)
+        # 只新增缺少的學生、移除多餘的學生，保留原有註冊資料（含 enrolled_at）
+        changes = sync_enrollments(course_id, student_ids)
+        for student_id in changes['invalid']:
+            print(f"警告：學生ID {student_id} 不存在或非學生角色，已跳過註冊。")
         
         db.session.commit()
-        return jsonify({'message': '課程註冊狀態已成功更新'}), 200
+        return jsonify({'message': '課程註冊狀態已成功更新', 'changes': changes}), 200
     except Exception as e:
         db.session.rollback()
         print(f"Error updating enrollments: {e}")
@@ -220,19 +272,8 @@ def get_enrollments(course_id):
         return jsonify({'error': 'Course not found'}), 404
     
     # Get all enrollments for the course with student information
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    
-    enrollment_data = []
-    for enrollment in enrollments:
-        student = User.query.get(enrollment.student_id)
-        if student:
-            enrollment_data.append({
-                'enrollment_id': enrollment.id,
-                'student_id': student.id,
-                'username': student.username,
-                'email': student.email,
-                'enrolled_at': enrollment.enrolled_at.isoformat() if enrollment.enrolled_at else None
-            })
+    enrollments = read_models.enrollment_rows(course_id)
+    enrollment_data = [enrollment.to_dict() for enrollment in enrollments]
     
     return jsonify({'enrollments': enrollment_data}), 200
 
@@ -328,65 +369,8 @@ def get_enrolled_courses():
     if not student_id:
         return jsonify({'error': 'student_id query parameter is required'}), 400
 
-    # 獲取該學生所有的註冊記錄
-    enrollments = Enrollment.query.filter_by(student_id=student_id).all()
-    
-    # 獲取這些註冊記錄對應的課程
-    course_ids = [enrollment.course_id for enrollment in enrollments]
-    courses = Course.query.filter(Course.id.in_(course_ids)).all() if course_ids else []
-    
-    # 返回課程信息和學生的進度
-    result = []
-    for course in courses:
-        # 計算該課程的總課程數和已完成課程數
-        units = Unit.query.filter_by(course_id=course.id).all()
-        unit_ids = [unit.id for unit in units]
-        
-        # 獲取所有課程
-        lessons_count = 0
-        if unit_ids:
-            lessons_count = Lesson.query.filter(Lesson.unit_id.in_(unit_ids)).count()
-        
-        # 獲取已完成的課程數
-        completed_lessons = 0
-        if unit_ids and lessons_count > 0:
-            lessons = Lesson.query.filter(Lesson.unit_id.in_(unit_ids)).all()
-            lesson_ids = [lesson.id for lesson in lessons]
-            if lesson_ids:
-                completed = Progress.query.filter(
-                    Progress.student_id == student_id,
-                    Progress.lesson_id.in_(lesson_ids),
-                    Progress.completed == True
-                ).count()
-                completed_lessons = completed
-        
-        # 計算完成百分比
-        completion_percentage = (completed_lessons / lessons_count * 100) if lessons_count > 0 else 0
-        
-        # 獲取最近的活動時間
-        last_activity = None
-        if unit_ids and lessons_count > 0:
-            latest_progress = Progress.query.filter(
-                Progress.student_id == student_id,
-                Progress.lesson_id.in_(lesson_ids)
-            ).order_by(Progress.updated_at.desc()).first()
-            
-            if latest_progress:
-                last_activity = latest_progress.updated_at.isoformat()
-        
-        # 構建課程信息
-        course_info = {
-            'id': course.id,
-            'title': course.title,
-            'description': course.description,
-            # 'image_url': course.image_url, # Removed as Course model does not have image_url
-            'lessons_count': lessons_count,
-            'completed_lessons': completed_lessons,
-            'completion_percentage': round(completion_percentage),
-            'last_activity': last_activity,
-            'enrolled_at': next((e.enrolled_at.isoformat() for e in enrollments if e.course_id == course.id and e.enrolled_at is not None), None)
-        }
-        
-        result.append(course_info)
+    # 一次查詢取得已註冊課程、課程數、已完成課程數和最近的活動時間
+    courses = read_models.enrolled_course_summaries(student_id)
+    result = [course.to_dict() for course in courses]
     
     return jsonify({'courses': result}), 200
@@ -0,0 +1,131 @@
+from flask import Blueprint, request, jsonify, current_app
+from backend import db
+from backend.auth_tokens import token_user, is_admin
+from backend.db_engine import engine_stats
+from backend.profiling import profiler, PROFILE_FORMATS, SAMPLE_FORMATS
+
+bp = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
+
+
+@bp.route('/db', methods=['GET'])
+def database():
+    # Backend, connection pool state and effective SQLite pragmas of each engine, for the usernames in ADMINS
+    if not is_admin():
+        return jsonify({'error': 'Diagnostics are restricted to administrators'}), 403
+    return jsonify({'engines': engine_stats(current_app, db)}), 200
+
+
+def profiling_denied():
+    """Error response unless profiling is enabled and the token user is a profiling admin"""
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    if not profiler.is_admin(token_user()):
+        return jsonify({'error': 'Profiling is restricted to administrators'}), 403
+    return None
+
+
+@bp.route('/profile', methods=['POST'])
+def start_profile():
+    # cProfile the next N requests to one endpoint, e.g. {"endpoint": "courses.get_course", "requests": 20}
+    denied = profiling_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    endpoint = data.get('endpoint')
+    if endpoint not in current_app.view_functions:
+        return jsonify({'error': f'Unknown endpoint: {endpoint}'}), 400
+    try:
+        requests = int(data.get('requests', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'requests must be a number'}), 400
+    session = profiler.arm(endpoint, requests)
+    return jsonify({'session': session.to_dict()}), 201
+
+
+@bp.route('/profile', methods=['GET'])
+def list_profiles():
+    denied = profiling_denied()
+    if denied:
+        return denied
+    return jsonify({'sessions': [session.to_dict() for session in profiler.sessions()]}), 200
+
+
+@bp.route('/profile/<session_id>', methods=['GET'])
+def get_profile(session_id):
+    # Session status; ?format=pstats|text downloads the merged profile
+    denied = profiling_denied()
+    if denied:
+        return denied
+    session = profiler.session(session_id)
+    if session is None:
+        return jsonify({'error': 'Profiling session not found'}), 404
+    format = request.args.get('format')
+    if format is None:
+        return jsonify({'session': session.to_dict()}), 200
+    if format not in PROFILE_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(PROFILE_FORMATS)}'}), 400
+    dump = profiler.dump(session, format)
+    if dump is None:
+        return jsonify({'error': 'No request has been profiled yet', 'session': session.to_dict()}), 409
+    if format == 'text':
+        return current_app.response_class(dump, mimetype='text/plain')
+    return current_app.response_class(dump, mimetype='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="profile-{session.id}.pstats"'})
+
+
+@bp.route('/profile/<session_id>', methods=['DELETE'])
+def cancel_profile(session_id):
+    denied = profiling_denied()
+    if denied:
+        return denied
+    if profiler.cancel(session_id) is None:
+        return jsonify({'error': 'Profiling session not found'}), 404
+    return jsonify({'message': 'Profiling session removed'}), 200
+
+
+@bp.route('/sampler', methods=['POST'])
+def start_sampler():
+    # Start the sampling profiler of this worker; optional {"interval": seconds, "window": seconds}
+    denied = profiling_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data['interval']) if data.get('interval') else None
+        window = int(data['window']) if data.get('window') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'interval and window must be numbers'}), 400
+    profiler.start_sampler(interval, window)
+    return jsonify({'sampler': profiler.sampler_status()}), 200
+
+
+@bp.route('/sampler', methods=['GET'])
+def sampler_status():
+    denied = profiling_denied()
+    if denied:
+        return denied
+    return jsonify({'sampler': profiler.sampler_status()}), 200
+
+
+@bp.route('/sampler/stacks', methods=['GET'])
+def sampled_stacks():
+    # Aggregated stacks of the last ?window= seconds: collapsed (flamegraph.pl / speedscope) or text
+    denied = profiling_denied()
+    if denied:
+        return denied
+    format = request.args.get('format', 'collapsed')
+    if format not in SAMPLE_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(SAMPLE_FORMATS)}'}), 400
+    stacks = profiler.sampled_stacks(format, request.args.get('window', type=int))
+    if stacks is None:
+        return jsonify({'error': 'The sampler is not running'}), 409
+    return current_app.response_class(stacks, mimetype='text/plain')
+
+
+@bp.route('/sampler', methods=['DELETE'])
+def stop_sampler():
+    denied = profiling_denied()
+    if denied:
+        return denied
+    profiler.stop_sampler()
+    return jsonify({'sampler': profiler.sampler_status()}), 200
@@ -1,60 +1,55 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
+from backend.auth_tokens import token_user
 from backend.models.user import User
 from backend.models.lesson import Lesson, FillBlankExercise
+from backend.models.course import Enrollment
 from backend import db
 import json
 
 bp = Blueprint('lesson_content_fillblank', __name__, url_prefix='/api/content/fill-blank')
 
-# Helper function to check if user is a teacher
-def is_teacher(user_id):
-    user = User.query.get(user_id)
-    return user and user.is_teacher()
-
-# Helper function to check if user has access to a lesson
-def has_lesson_access(user_id, lesson_id):
+# Helper function to check if user has access to a lesson.
+# Pass role when it is already known (e.g. from the session token) to skip the user lookup.
+def has_lesson_access(user_id, lesson_id, role=None):
     # Check if user is a teacher with access or a student enrolled in the course
     lesson = Lesson.query.get(lesson_id)
     if not lesson:
         return False
     
-    # Get unit and course
-    unit = db.session.query(lesson.unit).first()
+    # Get unit and course through the backrefs
+    unit = lesson.unit
     if not unit:
         return False
     
-    course = db.session.query(unit.course).first()
+    course = unit.course
     if not course:
         return False
     
-    user = User.query.get(user_id)
-    if not user:
-        return False
+    if role is None:
+        user = User.query.get(user_id)
+        if not user:
+            return False
+        role = user.role
     
-    if user.is_teacher():
+    if role == 'teacher':
         return course.creator_id == user_id
     else:
         # For students, check enrollment
-        enrollment = db.session.query(db.exists().where(
-            db.and_(
-                db.text('enrollments.student_id = :student_id'),
-                db.text('enrollments.course_id = :course_id')
-            )
-        )).params(student_id=user_id, course_id=course.id).scalar()
-        return enrollment
+        enrollment = Enrollment.query.filter_by(student_id=user_id, course_id=course.id).first()
+        return enrollment is not None
 
 # Create a fill-in-the-blank exercise for a lesson (teacher only)
 @bp.route('/<int:lesson_id>', methods=['POST'])
 @jwt_required()
 def create_fill_blank_exercise(lesson_id):
-    current_user = get_jwt_identity()
+    current_user = token_user()
     user_id = current_user['id']
     
-    if not is_teacher(user_id):
+    if current_user['role'] != 'teacher':
         return jsonify({'error': 'Only teachers can create fill-in-the-blank exercises'}), 403
     
-    if not has_lesson_access(user_id, lesson_id):
+    if not has_lesson_access(user_id, lesson_id, role='teacher'):
         return jsonify({'error': 'You do not have permission to modify this lesson'}), 403
     
     lesson = Lesson.query.get(lesson_id)
@@ -110,17 +105,17 @@ def create_fill_blank_exercise(lesson_id):
 @bp.route('/<int:exercise_id>', methods=['PUT'])
 @jwt_required()
 def update_fill_blank_exercise(exercise_id):
-    current_user = get_jwt_identity()
+    current_user = token_user()
     user_id = current_user['id']
     
-    if not is_teacher(user_id):
+    if current_user['role'] != 'teacher':
         return jsonify({'error': 'Only teachers can update exercises'}), 403
     
     exercise = FillBlankExercise.query.get(exercise_id)
     if not exercise:
         return jsonify({'error': 'Exercise not found'}), 404
     
-    if not has_lesson_access(user_id, exercise.lesson_id):
+    if not has_lesson_access(user_id, exercise.lesson_id, role='teacher'):
         return jsonify({'error': 'You do not have permission to modify this exercise'}), 403
     
     data = request.get_json()
@@ -166,17 +161,17 @@ def update_fill_blank_exercise(exercise_id):
 @bp.route('/<int:exercise_id>', methods=['DELETE'])
 @jwt_required()
 def delete_fill_blank_exercise(exercise_id):
-    current_user = get_jwt_identity()
+    current_user = token_user()
     user_id = current_user['id']
     
-    if not is_teacher(user_id):
+    if current_user['role'] != 'teacher':
         return jsonify({'error': 'Only teachers can delete exercises'}), 403
     
     exercise = FillBlankExercise.query.get(exercise_id)
     if not exercise:
         return jsonify({'error': 'Exercise not found'}), 404
     
-    if not has_lesson_access(user_id, exercise.lesson_id):
+    if not has_lesson_access(user_id, exercise.lesson_id, role='teacher'):
         return jsonify({'error': 'You do not have permission to delete this exercise'}), 403
     
     db.session.delete(exercise)
@@ -1,11 +1,28 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy.orm import selectinload
 import json
-from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise, CODING_EXERCISE_TEXT
 from backend.models.course import Unit
+from backend.models import read_models
+from backend.http_cache import conditional_get
+from backend.content_cache import content_cache
+from backend import sandbox_images
+from backend.sandbox_images import DEFAULT_RUNTIME
 from backend import db
 
 bp = Blueprint('lessons', __name__, url_prefix='/api/lessons')
 
+# Helper function to get a lesson's content type without loading exercise text.
+# Mirrors the precedence used by get_lesson_formatted_data_helper.
+def get_lesson_content_type(lesson_obj):
+    if lesson_obj.coding_exercise:
+        return 'coding'
+    if lesson_obj.multiple_choice_questions:
+        return 'multiple_choice'
+    if lesson_obj.fill_blank_exercises:
+        return 'fill_in_blank'
+    return 'coding' # Default to 'coding' if no content
+
 # Helper function for formatting lesson data for response
 def get_lesson_formatted_data_helper(lesson_obj):
     if not lesson_obj:
@@ -15,7 +32,7 @@ def get_lesson_formatted_data_helper(lesson_obj):
     # Initialize with default empty content structure for each type.
     # This ensures the 'content' key always has a predictable structure for the frontend.
     content_structure = {
-        'coding': {'instructions': '', 'starter_code': '', 'solution_code': '', 'test_code': ''},
+        'coding': {'instructions': '', 'starter_code': '', 'solution_code': '', 'test_code': '', 'runtime': DEFAULT_RUNTIME},
         'multiple_choice': {'question': '', 'options': [], 'correct_option': 0},
         'fill_in_blank': {'text': '', 'blanks': []}
     }
@@ -33,7 +50,8 @@ def get_lesson_formatted_data_helper(lesson_obj):
             'instructions': coding_dict.get('instructions', ''),
             'starter_code': coding_dict.get('starter_code', ''),
             'solution_code': coding_dict.get('solution_code', ''),
-            'test_code': test_code_str
+            'test_code': test_code_str,
+            'runtime': coding_dict.get('runtime', DEFAULT_RUNTIME)
         }
     elif lesson_obj.multiple_choice_questions: # Check if list is not empty
         actual_content_type = 'multiple_choice'
@@ -68,16 +86,22 @@ def get_lesson_formatted_data_helper(lesson_obj):
     
     return lesson_data
 
+# Helper function to load and format a lesson for the content cache
+def load_lesson_formatted_data(lesson_id):
+    # The detail view needs the coding exercise text, so load it up front
+    lesson = Lesson.query.options(
+        selectinload(Lesson.coding_exercise).undefer_group(CODING_EXERCISE_TEXT)
+    ).get(lesson_id)
+    return get_lesson_formatted_data_helper(lesson)
+
 @bp.route('/<int:lesson_id>', methods=['GET'])
+@conditional_get(read_models.lesson_version)
 def get_lesson(lesson_id):
-    lesson = Lesson.query.get(lesson_id)
-    if not lesson:
-        return jsonify({'error': 'Lesson not found'}), 404
-    
-    formatted_data = get_lesson_formatted_data_helper(lesson)
+    # Formatted lessons are cached until lesson content changes
+    formatted_data = content_cache.get_or_load(('lesson', lesson_id),
+                                               lambda: load_lesson_formatted_data(lesson_id))
     if not formatted_data:
-        # This case should ideally not be hit if lesson object exists and helper is robust
-        return jsonify({'error': 'Failed to format lesson data'}), 500
+        return jsonify({'error': 'Lesson not found'}), 404
         
     return jsonify({'lesson': formatted_data}), 200
 
@@ -99,6 +123,10 @@ def update_lesson(lesson_id):
 
     requested_content_type = data.get('content_type')
     content_payload = data.get('content')
+    if requested_content_type == 'coding' and content_payload:
+        runtime = content_payload.get('runtime') or DEFAULT_RUNTIME
+        if not sandbox_images.is_runtime(runtime):
+            return jsonify({'error': f"Unknown runtime '{runtime}'. Choose from: {', '.join(sandbox_images.RUNTIMES)}"}), 400
 
     # Clear existing content before adding new/updated content
     # This handles cases where content type changes or content is simply updated.
@@ -128,7 +156,8 @@ def update_lesson(lesson_id):
                 instructions=content_payload.get('instructions', ''),
                 starter_code=content_payload.get('starter_code', ''),
                 solution_code=content_payload.get('solution_code', ''),
-                max_score=content_payload.get('max_score', 100) 
+                max_score=content_payload.get('max_score', 100),
+                runtime=content_payload.get('runtime') or DEFAULT_RUNTIME
             )
             test_code_str = content_payload.get('test_code', '') 
             # Model's set_test_cases expects a list of dicts or similar structured data
@@ -198,6 +227,10 @@ def create_lesson():
 
     requested_content_type = data.get('content_type')
     content_payload = data.get('content')
+    if requested_content_type == 'coding' and content_payload:
+        runtime = content_payload.get('runtime') or DEFAULT_RUNTIME
+        if not sandbox_images.is_runtime(runtime):
+            return jsonify({'error': f"Unknown runtime '{runtime}'. Choose from: {', '.join(sandbox_images.RUNTIMES)}"}), 400
 
     if requested_content_type and content_payload:
         if requested_content_type == 'coding':
@@ -205,7 +238,8 @@ def create_lesson():
                 instructions=content_payload.get('instructions', ''),
                 starter_code=content_payload.get('starter_code', ''),
                 solution_code=content_payload.get('solution_code', ''),
-                max_score=content_payload.get('max_score', 100)
+                max_score=content_payload.get('max_score', 100),
+                runtime=content_payload.get('runtime') or DEFAULT_RUNTIME
             )
             test_code_str = content_payload.get('test_code', '')
             test_cases_for_model = [{'code': line} for line in test_code_str.splitlines() if line.strip()] if test_code_str else []
@@ -1,16 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from backend.models.user import User
 from backend.models.course import Course, Unit, Enrollment
-from backend.models.lesson import Lesson, MultipleChoiceQuestion, FillBlankExercise
+from backend.models.lesson import Lesson
 from backend.models.progress import Progress, SubmissionHistory
+from backend.models import read_models
+from backend.content_cache import content_cache
+from backend.auth_tokens import request_user
 from backend import db
+from sqlalchemy import select
 from datetime import datetime
 import json
+import csv
+import io
 
 bp = Blueprint('progress', __name__, url_prefix='/api/progress')
 
-# Helper function to check if user has access to a lesson
-def has_lesson_access(user_id, lesson_id):
+# Helper function to check if user has access to a lesson.
+# Pass role when it is already known (e.g. from the session token) to skip the user lookup.
+def has_lesson_access(user_id, lesson_id, role=None):
     lesson = Lesson.query.get(lesson_id)
     if not lesson:
         return False
@@ -23,11 +30,13 @@ def has_lesson_access(user_id, lesson_id):
     if not course:
         return False
     
-    user = User.query.get(user_id)
-    if not user:
-        return False
+    if role is None:
+        user = User.query.get(user_id)
+        if not user:
+            return False
+        role = user.role
     
-    if user.is_teacher():
+    if role == 'teacher':
         return course.creator_id == user_id
     else:
         # For students, check enrollment
@@ -39,15 +48,15 @@ def has_lesson_access(user_id, lesson_id):
 def submit_multiple_choice_answers(lesson_id):
     data = request.get_json()
     
-    # 从请求中获取 student_id，如果没有则使用默认值 1
-    user_id = data.get('student_id', 1)
+    # 优先使用 token 中的用户，否则从请求中获取 student_id，如果没有则使用默认值 1
+    caller = request_user(data.get('student_id', 1))
     
     # Only students can submit answers
-    user = User.query.get(user_id)
-    if not user or not user.is_student():
+    if not caller or caller[1] != 'student':
         return jsonify({'error': 'Only students can submit answers'}), 403
+    user_id = caller[0]
     
-    if not has_lesson_access(user_id, lesson_id):
+    if not has_lesson_access(user_id, lesson_id, role='student'):
         return jsonify({'error': 'You do not have access to this lesson'}), 403
     
     lesson = Lesson.query.get(lesson_id)
@@ -57,8 +66,9 @@ def submit_multiple_choice_answers(lesson_id):
     if 'answers' not in data or not isinstance(data['answers'], dict):
         return jsonify({'error': 'Invalid answers format'}), 400
     
-    # Get all multiple choice questions for this lesson
-    questions = MultipleChoiceQuestion.query.filter_by(lesson_id=lesson_id).all()
+    # Get the answer key of all multiple choice questions for this lesson
+    questions = content_cache.get_or_load(('multiple_choice_keys', lesson_id),
+                                          lambda: read_models.multiple_choice_keys(lesson_id))
     if not questions:
         return jsonify({'error': 'No multiple choice questions found for this lesson'}), 404
     
@@ -135,15 +145,15 @@ def submit_multiple_choice_answers(lesson_id):
 def submit_fill_blank_answers(lesson_id):
     data = request.get_json()
     
-    # 从请求中获取 student_id，如果没有则使用默认值 1
-    user_id = data.get('student_id', 1)
+    # 优先使用 token 中的用户，否则从请求中获取 student_id，如果没有则使用默认值 1
+    caller = request_user(data.get('student_id', 1))
     
     # Only students can submit answers
-    user = User.query.get(user_id)
-    if not user or not user.is_student():
+    if not caller or caller[1] != 'student':
         return jsonify({'error': 'Only students can submit answers'}), 403
+    user_id = caller[0]
     
-    if not has_lesson_access(user_id, lesson_id):
+    if not has_lesson_access(user_id, lesson_id, role='student'):
         return jsonify({'error': 'You do not have access to this lesson'}), 403
     
     lesson = Lesson.query.get(lesson_id)
@@ -153,8 +163,9 @@ def submit_fill_blank_answers(lesson_id):
     if 'answers' not in data or not isinstance(data['answers'], list):
         return jsonify({'error': 'Invalid answers format'}), 400
     
-    # Get all fill-in-the-blank exercises for this lesson
-    exercises = FillBlankExercise.query.filter_by(lesson_id=lesson_id).all()
+    # Get the answer key of all fill-in-the-blank exercises for this lesson
+    exercises = content_cache.get_or_load(('fill_blank_keys', lesson_id),
+                                          lambda: read_models.fill_blank_keys(lesson_id))
     if not exercises:
         return jsonify({'error': 'No fill-in-the-blank exercises found for this lesson'}), 404
     
@@ -164,7 +175,7 @@ def submit_fill_blank_answers(lesson_id):
     total_points = 0
     
     for exercise in exercises:
-        blanks = exercise.get_blanks()
+        blanks = exercise.blanks
         exercise_results = []
         correct_count = 0
         
@@ -243,12 +254,11 @@ def update_completion_status(progress):
     if not lesson:
         return
     
-    # 從lessons.py導入辅助函数，檢查課程內容類型
-    from routes.lessons import get_lesson_formatted_data_helper
-    lesson_data = get_lesson_formatted_data_helper(lesson)
+    # 從lessons.py導入辅助函数，檢查課程內容類型（不載入程式碼欄位）
+    from routes.lessons import get_lesson_content_type
     
     # Check if all components have been attempted
-    has_coding = lesson_data and lesson_data.get('content_type') == 'coding'
+    has_coding = get_lesson_content_type(lesson) == 'coding'
     has_multiple_choice = len(lesson.multiple_choice_questions) > 0
     has_fill_blank = len(lesson.fill_blank_exercises) > 0
     
@@ -269,23 +279,21 @@ def update_completion_status(progress):
 # Get student progress for a course
 @bp.route('/course/<int:course_id>', methods=['GET'])
 def get_course_progress(course_id):
-    # 从查询参数获取 student_id
-    user_id = request.args.get('student_id', type=int)
+    # 優先使用 token 中的用戶，否則从查询参数获取 student_id
+    caller = request_user(request.args.get('student_id', type=int))
     
     # If user_id is still not determined, return an error
-    if not user_id:
-        return jsonify({'error': 'Please provide student_id as a query parameter'}), 400
-    
-    # Check if user exists
-    user = User.query.get(user_id)
-    if not user:
+    if not caller:
+        if not request.args.get('student_id', type=int):
+            return jsonify({'error': 'Please provide student_id as a query parameter'}), 400
         return jsonify({'error': 'User not found'}), 404
+    user_id, role = caller
     
     course = Course.query.get(course_id)
     if not course:
         return jsonify({'error': 'Course not found'}), 404
     
-    if user.is_student():
+    if role == 'student':
         # Check if student is enrolled
         enrollment = Enrollment.query.filter_by(student_id=user_id, course_id=course_id).first()
         if not enrollment:
@@ -295,7 +303,7 @@ def get_course_progress(course_id):
         progress_data = get_student_course_progress(user_id, course_id)
         return jsonify({'progress': progress_data}), 200
     
-    elif user.is_teacher():
+    elif role == 'teacher':
         # Check if teacher created this course
         if course.creator_id != user_id:
             return jsonify({'error': 'You do not have permission to view this course'}), 403
@@ -308,8 +316,27 @@ def get_course_progress(course_id):
 
 # Helper function to get a student's progress in a course
 def get_student_course_progress(student_id, course_id):
-    # Get all units in the course
-    units = Unit.query.filter_by(course_id=course_id).order_by(Unit.order).all()
+    units = read_models.unit_summaries(course_id)
+    lessons = read_models.lesson_summaries(course_id)
+    progress_rows = read_models.progress_summaries(course_id, student_id=student_id)
+    return build_course_progress(course_id, units, lessons, progress_rows)
+
+# Helper function to get the max possible points of a lesson summary
+def lesson_max_points(lesson):
+    max_points = lesson.multiple_choice_points + lesson.fill_blank_points
+    
+    # Check if lesson has coding content
+    if lesson.content_type == 'coding':
+        max_points += 100  # Default max score for coding exercises
+    return max_points
+
+# Helper function to assemble a progress report from pre-fetched read models,
+# so the course structure can be shared between students
+def build_course_progress(course_id, units, lessons, progress_rows):
+    progress_by_lesson = {p.lesson_id: p for p in progress_rows}
+    lessons_by_unit = {}
+    for lesson in lessons:
+        lessons_by_unit.setdefault(lesson.unit_id, []).append(lesson)
     
     progress_data = {
         'course_id': course_id,
@@ -328,14 +355,11 @@ def get_student_course_progress(student_id, course_id):
             'lessons': []
         }
         
-        # Get all lessons in the unit
-        lessons = Lesson.query.filter_by(unit_id=unit.id).order_by(Lesson.order).all()
-        
-        for lesson in lessons:
+        for lesson in lessons_by_unit.get(unit.id, []):
             total_lessons += 1
             
             # Get progress for this lesson
-            progress = Progress.query.filter_by(student_id=student_id, lesson_id=lesson.id).first()
+            progress = progress_by_lesson.get(lesson.id)
             
             lesson_data = {
                 'lesson_id': lesson.id,
@@ -350,31 +374,18 @@ def get_student_course_progress(student_id, course_id):
             }
             
             # Calculate max possible points for this lesson
-            max_points = 0
-            
-            # Check if lesson has coding content
-            from routes.lessons import get_lesson_formatted_data_helper
-            lesson_data_formatted = get_lesson_formatted_data_helper(lesson)
-            if lesson_data_formatted and lesson_data_formatted.get('content_type') == 'coding':
-                max_points += 100  # Default max score for coding exercises
-            
-            for q in lesson.multiple_choice_questions:
-                max_points += q.points
-            
-            for ex in lesson.fill_blank_exercises:
-                max_points += ex.points
-            
+            max_points = lesson_max_points(lesson)
             lesson_data['max_points'] = max_points
             total_points += max_points
             
             if progress:
                 lesson_data['completed'] = progress.completed
-                lesson_data['coding_score'] = getattr(progress, 'coding_score', 0)
+                lesson_data['coding_score'] = progress.coding_score or 0
                 lesson_data['multiple_choice_score'] = progress.multiple_choice_score
                 lesson_data['fill_blank_score'] = progress.fill_blank_score
                 lesson_data['total_score'] = progress.get_total_score()
                 lesson_data['attempts'] = progress.attempts
-                lesson_data['last_attempt'] = progress.last_attempt_at.isoformat() if progress.last_attempt_at else None
+                lesson_data['last_attempt'] = progress.last_attempt_at
                 
                 if progress.completed:
                     completed_lessons += 1
@@ -399,25 +410,118 @@ def get_student_course_progress(student_id, course_id):
 
 # Helper function to get progress for all students in a course
 def get_all_students_progress(course_id):
-    # Get all enrollments for this course
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
+    # Load the course structure once and every student's scores in one query
+    units = read_models.unit_summaries(course_id)
+    lessons = read_models.lesson_summaries(course_id)
+    progress_by_student = {}
+    for row in read_models.progress_summaries(course_id):
+        progress_by_student.setdefault(row.student_id, []).append(row)
     
     students_progress = []
     
-    for enrollment in enrollments:
-        student = User.query.get(enrollment.student_id)
-        if student:
-            # Get this student's progress
-            progress_data = get_student_course_progress(student.id, course_id)
-            
-            # Add student info
-            student_progress = {
-                'student_id': student.id,
-                'username': student.username,
-                'email': student.email,
-                'progress': progress_data
-            }
-            
-            students_progress.append(student_progress)
+    for enrollment in read_models.enrollment_rows(course_id):
+        # Get this student's progress
+        progress_data = build_course_progress(course_id, units, lessons,
+                                              progress_by_student.get(enrollment.student_id, []))
+        
+        # Add student info
+        student_progress = {
+            'student_id': enrollment.student_id,
+            'username': enrollment.username,
+            'email': enrollment.email,
+            'progress': progress_data
+        }
+        
+        students_progress.append(student_progress)
+    
+    return students_progress
+
+# Download the gradebook of a course as CSV
+@bp.route('/course/<int:course_id>/gradebook.csv', methods=['GET'])
+def export_gradebook(course_id):
+    caller = request_user(request.args.get('teacher_id', type=int))
+    if not caller:
+        if not request.args.get('teacher_id', type=int):
+            return jsonify({'error': 'Please provide teacher_id as a query parameter'}), 400
+        return jsonify({'error': 'User not found'}), 404
+    user_id, role = caller
     
-    return students_progress
\ No newline at end of file
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({'error': 'Course not found'}), 404
+    
+    if role != 'teacher' or course.creator_id != user_id:
+        return jsonify({'error': 'You do not have permission to view this course'}), 403
+    
+    response = Response(stream_with_context(iter_gradebook_csv(course_id)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=gradebook-course-{course_id}.csv'
+    return response
+
+GRADEBOOK_YIELD_PER = 500
+GRADEBOOK_FLUSH_ROWS = 200
+
+# Spreadsheet apps run cells starting with these characters as formulas
+def _csv_safe(value):
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+# Helper generator yielding the gradebook of a course as CSV text chunks:
+# one row per enrolled student with the total score of every lesson.
+# Students and progress rows are read through server-side cursors, both
+# ordered by student id and merged, so memory does not grow with the class size.
+def iter_gradebook_csv(course_id):
+    lessons = read_models.lesson_summaries(course_id)
+    lesson_index = {lesson.id: i for i, lesson in enumerate(lessons)}
+    max_points = [lesson_max_points(lesson) for lesson in lessons]
+    total_points = sum(max_points)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['student_id', 'username', 'email'] +
+                    [_csv_safe(f'{lesson.title} ({points})') for lesson, points in zip(lessons, max_points)] +
+                    ['completed_lessons', 'total_lessons', 'earned_points', 'total_points', 'score_percentage'])
+    # 加上 BOM，Excel 才能正確顯示中文課程名稱
+    yield '\ufeff' + buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    
+    students = db.session.execute(
+        select(User.id, User.username, User.email)
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .where(Enrollment.course_id == course_id)
+        .order_by(User.id)
+        .execution_options(yield_per=GRADEBOOK_YIELD_PER))
+    progress_rows = db.session.execute(
+        select(Progress.student_id, Progress.lesson_id, Progress.coding_score,
+               Progress.multiple_choice_score, Progress.fill_blank_score, Progress.completed)
+        .join(Lesson, Progress.lesson_id == Lesson.id)
+        .join(Unit, Lesson.unit_id == Unit.id)
+        .join(Enrollment, (Enrollment.student_id == Progress.student_id) & (Enrollment.course_id == course_id))
+        .where(Unit.course_id == course_id)
+        .order_by(Progress.student_id)
+        .execution_options(yield_per=GRADEBOOK_YIELD_PER))
+    progress = next(progress_rows, None)
+    
+    for count, (student_id, username, email) in enumerate(students, start=1):
+        scores = [0] * len(lessons)
+        completed = 0
+        while progress is not None and progress.student_id <= student_id:
+            index = lesson_index.get(progress.lesson_id)
+            if progress.student_id == student_id and index is not None:
+                scores[index] = (progress.coding_score or 0) + (progress.multiple_choice_score or 0) \
+                    + (progress.fill_blank_score or 0)
+                completed += 1 if progress.completed else 0
+            progress = next(progress_rows, None)
+        
+        earned = sum(scores)
+        writer.writerow([student_id, _csv_safe(username), _csv_safe(email or '')] + scores +
+                        [completed, len(lessons), earned, total_points,
+                         round(earned / total_points * 100, 1) if total_points > 0 else 0])
+        if count % GRADEBOOK_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -1,27 +1,69 @@
 from flask import Blueprint, request, jsonify
 from backend.models.user import User
+from backend.models import read_models
 from backend import db
 from werkzeug.security import generate_password_hash
+import json
+import base64
+import binascii
+from datetime import datetime
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 
+DIRECTORY_PARAMS = ('q', 'limit', 'cursor', 'sort', 'order', 'compact')
+DIRECTORY_DEFAULT_LIMIT = 50
+DIRECTORY_MAX_LIMIT = 500
+
+def encode_cursor(sort, order, key):
+    value, last_id = key
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, last_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort, order):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    cursor_sort, cursor_order, value, last_id = json.loads(raw)
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(last_id, int):
+        raise ValueError('cursor does not match the requested sort')
+    if sort == 'created_at' and value is not None:
+        value = datetime.fromisoformat(value)
+    return value, last_id
+
 # Get all students
 @bp.route('/students', methods=['GET'])
 def get_all_students():
+    # Without paging/search parameters, return every student as before
+    if not any(param in request.args for param in DIRECTORY_PARAMS):
+        students = read_models.student_summaries()
+        student_data = [student.to_dict() for student in students]
+        return jsonify({'students': student_data}), 200
     
-    # Get all students
-    students = User.query.filter_by(role='student').all()
+    # 伺服器端搜尋（帳號/電郵前綴）與 keyset 分頁
+    q = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'username')
+    order = request.args.get('order', 'asc')
+    limit = request.args.get('limit', DIRECTORY_DEFAULT_LIMIT, type=int)
+    compact = request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+    if sort not in read_models.STUDENT_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(read_models.STUDENT_SORT_KEYS)}"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    limit = max(1, min(limit, DIRECTORY_MAX_LIMIT))
     
-    student_data = []
-    for student in students:
-        student_data.append({
-            'id': student.id,
-            'username': student.username,
-            'email': student.email or '',
-            'created_at': student.created_at.isoformat() if student.created_at else None
-        })
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'], sort, order)
+        except (ValueError, TypeError, binascii.Error):
+            return jsonify({'error': 'Invalid cursor'}), 400
     
-    return jsonify({'students': student_data}), 200
+    students, next_key = read_models.student_directory(
+        q=q or None, sort=sort, descending=order == 'desc', limit=limit, after=after, compact=compact)
+    return jsonify({
+        'students': [student.to_dict() for student in students],
+        'next_cursor': encode_cursor(sort, order, next_key) if next_key else None
+    }), 200
 
 # Create a new student (accessible by anyone for now, can be restricted to teachers)
 @bp.route('', methods=['POST'])
@@ -49,7 +91,7 @@ def create_user():
             'username': new_user.username,
             'email': new_user.email or '', # Assuming email is optional as per memory
             'role': new_user.role,
-            'created_at': new_user.created_at.isoformat() if new_user.created_at else None
+            'created_at': new_user.created_at
         }
         return jsonify({'message': '學生新增成功', 'user': user_data}), 201
     except Exception as e:
@@ -57,6 +99,40 @@ def create_user():
         print(f"Error creating user: {e}")
         return jsonify({'error': '創建用戶時發生錯誤'}), 500
 
+# Create many users at once from a JSON or CSV roster
+@bp.route('/bulk', methods=['POST'])
+def bulk_create_users():
+    from flask import current_app
+    from backend.user_provisioning import parse_roster, provision_users
+    
+    # 名單可用 JSON ({"users": [...], "course_ids": [...]})、CSV 內文或上傳的 CSV/JSON 檔案
+    course_ids = request.args.getlist('course_id', type=int)
+    try:
+        if 'file' in request.files:
+            rows = parse_roster(request.files['file'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            rows = parse_roster(request.get_data(as_text=True), 'csv')
+        else:
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify({'error': '請提供 JSON 或 CSV 格式的名單'}), 400
+            if isinstance(data, dict):
+                course_ids += [course_id for course_id in data.get('course_ids', []) if isinstance(course_id, int)]
+            rows = parse_roster(json.dumps(data), 'json')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'名單格式錯誤: {str(e)}'}), 400
+    
+    try:
+        stats = provision_users(rows, course_ids=course_ids,
+                                workers=current_app.config.get('PASSWORD_HASH_WORKERS'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error provisioning users: {e}")
+        return jsonify({'error': '批次創建用戶時發生錯誤'}), 500
+    
+    return jsonify({'message': f"已創建 {len(stats['created'])} 個用戶", **stats}), 201
+
 # Delete a student (now public)
 @bp.route('/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
@@ -0,0 +1,31 @@
+"""Import every module named in a preload list (one per line, # comments).
+
+Run at image build time: it fails the build when a module does not import
+and reports how long each import takes on the finished image.
+
+    python preload.py preload.txt
+"""
+import sys
+import time
+import importlib
+
+
+def modules(path):
+    with open(path) as f:
+        for line in f:
+            name = line.split('#', 1)[0].strip()
+            if name:
+                yield name
+
+
+def main(path):
+    total = time.perf_counter()
+    for name in modules(path):
+        start = time.perf_counter()
+        importlib.import_module(name)
+        print(f'{name:<24}{(time.perf_counter() - start) * 1000:8.1f} ms')
+    print(f"{'total':<24}{(time.perf_counter() - total) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
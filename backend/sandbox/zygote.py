@@ -0,0 +1,439 @@
+"""Fork server ("zygote") for the code sandbox.
+
+Runs as the long-lived process of a sandbox container (see
+backend/fork_server.py, which starts it). It imports the modules of the
+image's preload list once, then listens on a Unix socket. For every request
+it forks a child that already has those modules loaded, so a run costs a
+fork instead of an interpreter start.
+
+The zygote is single-threaded: accepting connections, forking and
+collecting the children's output all happen in one selector loop, so no
+child inherits a lock held by some other thread. Up to ``--max-children``
+runs are served at once, each in a slot. The child of slot N:
+
+* gets fresh stdin / stdout / stderr pipes and its own session,
+* works in a private directory, /tmp/run-N (its cwd, TMPDIR and HOME,
+  umask 077), which the zygote wipes after the run, so nothing one student
+  writes is left for the next run,
+* runs as uid RUN_UID_BASE + N when the zygote is root (fork_server.py
+  starts it that way), so concurrent runs cannot read or signal each other;
+  the container's /tmp is not writable for these uids,
+* is limited with rlimits: CPU seconds, address space (``memory`` bytes
+  on top of what the zygote had mapped), file size, open files and no new
+  processes or threads (RLIMIT_NPROC 0),
+* sets no_new_privs and installs an audit hook that refuses process,
+  socket, signal and ctypes operations. The hook only catches accidents
+  and the obvious cases: PEP 578 hooks are not a security boundary. The
+  boundary is the container (no network, read-only root, few capabilities),
+  the per-slot uid and the rlimits,
+* runs the submitted code as ``__main__`` of /tmp/user_code.py and exits.
+
+The zygote kills a child that runs past its timeout or floods its output.
+
+Protocol: each message is a 4 byte big-endian length and a JSON object.
+Request ``{"code", "timeout", "memory", "output_limit", "stdin"}``, response
+``{"exit_code", "stdout", "stderr", "timed_out", "truncated", "duration_ms"}``.
+One request per connection.
+
+    python zygote.py SOCKET_PATH [PRELOAD_LIST] [--max-children N]
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import argparse
+import builtins
+import resource
+import shutil
+import selectors
+import tempfile
+import traceback
+import importlib
+
+HEADER = struct.Struct('!I')
+MAX_REQUEST = 4 * 1024 * 1024
+CODE_PATH = '/tmp/user_code.py'
+# Each run gets WORK_ROOT/run-<slot>, wiped afterwards; as root, slot N runs as uid RUN_UID_BASE + N
+WORK_ROOT = '/tmp'
+RUN_UID_BASE = 20000
+# Seconds a client has to send its request
+REQUEST_TIMEOUT = 10
+BLOCKED_EVENTS = frozenset((
+    'os.system', 'os.exec', 'os.posix_spawn', 'os.spawn', 'os.fork', 'os.forkpty', 'os.kill', 'os.killpg',
+    'subprocess.Popen', 'pty.spawn', 'socket.__new__', 'socket.connect', 'socket.bind', 'socket.getaddrinfo',
+    'ctypes.dlopen', 'ctypes.dlsym', 'ctypes.call_function', 'ctypes.addressof',
+))
+PR_SET_NO_NEW_PRIVS = 38
+
+
+def send_message(conn, message):
+    payload = json.dumps(message).encode()
+    conn.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def preload(path):
+    if not path or not os.path.exists(path):
+        return
+    with open(path) as f:
+        names = [line.split('#', 1)[0].strip() for line in f]
+    for name in filter(None, names):
+        try:
+            importlib.import_module(name)
+        except Exception as e:  # 預載失敗只影響速度，使用者程式仍可自行 import
+            print(f'zygote: preload {name} failed: {e}', file=sys.stderr)
+
+
+def _address_space():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+
+def _audit(event, args):
+    if event in BLOCKED_EVENTS:
+        raise PermissionError(f'{event} is not allowed in the sandbox')
+
+
+def _restrict(request):
+    cpu = max(1, int(request.get('timeout', 10)) + 1)
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    memory = request.get('memory')
+    if memory:
+        # 位址空間上限 = 預載後的大小 + 本次執行可用的記憶體
+        limit = _address_space() + memory
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (32, 32))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    try:
+        import ctypes
+        ctypes.CDLL(None, use_errno=True).prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+    except Exception:
+        pass  # not Linux / no libc symbol: the container's no-new-privileges still applies
+    sys.addaudithook(_audit)
+
+
+def _run_child(request, stdin_r, stdout_w, stderr_w, workdir, uid):
+    """In the forked child: never returns"""
+    exit_code = 1
+    try:
+        os.setsid()
+        os.dup2(stdin_r, 0)
+        os.dup2(stdout_w, 1)
+        os.dup2(stderr_w, 2)
+        os.closerange(3, 1024)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGPIPE):
+            signal.signal(sig, signal.SIG_DFL)
+        if 'numpy' in sys.modules:
+            sys.modules['numpy'].random.seed()  # random 模組在 fork 後會自動重新播種，numpy 不會
+        sys.argv = [CODE_PATH]
+        # 只有自己的工作目錄可寫，其他執行的檔案看不到
+        os.chdir(workdir)
+        os.environ.update({'TMPDIR': workdir, 'HOME': workdir})
+        tempfile.tempdir = workdir
+        os.umask(0o077)
+        _restrict(request)
+        if uid is not None:
+            os.setgroups([])
+            os.setgid(uid)
+            os.setuid(uid)
+        namespace = {'__name__': '__main__', '__file__': CODE_PATH, '__builtins__': builtins}
+        try:
+            exec(compile(request['code'], CODE_PATH, 'exec'), namespace)
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            # 與 python user_code.py 相同的 traceback，去掉 zygote 自己的框架
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def _wipe(path):
+    def make_writable(function, failed_path, exc_info):
+        # 使用者程式可能把自己的檔案或目錄設成唯讀
+        os.chmod(os.path.dirname(failed_path), 0o700)
+        if os.path.isdir(failed_path) and not os.path.islink(failed_path):
+            os.chmod(failed_path, 0o700)
+        function(failed_path)
+    shutil.rmtree(path, onerror=make_writable)
+
+
+class _Run:
+    """One connection: its request, then the forked child running it"""
+
+    def __init__(self, conn, slot):
+        self.conn = conn
+        self.slot = slot
+        self.received = bytearray()
+        self.request = None
+        self.pid = None
+        self.workdir = None
+        self.outputs = {}  # open stdout / stderr pipe -> bytes read so far
+        self.buffers = []  # [stdout, stderr]
+        self.stdin_fd = None
+        self.stdin = b''
+        self.deadline = time.monotonic() + REQUEST_TIMEOUT
+        self.limit = 65536
+        self.started = 0.0
+        self.exit_code = None
+        self.timed_out = self.truncated = False
+
+
+class Zygote:
+    """Single-threaded server: accepting, forking and collecting output all run in one selector loop.
+
+    No other thread exists when the zygote forks, so a child can never
+    inherit a lock held by a thread that is gone in the child.
+    """
+
+    def __init__(self, server, max_children):
+        self.server = server
+        self.selector = selectors.DefaultSelector()
+        self.free_slots = list(range(max_children))
+        self.runs = set()
+        self.accepting = False
+        # root 時每個 slot 的子程序以不同 uid 執行
+        self.run_as_root = os.geteuid() == 0
+
+    def serve_forever(self):
+        self._accepting(True)
+        while True:
+            for key, mask in self.selector.select(self._select_timeout()):
+                key.data(key, mask)
+            self._check_runs()
+
+    def _accepting(self, accepting):
+        if accepting and not self.accepting:
+            self.selector.register(self.server, selectors.EVENT_READ, self._accept)
+        elif not accepting and self.accepting:
+            self.selector.unregister(self.server)
+        self.accepting = accepting
+
+    def _select_timeout(self):
+        if not self.runs:
+            return None
+        timeout = min(run.deadline for run in self.runs) - time.monotonic()
+        if any(run.pid is not None and not run.outputs for run in self.runs):
+            timeout = min(timeout, 0.01)  # output closed, waiting for the exit status
+        return max(0.0, timeout)
+
+    def _accept(self, key, mask):
+        conn, _ = self.server.accept()
+        conn.setblocking(False)
+        run = _Run(conn, self.free_slots.pop())
+        self.runs.add(run)
+        self.selector.register(conn, selectors.EVENT_READ, lambda key, mask: self._receive(run))
+        if not self.free_slots:
+            self._accepting(False)
+
+    def _receive(self, run):
+        try:
+            chunk = run.conn.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b''
+        if not chunk:
+            self._close(run)
+            return
+        run.received += chunk
+        if len(run.received) < HEADER.size:
+            return
+        size, = HEADER.unpack(run.received[:HEADER.size])
+        if size > MAX_REQUEST:
+            self._close(run)
+        elif len(run.received) >= HEADER.size + size:
+            self.selector.unregister(run.conn)
+            try:
+                run.request = json.loads(run.received[HEADER.size:HEADER.size + size])
+            except ValueError:
+                self._close(run)
+                return
+            self._start(run)
+
+    def _start(self, run):
+        request = run.request
+        run.started = time.perf_counter()
+        run.deadline = time.monotonic() + float(request.get('timeout', 10))
+        run.limit = int(request.get('output_limit', 65536))
+        uid = RUN_UID_BASE + run.slot if self.run_as_root else None
+        run.workdir = os.path.join(WORK_ROOT, f'run-{run.slot}')
+        if os.path.exists(run.workdir):
+            _wipe(run.workdir)
+        os.mkdir(run.workdir, 0o700)
+        if uid is not None:
+            os.chown(run.workdir, uid, uid)
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        run.pid = os.fork()
+        if run.pid == 0:
+            _run_child(request, stdin_r, stdout_w, stderr_w, run.workdir, uid)
+        for fd in (stdin_r, stdout_w, stderr_w):
+            os.close(fd)
+        run.buffers = [bytearray(), bytearray()]
+        for fd, buffer in zip((stdout_r, stderr_r), run.buffers):
+            os.set_blocking(fd, False)
+            run.outputs[fd] = buffer
+            self.selector.register(fd, selectors.EVENT_READ, lambda key, mask: self._read_output(run, key.fd))
+        run.stdin = (request.get('stdin') or '').encode()
+        if run.stdin:
+            # 子程序不讀輸入時也不會卡住：只在管線可寫時寫入
+            os.set_blocking(stdin_w, False)
+            run.stdin_fd = stdin_w
+            self.selector.register(stdin_w, selectors.EVENT_WRITE, lambda key, mask: self._write_stdin(run))
+        else:
+            os.close(stdin_w)
+
+    def _read_output(self, run, fd):
+        try:
+            chunk = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        if not chunk:
+            self._close_output(run, fd)
+            return
+        run.outputs[fd] += chunk
+        if len(run.outputs[fd]) > run.limit:
+            run.truncated = True
+            self._kill(run)
+
+    def _write_stdin(self, run):
+        try:
+            run.stdin = run.stdin[os.write(run.stdin_fd, run.stdin):]
+        except BlockingIOError:
+            return
+        except OSError:
+            run.stdin = b''  # 子程序已結束或關閉 stdin
+        if not run.stdin:
+            self._close_stdin(run)
+
+    def _close_stdin(self, run):
+        if run.stdin_fd is not None:
+            self.selector.unregister(run.stdin_fd)
+            os.close(run.stdin_fd)
+            run.stdin_fd = None
+
+    def _close_output(self, run, fd):
+        self.selector.unregister(fd)
+        os.close(fd)
+        del run.outputs[fd]
+
+    def _kill(self, run):
+        try:
+            os.killpg(run.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        for fd in list(run.outputs):
+            self._close_output(run, fd)
+
+    def _check_runs(self):
+        now = time.monotonic()
+        for run in list(self.runs):
+            if run.pid is None:
+                if now >= run.deadline:  # 請求一直沒有送完
+                    self._close(run)
+                continue
+            if now >= run.deadline and not (run.timed_out or run.truncated):
+                if run.outputs or not self._exited(run):
+                    run.timed_out = True
+                    self._kill(run)
+            if run.outputs:
+                continue
+            if run.exit_code is None and (run.timed_out or run.truncated):
+                _, status = os.waitpid(run.pid, 0)  # 已送出 SIGKILL
+                run.exit_code = os.waitstatus_to_exitcode(status)
+            if self._exited(run):
+                self._finish(run, run.exit_code)
+
+    def _exited(self, run):
+        if run.exit_code is not None:
+            return True
+        pid, status = os.waitpid(run.pid, os.WNOHANG)
+        if pid == 0:
+            return False
+        run.exit_code = os.waitstatus_to_exitcode(status)
+        return True
+
+    def _finish(self, run, exit_code):
+        limit = run.limit
+        response = {
+            'exit_code': exit_code,
+            'stdout': bytes(run.buffers[0][:limit]).decode('utf-8', 'replace'),
+            'stderr': bytes(run.buffers[1][:limit]).decode('utf-8', 'replace'),
+            'timed_out': run.timed_out,
+            'truncated': run.truncated,
+            'duration_ms': round((time.perf_counter() - run.started) * 1000, 3),
+        }
+        try:
+            run.conn.setblocking(True)
+            run.conn.settimeout(5)
+            send_message(run.conn, response)
+        except OSError:
+            pass
+        self._close(run)
+
+    def _close(self, run):
+        """Release everything the run holds: connection, pipes, work directory, slot"""
+        if run.pid is None:
+            try:
+                self.selector.unregister(run.conn)
+            except (KeyError, ValueError):
+                pass
+        self._close_stdin(run)
+        for fd in list(run.outputs):
+            self._close_output(run, fd)
+        run.conn.close()
+        if run.workdir and os.path.exists(run.workdir):
+            _wipe(run.workdir)
+        self.runs.discard(run)
+        self.free_slots.append(run.slot)
+        self._accepting(True)
+
+
+def serve(socket_path, preload_list=None, max_children=8):
+    preload(preload_list)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    # 主機端的 worker 以其他 uid 連線
+    os.chmod(socket_path, 0o666)
+    server.listen(128)
+    server.setblocking(False)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f'zygote: ready on {socket_path} (pid {os.getpid()})', file=sys.stderr, flush=True)
+    try:
+        Zygote(server, max_children).serve_forever()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fork server for sandboxed Python runs')
+    parser.add_argument('socket')
+    parser.add_argument('preload', nargs='?', help='file with one module to import per line')
+    parser.add_argument('--max-children', type=int, default=8, help='runs at the same time')
+    args = parser.parse_args(argv)
+    serve(args.socket, args.preload, args.max_children)
+
+
+if __name__ == '__main__':
+    main()
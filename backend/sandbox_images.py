@@ -0,0 +1,156 @@
+"""Runtime images for the code sandbox.
+
+Every CodingExercise names the runtime its code needs (``runtime`` column,
+``'python'`` by default). A runtime is one build target of
+backend/sandbox/Dockerfile, tagged ``<SANDBOX_IMAGE_PREFIX>:<runtime>``:
+
+* ``python``: the standard library, with its bytecode compiled at build time
+  (the official images ship without any, so every run compiled what it
+  imported).
+* ``data``: python plus numpy, pandas, scikit-learn and matplotlib for the
+  AI / machine learning courses.
+
+The images are built locally, from the repo, on the host that runs the
+sandbox:
+
+    python sandbox_images.py build           # every runtime
+    python sandbox_images.py build data
+    python sandbox_images.py bench           # container start + first import, managed vs stock
+
+Until the ``python`` image is built the runner falls back to the stock
+SANDBOX_FALLBACK_IMAGE; runtimes with extra packages have no fallback and
+report that their image is missing.
+
+Databases created before the runtime column existed get it from
+backend/schema.py when the app starts.
+"""
+import os
+import time
+import argparse
+import threading
+
+SANDBOX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox')
+DEFAULT_RUNTIME = 'python'
+# runtime -> description; each is a target in sandbox/Dockerfile
+RUNTIMES = {
+    'python': 'Python standard library',
+    'data': 'numpy, pandas, scikit-learn, matplotlib',
+}
+# How long a missing image is remembered before asking the Docker daemon again
+MISSING_IMAGE_RECHECK = 30
+
+_present = set()
+_missing = {}  # image -> time it was found missing
+_lock = threading.Lock()
+
+
+def is_runtime(runtime):
+    return runtime in RUNTIMES
+
+
+def image_name(runtime, prefix=None):
+    if prefix is None:
+        from flask import current_app
+        prefix = current_app.config.get('SANDBOX_IMAGE_PREFIX', 'final-form-sandbox')
+    return f'{prefix}:{runtime}'
+
+
+def _image_exists(client, image):
+    with _lock:
+        if image in _present:
+            return True
+        if time.monotonic() - _missing.get(image, -MISSING_IMAGE_RECHECK) < MISSING_IMAGE_RECHECK:
+            return False
+    import docker
+    try:
+        client.images.get(image)
+    except docker.errors.ImageNotFound:
+        with _lock:
+            _missing[image] = time.monotonic()
+        return False
+    with _lock:
+        _present.add(image)
+        _missing.pop(image, None)
+    return True
+
+
+def resolve_image(client, runtime=None):
+    """(image, None) to run code of a runtime with, or (None, error message)"""
+    from flask import current_app
+    runtime = runtime or DEFAULT_RUNTIME
+    if not is_runtime(runtime):
+        return None, f'未知的執行環境: {runtime}'
+    image = image_name(runtime)
+    if _image_exists(client, image):
+        return image, None
+    if runtime == DEFAULT_RUNTIME:
+        return current_app.config.get('SANDBOX_FALLBACK_IMAGE', 'python:3.9-alpine'), None
+    return None, f'執行環境 {runtime} 的映像 {image} 尚未建置 (python sandbox_images.py build {runtime})'
+
+
+def build(runtimes, prefix, python_version=None):
+    import docker
+    client = docker.from_env()
+    for runtime in runtimes:
+        tag = f'{prefix}:{runtime}'
+        print(f'Building {tag} ({RUNTIMES[runtime]})')
+        started = time.perf_counter()
+        buildargs = {'PYTHON_VERSION': python_version} if python_version else None
+        client.images.build(path=SANDBOX_DIR, target=runtime, tag=tag, buildargs=buildargs, rm=True)
+        print(f'  done in {time.perf_counter() - started:.1f}s')
+
+
+def _time_run(client, image, command, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        client.containers.run(image=image, command=command, remove=True, stdout=True, stderr=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench(prefix, stock_image, runs, imports):
+    """Median wall time of a container that imports a few modules, managed image vs stock"""
+    import docker
+    client = docker.from_env()
+    command = ['python', '-c', f'import {imports}']
+    print(f"{runs} runs of python -c 'import {imports}'")
+    print(f"  {'image':<36}{'p50 ms':>9}")
+    for image in (stock_image, f'{prefix}:{DEFAULT_RUNTIME}'):
+        try:
+            client.images.get(image)
+        except docker.errors.ImageNotFound:
+            if image != stock_image:
+                print(f'  {image:<36}  not built')
+                continue
+            client.images.pull(image)
+        _time_run(client, image, command, 1)  # warm the page cache
+        print(f'  {image:<36}{_time_run(client, image, command, runs):>9.0f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and benchmark the code sandbox images')
+    parser.add_argument('--prefix', default=os.environ.get('SANDBOX_IMAGE_PREFIX', 'final-form-sandbox'),
+                        help='image repository, tagged :<runtime>')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='build runtime images from backend/sandbox/Dockerfile')
+    build_parser.add_argument('runtimes', nargs='*', help=f"default: all of {', '.join(RUNTIMES)}")
+    build_parser.add_argument('--python-version', help='PYTHON_VERSION build argument (default 3.9)')
+    bench_parser = commands.add_parser('bench', help='container start + first import, managed vs stock image')
+    bench_parser.add_argument('--stock', default='python:3.9-alpine')
+    bench_parser.add_argument('--runs', type=int, default=10)
+    bench_parser.add_argument('--imports', default='json, random, statistics, collections, datetime, decimal')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        unknown = [runtime for runtime in args.runtimes if not is_runtime(runtime)]
+        if unknown:
+            parser.error(f"unknown runtime {', '.join(unknown)} (choose from {', '.join(RUNTIMES)})")
+        build(args.runtimes or list(RUNTIMES), args.prefix, args.python_version)
+    else:
+        bench(args.prefix, args.stock, args.runs, args.imports)
+
+
+if __name__ == '__main__':
+    main()
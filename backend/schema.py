@@ -0,0 +1,79 @@
+"""In-place upgrades for databases created by older versions of the models.
+
+Tables come from ``db.create_all()`` (init_db.py), which creates missing
+tables but never changes one that exists. ``upgrade_schema()`` adds what
+newer models expect on top of that: ``coding_exercises.runtime`` (see
+sandbox_images.py), the ``import_keys`` table (see course_import.py) and
+the student directory indexes (see read_models.student_directory). Every step is idempotent and safe to run
+from several gunicorn workers at once.
+
+create_app runs it at startup (``init_app``), so a deployment needs no
+separate migration step; on a database without any tables yet everything
+is left to ``create_all``.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex
+
+# Indexes whose definition changed; dropped so the new one is created in their place
+OBSOLETE_INDEXES = {
+    'users': ('ix_users_role_email_lower',),  # lower(email), replaced by ix_users_role_email_key
+}
+
+
+def _drop_index(connection, table, name):
+    if connection.dialect.name in ('mysql', 'mariadb'):
+        if name in {index['name'] for index in inspect(connection).get_indexes(table)}:
+            connection.execute(text(f'DROP INDEX {name} ON {table}'))
+    else:
+        connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+def _add_runtime_column(engine):
+    from backend.sandbox_images import DEFAULT_RUNTIME
+    if 'runtime' in {column['name'] for column in inspect(engine).get_columns('coding_exercises')}:
+        return
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE coding_exercises ADD COLUMN runtime VARCHAR(32) NOT NULL DEFAULT '{DEFAULT_RUNTIME}'"))
+    except (OperationalError, ProgrammingError):
+        # 另一個 worker 同時加上了這個欄位
+        if 'runtime' not in {column['name'] for column in inspect(engine).get_columns('coding_exercises')}:
+            raise
+
+
+def _create_import_keys(engine):
+    from backend.models.course import ImportKey
+    try:
+        ImportKey.__table__.create(engine, checkfirst=True)
+    except (OperationalError, ProgrammingError):
+        # 另一個 worker 同時建立了這個資料表
+        if ImportKey.__tablename__ not in inspect(engine).get_table_names():
+            raise
+
+
+def upgrade_schema(db):
+    """Bring existing tables up to the current models. Must run inside an app context"""
+    from backend.models.user import User
+    tables = set(inspect(db.engine).get_table_names())
+    if 'coding_exercises' in tables:
+        _add_runtime_column(db.engine)
+    if 'courses' in tables and 'import_keys' not in tables:
+        _create_import_keys(db.engine)
+    with db.engine.begin() as connection:
+        if User.__tablename__ in tables:
+            for name in OBSOLETE_INDEXES['users']:
+                _drop_index(connection, User.__tablename__, name)
+            # Expression indexes are not reflected on every backend, so no checkfirst
+            for index in User.__table__.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def init_app(app, db):
+    with app.app_context():
+        try:
+            upgrade_schema(db)
+        except SQLAlchemyError as e:
+            # 資料庫暫時連不上時照常啟動，下次啟動再升級
+            app.logger.warning(f'Schema upgrade failed: {e}')
@@ -0,0 +1,214 @@
+"""Synthetic data at production scale.
+
+init_db.py seeds a handful of rows; this fills a database with as many
+teachers, students, courses, units, lessons, enrollments, progress rows and
+submissions as asked, so performance problems can be reproduced locally.
+Every table is written with chunked Core ``INSERT``s, so a dataset with 100k
+progress rows builds in seconds. Rows get ids above the current maximum, and
+users a name prefix, so the data can be added next to an existing database.
+
+Each lesson gets two multiple-choice questions; every third lesson has a
+fill-in-the-blank exercise and every fourth a coding exercise. Each student
+is enrolled in ``courses_per_student`` courses and has a progress row for
+``completion`` of their lessons. All users share the password
+``password123``, hashed once.
+
+Usage (from the backend directory):
+    python init_db.py --synthetic --students 2000 --courses 10
+    python synthetic_data.py --students 5000 --submissions-per-student 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func
+from werkzeug.security import generate_password_hash
+
+CHUNK_SIZE = 1000
+PASSWORD = 'password123'
+
+FILL_BLANK_TEMPLATE = 'To check your Python version, run {{0}}. Python files end in {{1}}.'
+FILL_BLANK_BLANKS = [
+    {'id': 'b1', 'options': ['python --version', 'python -v', 'py --version'], 'correct_answer': 'python --version'},
+    {'id': 'b2', 'options': ['.py', '.python', '.pyt'], 'correct_answer': '.py'},
+]
+# Inputs for benchmarks that submit answers: a correct answer set for each kind
+FILL_BLANK_ANSWERS = [blank['correct_answer'] for blank in FILL_BLANK_BLANKS]
+CODING_SOLUTION = "print('Hello, World!')"
+
+
+def _insert(model, rows):
+    from backend import db
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def _max_id(model):
+    from backend import db
+    return db.session.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+
+def _new_ids(model, before):
+    from backend import db
+    return list(db.session.execute(select(model.id).where(model.id > before).order_by(model.id)).scalars())
+
+
+def _insert_new(model, rows):
+    """Insert rows and return their ids in insertion order"""
+    before = _max_id(model)
+    _insert(model, rows)
+    return _new_ids(model, before)
+
+
+def generate(teachers=10, students=1000, courses=10, units_per_course=5, lessons_per_unit=6,
+             courses_per_student=3, completion=0.5, submissions_per_student=10, prefix='synth', seed=1):
+    """Insert a synthetic dataset and commit it. Must run inside an app context; returns row counts"""
+    from backend import db
+    from backend.content_cache import content_cache
+    from backend.models.user import User, password_hash_method
+    from backend.models.course import Course, Unit, Enrollment
+    from backend.models.lesson import Lesson, CodingExercise, MultipleChoiceQuestion, FillBlankExercise
+    from backend.models.progress import Progress, SubmissionHistory
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(PASSWORD, method=password_hash_method())
+    counts = {}
+
+    try:
+        teacher_ids = _insert_new(User, [
+            {'username': f'{prefix}_teacher{i}', 'email': f'{prefix}_teacher{i}@example.com',
+             'password_hash': password_hash, 'role': 'teacher', 'created_at': now}
+            for i in range(teachers)])
+        student_ids = _insert_new(User, [
+            {'username': f'{prefix}_student{i}', 'email': f'{prefix}_student{i}@example.com',
+             'password_hash': password_hash, 'role': 'student', 'created_at': now}
+            for i in range(students)])
+        counts['users'] = len(teacher_ids) + len(student_ids)
+
+        course_ids = _insert_new(Course, [
+            {'title': f'Synthetic course {c + 1}', 'description': f'Generated course {c + 1}',
+             'creator_id': teacher_ids[c % len(teacher_ids)], 'created_at': now, 'updated_at': now}
+            for c in range(courses)])
+        unit_ids = _insert_new(Unit, [
+            {'title': f'Unit {u + 1}', 'description': '', 'order': u + 1, 'course_id': course_id,
+             'created_at': now, 'updated_at': now}
+            for course_id in course_ids for u in range(units_per_course)])
+        lesson_ids = _insert_new(Lesson, [
+            {'title': f'Lesson {l + 1}', 'description': 'Generated lesson', 'order': l + 1, 'unit_id': unit_id,
+             'created_at': now, 'updated_at': now}
+            for unit_id in unit_ids for l in range(lessons_per_unit)])
+        counts.update(courses=len(course_ids), units=len(unit_ids), lessons=len(lesson_ids))
+
+        lessons_per_course = units_per_course * lessons_per_unit
+        course_lessons = {course_id: lesson_ids[index * lessons_per_course:(index + 1) * lessons_per_course]
+                          for index, course_id in enumerate(course_ids)}
+
+        questions = [
+            {'lesson_id': lesson_id, 'question_text': f'Question {q + 1} of lesson {lesson_id}?',
+             'options': json.dumps(['A', 'B', 'C', 'D']), 'correct_option_index': q % 4,
+             'explanation': 'Generated', 'points': 10, 'created_at': now, 'updated_at': now}
+            for lesson_id in lesson_ids for q in range(2)]
+        fill_blanks = [
+            {'lesson_id': lesson_id, 'text_template': FILL_BLANK_TEMPLATE, 'blanks': json.dumps(FILL_BLANK_BLANKS),
+             'points': 20, 'created_at': now, 'updated_at': now}
+            for lesson_id in lesson_ids[::3]]
+        coding = [
+            {'lesson_id': lesson_id, 'instructions': "Print 'Hello, World!'", 'starter_code': '# Write your code here\n',
+             'solution_code': CODING_SOLUTION,
+             'test_cases': json.dumps([{'input': '', 'expected_output': 'Hello, World!'}]),
+             'max_score': 100, 'created_at': now, 'updated_at': now}
+            for lesson_id in lesson_ids[::4]]
+        _insert(MultipleChoiceQuestion, questions)
+        _insert(FillBlankExercise, fill_blanks)
+        _insert(CodingExercise, coding)
+        counts.update(questions=len(questions), fill_blanks=len(fill_blanks), coding_exercises=len(coding))
+
+        enrollments, progress, submissions = [], [], []
+        per_student = min(courses_per_student, len(course_ids))
+        for position, student_id in enumerate(student_ids):
+            enrolled = [course_ids[(position + offset) % len(course_ids)] for offset in range(per_student)]
+            lessons = [lesson_id for course_id in enrolled for lesson_id in course_lessons[course_id]]
+            for course_id in enrolled:
+                enrollments.append({'student_id': student_id, 'course_id': course_id,
+                                    'enrolled_at': now - timedelta(days=rng.randint(1, 120))})
+            for lesson_id in lessons:
+                if rng.random() >= completion:
+                    continue
+                attempted = now - timedelta(minutes=rng.randint(1, 60 * 24 * 90))
+                score = rng.choice((0, 10, 20))
+                progress.append({
+                    'student_id': student_id, 'lesson_id': lesson_id, 'coding_score': 0,
+                    'multiple_choice_score': score, 'fill_blank_score': 0, 'completed': score == 20,
+                    'attempts': rng.randint(1, 3), 'last_attempt_at': attempted,
+                    'created_at': attempted, 'updated_at': attempted,
+                    'multiple_choice_results': json.dumps({'score': score, 'results': []}),
+                })
+            for _ in range(submissions_per_student if lessons else 0):
+                submissions.append({
+                    'student_id': student_id, 'lesson_id': rng.choice(lessons),
+                    'submission_type': 'multiple_choice', 'content': json.dumps({'answers': {}}),
+                    'score': rng.choice((0, 10, 20)), 'feedback': None,
+                    'submitted_at': now - timedelta(minutes=rng.randint(1, 60 * 24 * 90)),
+                })
+        _insert(Enrollment, enrollments)
+        _insert(Progress, progress)
+        _insert(SubmissionHistory, submissions)
+        counts.update(enrollments=len(enrollments), progress=len(progress), submissions=len(submissions))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Bulk inserts do not fire the mapper events that keep the content caches fresh
+    content_cache.invalidate(broadcast=True)
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def add_arguments(parser):
+    parser.add_argument('--teachers', type=int, default=10)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--units-per-course', type=int, default=5)
+    parser.add_argument('--lessons-per-unit', type=int, default=6)
+    parser.add_argument('--courses-per-student', type=int, default=3)
+    parser.add_argument('--completion', type=float, default=0.5, help='share of lessons with a progress row')
+    parser.add_argument('--submissions-per-student', type=int, default=10)
+    parser.add_argument('--prefix', default='synth', help='username prefix of the generated users')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def options(args):
+    """generate() keyword arguments from parsed add_arguments() options"""
+    return {name: getattr(args, name) for name in (
+        'teachers', 'students', 'courses', 'units_per_course', 'lessons_per_unit', 'courses_per_student',
+        'completion', 'submissions_per_student', 'prefix', 'seed')}
+
+
+def report(counts):
+    seconds = counts.pop('seconds')
+    print(', '.join(f'{count} {name}' for name, count in counts.items()) + f' inserted in {seconds:.2f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fill the database with synthetic courses, students and progress')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # 修復導入路徑問題 (same as init_db.py)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from backend import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        report(generate(**options(args)))
+
+
+if __name__ == "__main__":
+    main()
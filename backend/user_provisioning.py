@@ -0,0 +1,193 @@
+"""Bulk provisioning of user accounts from a CSV or JSON roster.
+
+Password hashing dominates the cost of creating an account, so it is done
+in a thread pool across all cores instead of one ``set_password`` call per
+request: hashlib's PBKDF2 and scrypt release the GIL while they run. Threads
+rather than processes, because the /api/users/bulk route calls this from a
+threaded or gevent gunicorn worker, which must not be forked.
+
+Everything else is set-based: username conflicts are checked with one
+``IN`` query per chunk, users are inserted in batches, and the new students
+can be enrolled in courses in the same transaction (see enrollment.py).
+
+Roster columns / keys: ``username``, ``password``, optional ``email`` and
+``role`` (``student`` unless given).
+
+Usage (from the backend directory):
+    python user_provisioning.py roster.csv
+    python user_provisioning.py roster.json --course 3 --course 4 --workers 8
+"""
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, insert
+from werkzeug.security import generate_password_hash
+
+ROLES = ('teacher', 'student')
+BATCH_SIZE = 500
+# Below this many passwords the pool costs more than it saves
+MIN_PARALLEL_PASSWORDS = 16
+
+
+def parse_roster(text, format=None):
+    """Parse a roster into a list of dicts. format is 'csv' or 'json'; guessed when omitted"""
+    if format is None:
+        format = 'json' if text.lstrip()[:1] in ('[', '{') else 'csv'
+    if format == 'json':
+        data = json.loads(text)
+        users = data.get('users') if isinstance(data, dict) else data
+        if not isinstance(users, list) or not all(isinstance(user, dict) for user in users):
+            raise ValueError('JSON rosters must be a list of user objects or {"users": [...]}')
+        return users
+    if format == 'csv':
+        reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+        if not reader.fieldnames or 'username' not in reader.fieldnames:
+            raise ValueError('CSV rosters need a header row with at least username and password')
+        return [{key.strip(): (value or '').strip() for key, value in row.items() if key} for row in reader]
+    raise ValueError(f'Unknown roster format: {format}')
+
+
+def read_roster_file(path):
+    with open(path, encoding='utf-8-sig') as f:
+        text = f.read()
+    format = 'json' if path.endswith('.json') else 'csv' if path.endswith('.csv') else None
+    return parse_roster(text, format)
+
+
+def hash_passwords(passwords, workers=None, method=None):
+    """Hash passwords in a thread pool; small batches are hashed in the calling thread"""
+    from backend.models.user import password_hash_method
+    hash_password = partial(generate_password_hash, method=method or password_hash_method())
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < MIN_PARALLEL_PASSWORDS:
+        return [hash_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords, chunksize=chunksize))
+
+
+def _existing_usernames(usernames):
+    from backend import db
+    from backend.models.user import User
+    usernames = list(usernames)
+    existing = set()
+    for start in range(0, len(usernames), BATCH_SIZE):
+        existing.update(db.session.execute(
+            select(User.username).where(User.username.in_(usernames[start:start + BATCH_SIZE]))).scalars())
+    return existing
+
+
+def provision_users(rows, course_ids=(), workers=None):
+    """Create the users of a roster and optionally enroll the new students.
+
+    Rows with missing fields, an unknown role or a username that is taken
+    (or repeated in the roster) are skipped and reported, not fatal. The
+    accounts and enrollments are committed together. Returns a stats dict.
+    """
+    from backend import db
+    from backend.enrollment import bulk_enroll
+    from backend.models.user import User
+    from backend.models.course import Course
+
+    started = time.perf_counter()
+    course_ids = list(dict.fromkeys(course_ids))
+    if course_ids:
+        found = set(db.session.execute(select(Course.id).where(Course.id.in_(course_ids))).scalars())
+        missing = [course_id for course_id in course_ids if course_id not in found]
+        if missing:
+            raise ValueError(f'Courses not found: {missing}')
+
+    skipped, accepted, seen = [], [], set()
+    for line, row in enumerate(rows, start=1):
+        username = str(row.get('username') or '').strip()
+        password = str(row.get('password') or '')
+        role = str(row.get('role') or 'student').strip()
+        if not username or not password:
+            skipped.append({'row': line, 'username': username, 'reason': 'username and password are required'})
+        elif role not in ROLES:
+            skipped.append({'row': line, 'username': username, 'reason': f'unknown role: {role}'})
+        elif username in seen:
+            skipped.append({'row': line, 'username': username, 'reason': 'duplicate username in roster'})
+        else:
+            seen.add(username)
+            accepted.append((line, username, password, str(row.get('email') or '').strip(), role))
+
+    taken = _existing_usernames(seen)
+    for line, username, *_ in accepted:
+        if username in taken:
+            skipped.append({'row': line, 'username': username, 'reason': 'username already exists'})
+    accepted = [user for user in accepted if user[1] not in taken]
+
+    hash_started = time.perf_counter()
+    hashes = hash_passwords([user[2] for user in accepted], workers=workers)
+    hash_seconds = time.perf_counter() - hash_started
+
+    now = datetime.utcnow()
+    values = [{'username': username, 'email': email, 'password_hash': password_hash,
+               'role': role, 'created_at': now}
+              for (_, username, _, email, role), password_hash in zip(accepted, hashes)]
+    enrolled = {}
+    try:
+        for start in range(0, len(values), BATCH_SIZE):
+            db.session.execute(insert(User), values[start:start + BATCH_SIZE])
+        created = []
+        usernames = [value['username'] for value in values]
+        for start in range(0, len(usernames), BATCH_SIZE):
+            created.extend(db.session.execute(
+                select(User.id, User.username, User.role)
+                .where(User.username.in_(usernames[start:start + BATCH_SIZE]))).all())
+        student_ids = [user_id for user_id, _, role in created if role == 'student']
+        for course_id in course_ids:
+            results = bulk_enroll(course_id, student_ids) if student_ids else []
+            enrolled[course_id] = sum(1 for result in results if result['status'] == 'success')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    skipped.sort(key=lambda entry: entry['row'])
+    return {
+        'created': [{'id': user_id, 'username': username, 'role': role} for user_id, username, role in created],
+        'skipped': skipped,
+        'enrolled': enrolled,
+        'seconds': round(elapsed, 3),
+        'hash_seconds': round(hash_seconds, 3),
+        'users_per_second': round(len(created) / elapsed) if elapsed > 0 else len(created),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create user accounts from a CSV or JSON roster')
+    parser.add_argument('roster', help='CSV or JSON file with username, password[, email, role]')
+    parser.add_argument('--course', type=int, action='append', default=[], dest='courses',
+                        help='enroll the new students in this course (repeatable)')
+    parser.add_argument('--workers', type=int, help='hashing threads (default: one per core)')
+    args = parser.parse_args(argv)
+
+    # 修復導入路徑問題 (same as init_db.py)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from backend import create_app
+
+    app = create_app()
+    with app.app_context():
+        workers = args.workers or app.config.get('PASSWORD_HASH_WORKERS')
+        stats = provision_users(read_roster_file(args.roster), course_ids=args.courses, workers=workers)
+    for entry in stats['skipped']:
+        print(f"row {entry['row']} ({entry['username'] or '-'}): skipped, {entry['reason']}")
+    for course_id, count in stats['enrolled'].items():
+        print(f"course {course_id}: {count} students enrolled")
+    print(f"{len(stats['created'])} users created in {stats['seconds']:.2f}s "
+          f"(hashing {stats['hash_seconds']:.2f}s, {stats['users_per_second']} users/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,64 @@
+"""gunicorn settings.
+
+GUNICORN_PROFILE picks the worker model:
+
+* ``sync`` (default): 4 processes x 4 threads. Simple and fine while most
+  requests are short database reads.
+* ``gevent``: cooperative workers for I/O-heavy deployments, where many
+  requests sit waiting on the Docker sandbox (/api/code/run, code
+  submissions). Each worker serves up to GUNICORN_WORKER_CONNECTIONS
+  requests at once as greenlets. Needs ``pip install gevent`` (and
+  ``psycogreen`` on PostgreSQL so psycopg2 yields while waiting for the
+  server).
+
+Under gevent the database and Docker connection pools are sized to the
+number of greenlets unless DB_POOL_SIZE / DOCKER_POOL_SIZE are set. The
+SQLAlchemy session stays per request: Flask-SQLAlchemy scopes it to the app
+context, which lives in a contextvar, and gevent gives every greenlet its
+own contextvars. post_worker_init checks that before serving.
+
+    GUNICORN_PROFILE=gevent gunicorn -c gunicorn_config.py app:app
+"""
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'sync')
+
 bind = "0.0.0.0:10000"
-workers = 4
-threads = 4
-timeout = 120
\ No newline at end of file
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = 120
+
+if profile == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+    # 連線池只需涵蓋真正同時使用資料庫的 greenlet；超過的請求排隊等待 DB_POOL_TIMEOUT
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '20')
+    os.environ.setdefault('DOCKER_POOL_SIZE', str(worker_connections))
+elif profile == 'sync':
+    threads = 4
+else:
+    raise RuntimeError(f'Unknown GUNICORN_PROFILE {profile!r} (sync or gevent)')
+
+
+def post_fork(server, worker):
+    if profile != 'gevent':
+        return
+    try:
+        # psycopg2 是 C 擴充，需要 psycogreen 才會在等待 PostgreSQL 時讓出 greenlet
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
+
+
+def post_worker_init(worker):
+    if profile != 'gevent':
+        return
+    # 兩個 greenlet 若共用 contextvars，就會共用同一個 app context 與 SQLAlchemy session
+    import contextvars
+    import gevent
+    probe = contextvars.ContextVar('greenlet_probe', default=None)
+    probe.set('main')
+    if gevent.spawn(probe.get).get() == 'main':
+        raise RuntimeError('gevent greenlets share contextvars; the SQLAlchemy session would be shared '
+                           'between requests. Upgrade gevent (>= 20.12) and greenlet (>= 1.0).')